@@ -0,0 +1,176 @@
+import json
+import uuid
+import hashlib
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django_redis import get_redis_connection
+from config.celery import enqueue
+from .models import InteractionFlush, TutorInteraction
+
+User = get_user_model()
+
+PREFIX = "ai_tutor:interactions"
+FLUSH_MAX_KEYS = 20                     # Lotes (chaves :flushing:) gravados por flush; o resto fica para o próximo
+LEDGER_RETENTION = timedelta(days=1)
+
+# Move o buffer atual para uma chave de flush (novas interações vão para uma lista nova)
+SWAP_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    redis.call('rename', KEYS[1], KEYS[1] .. ':flushing:' .. ARGV[1])
+end
+return 1
+"""
+
+# Libera a trava apenas se ela ainda pertence a este flush (compare-and-delete atômico)
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def pending_key(user_id, subject):
+    digest = hashlib.sha1((subject or "").strip().lower().encode()).hexdigest()[:16]
+    return f"{PREFIX}:pending:{user_id}:{digest}"
+
+
+class InteractionBuffer:
+    """
+    Fila de TutorInteractions no Redis, gravada no Postgres em lote (bulk_create).
+
+    - ai_tutor:interactions:buffer                -> LIST de interações em JSON, na ordem de chegada
+    - ai_tutor:interactions:pending:<user>:<hash> -> LIST das ainda não gravadas da conversa
+      (o contexto da conversa as enxerga antes do flush)
+
+    Nada fica na memória do worker: um restart do gunicorn não perde interações; lotes que
+    falharem no meio do flush ficam nas chaves :flushing: e entram nos flushes seguintes.
+    """
+    BUFFER_KEY = f"{PREFIX}:buffer"
+    LOCK_KEY = f"{PREFIX}:flush_lock"
+    SCHEDULED_KEY = f"{PREFIX}:flush_scheduled"
+
+    def __init__(self, connection=None):
+        self.redis = connection or get_redis_connection("default")
+        self.config = settings.TUTOR_INTERACTION_BUFFER
+
+    def add(self, user_id, subject, question, answer, with_context=False) -> int:
+        """Enfileira a interação; dispara o flush quando o lote enche. Retorna o tamanho do buffer."""
+        raw = json.dumps({
+            "user_id": user_id, "subject": subject, "question": question, "answer": answer,
+            "with_context": with_context, "created_at": datetime.now(timezone.utc).isoformat(),
+        }, ensure_ascii=False)
+        conversation = pending_key(user_id, subject)
+
+        pipe = self.redis.pipeline()
+        pipe.rpush(self.BUFFER_KEY, raw)
+        pipe.rpush(conversation, raw)
+        pipe.expire(conversation, settings.TUTOR_CONVERSATION["IDLE_MINUTES"] * 60)
+        size, _, _ = pipe.execute()
+
+        if size >= self.config["BATCH_SIZE"] and self.redis.set(self.SCHEDULED_KEY, 1, nx=True, ex=5):
+            from .tasks import flush_interaction_buffer
+            enqueue(flush_interaction_buffer)
+        return size
+
+    def pending(self, user_id, subject) -> list:
+        """Interações da conversa ainda no buffer (mais antiga primeiro)"""
+        return [json.loads(raw) for raw in self.redis.lrange(pending_key(user_id, subject), 0, -1)]
+
+    def flush(self) -> int:
+        """
+        Grava as interações pendentes no Postgres. Retorna quantas foram gravadas.
+
+        Um flush por vez (trava com token); cada lote é identificado pelo sufixo :flushing:<id> e
+        registrado em InteractionFlush na mesma transação do bulk_create, então nunca é inserido duas vezes.
+        """
+        token = uuid.uuid4().hex
+        if not self.redis.set(self.LOCK_KEY, token, nx=True, ex=self.config["FLUSH_LOCK_SECONDS"]):
+            return 0  # Outro worker já está gravando
+        try:
+            return self._flush()
+        finally:
+            self.redis.eval(RELEASE_SCRIPT, 1, self.LOCK_KEY, token)
+
+    def _flush(self) -> int:
+        self.redis.delete(self.SCHEDULED_KEY)
+        own = f"{self.BUFFER_KEY}:flushing:{uuid.uuid4().hex}"
+        self.redis.eval(SWAP_SCRIPT, 1, self.BUFFER_KEY, own.rsplit(":", 1)[1])
+
+        # Lote deste flush + sobras de flushes anteriores que caíram no meio do caminho (SCAN, não KEYS),
+        # no máximo FLUSH_MAX_KEYS lotes por vez
+        leftovers = (k.decode() for k in self.redis.scan_iter(match=f"{self.BUFFER_KEY}:flushing:*", count=100))
+        keys = [own] + list(islice((key for key in leftovers if key != own), FLUSH_MAX_KEYS - 1))
+        batches = {key.rsplit(":", 1)[1]: self.redis.lrange(key, 0, -1) for key in keys}
+        batches = {batch_id: raws for batch_id, raws in batches.items() if raws}
+        if not batches:
+            return 0
+
+        # Lotes já gravados cuja limpeza no Redis falhou: só saem do Redis
+        applied = set(InteractionFlush.objects.filter(flush_id__in=batches).values_list("flush_id", flat=True))
+        if applied:
+            print(f"⚠️ {len(applied)} lote(s) do AI Tutor já gravados descartados do Redis")
+        raws = [raw for raws in batches.values() for raw in raws]
+        entries = [json.loads(raw) for raw in raws]
+        new = [json.loads(raw) for batch_id, raws in batches.items() if batch_id not in applied for raw in raws]
+
+        # Um usuário apagado com interações no buffer travaria todos os flushes (FK)
+        users = set(User.objects.filter(id__in={e["user_id"] for e in new}).values_list("id", flat=True))
+        rows = [entry for entry in new if entry["user_id"] in users]
+        if len(rows) < len(new):
+            print(f"⚠️ {len(new) - len(rows)} interações de usuários removidos descartadas do buffer")
+
+        try:
+            with transaction.atomic():
+                # Chave primária: um flush concorrente com o mesmo lote falha aqui e não insere nada
+                InteractionFlush.objects.bulk_create(
+                    [InteractionFlush(flush_id=batch_id) for batch_id in batches if batch_id not in applied]
+                )
+                TutorInteraction.objects.bulk_create(
+                    [
+                        TutorInteraction(
+                            user_id=entry["user_id"], subject=entry["subject"], question=entry["question"],
+                            answer=entry["answer"], with_context=entry.get("with_context", False),
+                            created_at=datetime.fromisoformat(entry["created_at"]),
+                        )
+                        for entry in rows
+                    ],
+                    batch_size=self.config["BATCH_SIZE"],
+                )
+                InteractionFlush.objects.filter(applied_at__lt=datetime.now(timezone.utc) - LEDGER_RETENTION).delete()
+                batch_keys = [f"{self.BUFFER_KEY}:flushing:{batch_id}" for batch_id in batches]
+                transaction.on_commit(lambda: self._forget(batch_keys, raws, entries))
+        except IntegrityError as e:
+            print(f"⚠️ Lote do AI Tutor não gravado (já gravado por outro flush?): {e}")
+            return 0
+
+        print(f"💾 Buffer do AI Tutor gravado: {len(rows)} interações")
+        return len(rows)
+
+    def _forget(self, keys, raws, entries):
+        """Depois do commit: apaga o lote e tira as interações das listas de pendentes das conversas"""
+        pipe = self.redis.pipeline()
+        pipe.delete(*keys)
+        for raw, entry in zip(raws, entries):
+            pipe.lrem(pending_key(entry["user_id"], entry["subject"]), 1, raw)
+        pipe.execute()
+
+
+def save_interaction(user, subject, question, answer, with_context=False):
+    """
+    Grava a interação do chat. Com TUTOR_INTERACTION_BUFFER['ENABLED'] ela vai para o buffer
+    e é gravada em lote (retorna None); sem buffer ou com o Redis fora, INSERT direto.
+    `with_context`: a resposta dependia da conversa (não entra no cache semântico).
+    """
+    if settings.TUTOR_INTERACTION_BUFFER["ENABLED"]:
+        try:
+            InteractionBuffer().add(user.id, subject, question, answer, with_context)
+            return None
+        except Exception as e:
+            print(f"⚠️ Buffer do AI Tutor indisponível, gravando direto: {e}")
+    return TutorInteraction.objects.create(
+        user=user, subject=subject, question=question, answer=answer, with_context=with_context
+    )
@@ -0,0 +1,232 @@
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, DateTimeField, Q, Value, When
+from django_redis import get_redis_connection
+from apps.llm.lru import BoundedLRU
+from .metrics import TOPIC_CACHE_LOOKUPS
+from .models import TopicCache
+
+ACCESS_KEY = "ai_tutor:topic:access"
+PRUNE_BATCH_SIZE = 500
+
+_local = None
+_access_lock = threading.Lock()
+_pending_access = {}        # membro -> timestamp do último acesso (ainda não enviado ao Redis)
+_last_access_flush = 0.0
+
+
+class CachedAnalysis(NamedTuple):
+    data: dict
+    created_at: float  # epoch da geração pelo Gemini
+
+    @property
+    def age_days(self):
+        return (time.time() - self.created_at) / 86400
+
+
+def _local_tier():
+    """LRU do worker, criado na primeira leitura (cada processo do gunicorn tem o seu)"""
+    global _local
+    if _local is None:
+        config = settings.TOPIC_CACHE
+        _local = BoundedLRU(config["LOCAL_MAX_ENTRIES"], config["LOCAL_MAX_BYTES"], config["LOCAL_TTL_SECONDS"])
+    return _local
+
+
+def clear_local_cache():
+    _local_tier().clear()
+
+
+def freshness(entry: CachedAnalysis, depth: str) -> str:
+    """'fresh' (serve), 'stale' (serve e revalida em background) ou 'expired' (regenera na hora)"""
+    ttls = settings.TOPIC_CACHE["TTL_DAYS"]
+    soft, hard = ttls.get(depth, ttls["default"])
+    if entry.age_days < soft:
+        return "fresh"
+    return "stale" if entry.age_days < hard else "expired"
+
+
+class TopicCacheStore:
+    """
+    Leitura em camadas das análises de tópico:
+    LRU do worker -> Redis (CACHES["default"]) -> tabela TopicCache.
+
+    Um hit numa camada inferior repovoa as de cima. Todas as chaves levam a
+    versão do prompt: mudar a versão invalida tudo em O(1), sem apagar nada.
+    """
+
+    def __init__(self, prompt_version: int):
+        self.prompt_version = prompt_version
+        self.local = _local_tier()
+        self.redis_ttl = settings.TOPIC_CACHE["REDIS_TTL_SECONDS"]
+
+    def _key(self, topic, depth):
+        digest = hashlib.sha1(topic.encode()).hexdigest()[:16]
+        return f"ai_tutor:topic:v{self.prompt_version}:{depth}:{digest}"
+
+    def get(self, topic: str, depth: str):
+        """CachedAnalysis da camada mais próxima que tiver a entrada, ou None"""
+        key = self._key(topic, depth)
+        entry = self._lookup(key, topic, depth)
+        if entry is not None:
+            self._track_access(topic, depth)
+        return entry
+
+    def _lookup(self, key, topic, depth):
+        entry = self.local.get(key)
+        TOPIC_CACHE_LOOKUPS.labels("local", "hit" if entry is not None else "miss").inc()
+        if entry is not None:
+            return entry
+
+        try:
+            raw = cache.get(key)
+        except Exception as e:
+            print(f"⚠️ Redis indisponível no cache de análises: {e}")
+            raw = None
+        TOPIC_CACHE_LOOKUPS.labels("redis", "hit" if raw is not None else "miss").inc()
+        if raw is not None:
+            entry = CachedAnalysis(raw["data"], raw["created_at"])
+            self._keep_local(key, entry)
+            return entry
+
+        row = TopicCache.objects.filter(
+            topic=topic, depth=depth, prompt_version=self.prompt_version
+        ).only("data", "created_at").first()
+        TOPIC_CACHE_LOOKUPS.labels("db", "hit" if row else "miss").inc()
+        if row is None:
+            return None
+
+        entry = CachedAnalysis(row.data, row.created_at.timestamp())
+        self._keep_redis(key, entry)
+        self._keep_local(key, entry)
+        return entry
+
+    def get_many(self, pairs) -> dict:
+        """
+        Versão em lote do get: {(topic, depth): CachedAnalysis} só com as entradas encontradas.
+        Um MGET no Redis para o que faltou no worker e uma única query para o que faltou no Redis.
+        """
+        keys = {self._key(topic, depth): (topic, depth) for topic, depth in set(pairs)}
+        found = {}
+        for key, pair in keys.items():
+            entry = self.local.get(key)
+            TOPIC_CACHE_LOOKUPS.labels("local", "hit" if entry is not None else "miss").inc()
+            if entry is not None:
+                found[pair] = entry
+
+        missing = [key for key, pair in keys.items() if pair not in found]
+        try:
+            raws = cache.get_many(missing) if missing else {}
+        except Exception as e:
+            print(f"⚠️ Redis indisponível no cache de análises: {e}")
+            raws = {}
+        for key in missing:
+            raw = raws.get(key)
+            TOPIC_CACHE_LOOKUPS.labels("redis", "hit" if raw is not None else "miss").inc()
+            if raw is not None:
+                found[keys[key]] = CachedAnalysis(raw["data"], raw["created_at"])
+                self._keep_local(key, found[keys[key]])
+
+        missing = {keys[key]: key for key in missing if keys[key] not in found}
+        if missing:
+            match = Q()
+            for topic, depth in missing:
+                match |= Q(topic=topic, depth=depth)
+            rows = TopicCache.objects.filter(match, prompt_version=self.prompt_version).only(
+                "topic", "depth", "data", "created_at"
+            )
+            for row in rows:
+                pair = (row.topic, row.depth)
+                if pair in missing and pair not in found:
+                    found[pair] = CachedAnalysis(row.data, row.created_at.timestamp())
+                    self._keep_redis(missing[pair], found[pair])
+                    self._keep_local(missing[pair], found[pair])
+            for pair in missing:
+                TOPIC_CACHE_LOOKUPS.labels("db", "hit" if pair in found else "miss").inc()
+
+        for topic, depth in found:
+            self._track_access(topic, depth)
+        return found
+
+    def set(self, topic: str, depth: str, data: dict):
+        """Grava no Postgres (fonte da verdade) e aquece as camadas de cima; sobrescreve análises antigas"""
+        now = datetime.now(timezone.utc)
+        TopicCache.objects.update_or_create(
+            topic=topic,
+            depth=depth,
+            prompt_version=self.prompt_version,
+            defaults={"data": data, "created_at": now, "last_accessed": now},
+        )
+        key = self._key(topic, depth)
+        entry = CachedAnalysis(data, now.timestamp())
+        self._keep_redis(key, entry)
+        self._keep_local(key, entry)
+
+    def _keep_redis(self, key, entry):
+        try:
+            cache.set(key, entry._asdict(), self.redis_ttl)
+        except Exception as e:
+            print(f"⚠️ Redis indisponível no cache de análises: {e}")
+
+    def _keep_local(self, key, entry):
+        self.local.set(key, entry, size=len(json.dumps(entry.data, ensure_ascii=False)))
+
+    def _track_access(self, topic, depth):
+        """
+        Acesso anotado em memória e enviado ao Redis (ZSET) no máximo a cada ACCESS_FLUSH_SECONDS.
+        Nenhuma escrita no Postgres por leitura: a task de limpeza consolida os acessos em lote.
+        """
+        global _last_access_flush
+        now = time.time()
+        with _access_lock:
+            _pending_access[f"{self.prompt_version}|{depth}|{topic}"] = now
+            if now - _last_access_flush < settings.TOPIC_CACHE["ACCESS_FLUSH_SECONDS"]:
+                return
+            pending = dict(_pending_access)
+            _pending_access.clear()
+            _last_access_flush = now
+
+        try:
+            get_redis_connection("default").zadd(ACCESS_KEY, pending)
+        except Exception as e:
+            print(f"⚠️ Acessos ao cache de análises não registrados: {e}")
+
+
+def flush_access_log() -> int:
+    """Grava em lote no Postgres os últimos acessos registrados no Redis"""
+    redis = get_redis_connection("default")
+    cutoff = time.time()
+    members = redis.zrangebyscore(ACCESS_KEY, "-inf", cutoff, withscores=True)
+
+    for start in range(0, len(members), PRUNE_BATCH_SIZE):
+        batch = [(m.decode().split("|", 2), score) for m, score in members[start:start + PRUNE_BATCH_SIZE]]
+        match = Q()
+        whens = []
+        for (version, depth, topic), score in batch:
+            condition = Q(topic=topic, depth=depth, prompt_version=int(version))
+            match |= condition
+            whens.append(When(condition, then=Value(datetime.fromtimestamp(score, timezone.utc))))
+        TopicCache.objects.filter(match).update(
+            last_accessed=Case(*whens, output_field=DateTimeField())
+        )
+
+    redis.zremrangebyscore(ACCESS_KEY, "-inf", cutoff)
+    return len(members)
+
+
+def prune_stale_entries(current_version: int) -> int:
+    """Remove análises sem acesso há PRUNE_AFTER_DAYS e as de versões de prompt antigas"""
+    flush_access_log()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.TOPIC_CACHE["PRUNE_AFTER_DAYS"])
+    deleted, _ = TopicCache.objects.filter(
+        Q(last_accessed__lt=cutoff)
+        | Q(last_accessed__isnull=True, created_at__lt=cutoff)
+        | ~Q(prompt_version=current_version)
+    ).delete()
+    return deleted
@@ -0,0 +1,189 @@
+import time
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from typing import NamedTuple
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django_redis import get_redis_connection
+from config.celery import enqueue
+from .buffer import InteractionBuffer
+from .models import TutorInteraction
+
+PREFIX = "ai_tutor:conversation"
+SUMMARIZE_LOCK_SECONDS = 120
+
+
+class ConversationContext(NamedTuple):
+    summary: str
+    turns: list      # [(pergunta, resposta)] do mais antigo ao mais recente, já cortados para o prompt
+    overflow: list   # TutorInteractions fora da janela e ainda não resumidas (mais antiga primeiro)
+    since: float = None  # Início da conversa atual, se o usuário pediu uma nova
+
+    @property
+    def is_empty(self):
+        return not self.summary and not self.turns
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata (sem tokenizer): ~4 caracteres por token em português"""
+    return len(text) // settings.TUTOR_CONVERSATION["CHARS_PER_TOKEN"] + 1
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * settings.TUTOR_CONVERSATION["CHARS_PER_TOKEN"]
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
+def _key(user_id, subject):
+    digest = hashlib.sha1((subject or "").strip().lower().encode()).hexdigest()[:16]
+    return f"{PREFIX}:{user_id}:{digest}"
+
+
+def _state(user_id, subject):
+    """
+    {"summary", "until", "since"}: resumo das interações com id <= until; `since` (epoch) marca o início
+    de uma conversa nova pedida pelo usuário. Expira com a sessão ociosa.
+    """
+    key = _key(user_id, subject)
+    try:
+        state = cache.get(key)
+        if state is None:
+            return {"summary": "", "until": 0, "since": None}
+        cache.touch(key, settings.TUTOR_CONVERSATION["IDLE_MINUTES"] * 60)  # Sessão ativa: o resumo não expira
+        return state
+    except Exception as e:
+        print(f"⚠️ Resumo da conversa indisponível: {e}")
+        return {"summary": "", "until": 0, "since": None}
+
+
+def save_summary(user_id, subject, summary: str, until: int, since: float = None):
+    cache.set(
+        _key(user_id, subject),
+        {"summary": summary, "until": until, "since": since},
+        settings.TUTOR_CONVERSATION["IDLE_MINUTES"] * 60,
+    )
+
+
+def reset_conversation(user_id, subject):
+    """Começa uma conversa nova: as interações anteriores deixam de entrar no contexto"""
+    last_id = (
+        TutorInteraction.objects.filter(user_id=user_id, subject__iexact=subject)
+        .order_by("-id").values_list("id", flat=True).first()
+    )
+    # `since` também cobre as interações ainda no buffer (gravadas depois com ids maiores)
+    save_summary(user_id, subject, "", last_id or 0, since=time.time())
+
+
+def _buffered_rows(user_id, subject):
+    """Turnos da conversa ainda no buffer de gravação em lote (sem id), mais recente primeiro"""
+    if not settings.TUTOR_INTERACTION_BUFFER["ENABLED"]:
+        return []
+    try:
+        entries = InteractionBuffer().pending(user_id, subject)
+    except Exception as e:
+        print(f"⚠️ Turnos pendentes da conversa indisponíveis: {e}")
+        return []
+    return [
+        SimpleNamespace(
+            id=None, question=entry["question"], answer=entry["answer"],
+            created_at=datetime.fromisoformat(entry["created_at"]),
+        )
+        for entry in reversed(entries)
+    ]
+
+
+def _session_rows(user_id, subject, until, since):
+    """Interações ainda não resumidas da sessão atual (para no primeiro intervalo ocioso), mais recente primeiro"""
+    config = settings.TUTOR_CONVERSATION
+    idle = timedelta(minutes=config["IDLE_MINUTES"])
+    oldest = timezone.now() - idle * config["MAX_TURNS_LOADED"]
+    if since:
+        oldest = max(oldest, datetime.fromtimestamp(since, dt_timezone.utc))
+
+    # O buffer é lido antes do banco: uma interação gravada entre as duas leituras aparece
+    # duplicada (e é descartada abaixo) em vez de sumir
+    buffered = [row for row in _buffered_rows(user_id, subject) if row.created_at > oldest]
+    stored = list(
+        TutorInteraction.objects.filter(user_id=user_id, subject__iexact=subject, id__gt=until, created_at__gt=oldest)
+        .order_by("-id")
+        .only("id", "question", "answer", "created_at")[:config["MAX_TURNS_LOADED"]]
+    )
+    seen = {(row.question, row.answer) for row in stored}
+    rows = [row for row in buffered if (row.question, row.answer) not in seen] + stored
+    rows.sort(key=lambda row: row.created_at, reverse=True)
+
+    session, previous = [], timezone.now()
+    for row in rows[:config["MAX_TURNS_LOADED"]]:
+        if previous - row.created_at > idle:
+            break
+        session.append(row)
+        previous = row.created_at
+    return session
+
+
+def load_context(user_id, subject) -> ConversationContext:
+    """
+    Contexto da conversa dentro do orçamento de tokens: resumo + últimos RECENT_TURNS turnos que couberem.
+    Nunca chama o LLM; os turnos que sobram ficam em `overflow` para o resumo em background.
+    """
+    config = settings.TUTOR_CONVERSATION
+    state = _state(user_id, subject)
+    rows = _session_rows(user_id, subject, state["until"], state.get("since"))
+
+    budget = config["TOKEN_BUDGET"] - estimate_tokens(state["summary"])
+    turns = []
+    for position, row in enumerate(rows):
+        if position >= config["RECENT_TURNS"]:
+            break
+        question = _clip(row.question, config["MAX_TURN_TOKENS"])
+        answer = _clip(row.answer, config["MAX_TURN_TOKENS"])
+        cost = estimate_tokens(question) + estimate_tokens(answer)
+        if turns and cost > budget:
+            break  # O turno mais recente entra sempre (cortado); os demais só se couberem
+        turns.append((question, answer))
+        budget -= cost
+
+    # Só turnos já gravados (com id) vão para o resumo; os do buffer esperam o flush
+    overflow = [row for row in reversed(rows[len(turns):]) if row.id is not None]
+    return ConversationContext(state["summary"], list(reversed(turns)), overflow, state.get("since"))
+
+
+def transcript(rows) -> str:
+    """Turnos (TutorInteractions) em texto corrido para o prompt de resumo"""
+    limit = settings.TUTOR_CONVERSATION["MAX_TURN_TOKENS"]
+    return "\n\n".join(f"Aluno: {_clip(row.question, limit)}\nTutor: {_clip(row.answer, limit)}" for row in rows)
+
+
+def render_history(context: ConversationContext) -> str:
+    """Bloco de histórico que antecede a pergunta no prompt do tutor"""
+    parts = []
+    if context.summary:
+        parts.append(f"Resumo da conversa até aqui: {context.summary}")
+    for question, answer in context.turns:
+        parts.append(f"Aluno: {question}\nTutor: {answer}")
+    return "\n\n".join(parts)
+
+
+def schedule_summary(user_id, subject, context: ConversationContext):
+    """Enfileira a compactação dos turnos excedentes no resumo (no máximo uma por conversa por vez)"""
+    if not context.overflow:
+        return
+    from .tasks import summarize_conversation
+
+    lock_key = f"{_key(user_id, subject)}:summarizing"
+    try:
+        redis = get_redis_connection("default")
+        if redis.set(lock_key, 1, nx=True, ex=SUMMARIZE_LOCK_SECONDS) and \
+                not enqueue(summarize_conversation, user_id, subject):
+            redis.delete(lock_key)
+    except Exception as e:
+        print(f"⚠️ Resumo da conversa não agendado: {e}")
+
+
+def release_summary_lock(user_id, subject):
+    try:
+        get_redis_connection("default").delete(f"{_key(user_id, subject)}:summarizing")
+    except Exception as e:
+        print(f"⚠️ Trava do resumo não liberada: {e}")
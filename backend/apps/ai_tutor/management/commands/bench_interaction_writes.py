@@ -0,0 +1,63 @@
+import time
+import statistics
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from apps.ai_tutor.buffer import InteractionBuffer
+from apps.ai_tutor.models import TutorInteraction
+
+User = get_user_model()
+
+BENCH_EMAIL = "bench-writes@studyflow.local"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a gravação das interações do chat: INSERT por request x buffer no Redis + bulk_create "
+        "(latência no caminho do request e vazão total, incluindo os flushes)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--answer-chars", type=int, default=3000, help="Tamanho de cada resposta")
+        parser.add_argument("--batch", type=int, default=settings.TUTOR_INTERACTION_BUFFER["BATCH_SIZE"])
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(email=BENCH_EMAIL, defaults={"name": "Bench Writes"})
+        answer = ("Um container isola processos com namespaces e cgroups. " * 100)[:options["answer_chars"]]
+        total = options["requests"]
+
+        def direct(i):
+            started = time.perf_counter()
+            TutorInteraction.objects.create(user=user, subject="Bench", question=f"pergunta {i}", answer=answer)
+            return time.perf_counter() - started
+
+        def buffered(i):
+            started = time.perf_counter()
+            buffer.add(user.id, "Bench", f"pergunta {i}", answer)
+            latency = time.perf_counter() - started
+            if (i + 1) % options["batch"] == 0 or i + 1 == total:
+                buffer.flush()  # Em produção roda no worker do Celery: fora da latência do request
+            return latency
+
+        # Flush chamado pelo próprio benchmark (sem disparo por tamanho via Celery)
+        config = {**settings.TUTOR_INTERACTION_BUFFER, "BATCH_SIZE": total + 1}
+        self.stdout.write(f"{'modo':<8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'total (s)':>10} {'linhas/s':>9}")
+        try:
+            with override_settings(TUTOR_INTERACTION_BUFFER=config):
+                buffer = InteractionBuffer()
+                for name, write in (("direto", direct), ("buffer", buffered)):
+                    TutorInteraction.objects.filter(user=user).delete()
+                    started = time.perf_counter()
+                    latencies = sorted(write(i) for i in range(total))
+                    elapsed = time.perf_counter() - started  # Inclui os flushes
+
+                    saved = TutorInteraction.objects.filter(user=user).count()
+                    self.stdout.write(
+                        f"{name:<8} {statistics.median(latencies) * 1000:>9.2f} "
+                        f"{latencies[int(len(latencies) * 0.95)] * 1000:>9.2f} "
+                        f"{elapsed:>10.2f} {saved / elapsed:>9.0f}"
+                    )
+        finally:
+            TutorInteraction.objects.filter(user=user).delete()
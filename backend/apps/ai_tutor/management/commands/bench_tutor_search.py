@@ -0,0 +1,97 @@
+import time
+import statistics
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from apps.ai_tutor.models import TutorInteraction
+from apps.ai_tutor.search import ranked_ids, search_history
+
+User = get_user_model()
+
+BENCH_EMAIL = "bench-search@studyflow.local"
+BATCH_SIZE = 100_000
+
+VOCABULARY = [
+    "python", "django", "redis", "postgres", "docker", "kubernetes", "react", "typescript",
+    "consulta", "cache", "fila", "índice", "transação", "container", "componente", "função",
+    "variável", "servidor", "requisição", "resposta", "memória", "processo", "thread", "latência",
+    "escalabilidade", "replicação", "particionamento", "autenticação", "token", "sessão", "rede",
+    "algoritmo", "complexidade", "ordenação", "árvore", "grafo", "hash", "lista", "pilha", "vetor",
+]
+SUBJECTS = ["Programação", "Banco de Dados", "DevOps", "Front-end", "Algoritmos"]
+# Cada resposta tem ~3 palavras do vocabulário no meio de termos de preenchimento;
+# o termo raro aparece em 1 de cada 5000 perguntas
+RARE_WORD = "idempotência"
+
+INSERT_SQL = """
+INSERT INTO ai_tutor_tutorinteraction (user_id, subject, question, answer, created_at)
+SELECT
+    %(user_id)s,
+    (%(subjects)s::text[])[1 + g %% 5],
+    'Como funciona ' || v[1 + (g * 7) %% n] || ' com ' || v[1 + (g * 13) %% n]
+        || CASE WHEN g %% 5000 = 0 THEN ' e ' || %(rare)s ELSE '' END || '?',
+    (SELECT string_agg(CASE WHEN i %% 40 = 0 THEN v[1 + ((g * 31 + i * 17) %% n)]
+                            ELSE 'termo' || ((g * 7919 + i * 104729) %% 50000) END, ' ')
+     FROM generate_series(1, %(words)s) i),
+    now() - make_interval(secs => g)
+FROM generate_series(%(start)s, %(stop)s) g,
+     LATERAL (SELECT %(vocabulary)s::text[] AS v, %(n)s AS n) vocab
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara icontains x tsvector/GIN na busca do histórico do tutor sobre um corpus sintético "
+        "(padrão: 1 milhão de interações de um usuário de benchmark, apagadas ao final)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--words", type=int, default=120, help="Palavras por resposta sintética")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--keep", action="store_true", help="Mantém o corpus para rodadas seguintes")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(email=BENCH_EMAIL, defaults={"name": "Bench Search"})
+        try:
+            self._fill(user, options["rows"], options["words"])
+            self.stdout.write(f"{'busca':<28} {'icontains (ms)':>15} {'tsvector (ms)':>14} {'achados':>8}")
+            for term in ("redis", "transação", RARE_WORD):
+                legacy = self._median(options["repeat"], lambda: self._icontains(user, term))
+                fts = self._median(options["repeat"], lambda: search_history(user, term))
+                found = len(ranked_ids(user, term, limit=10_000))
+                self.stdout.write(f"{term:<28} {legacy:>15.1f} {fts:>14.1f} {found:>8}")
+        finally:
+            if not options["keep"]:
+                TutorInteraction.objects.filter(user=user).delete()
+
+    def _fill(self, user, rows, words):
+        existing = TutorInteraction.objects.filter(user=user).count()
+        for start in range(existing + 1, rows + 1, BATCH_SIZE):
+            stop = min(start + BATCH_SIZE - 1, rows)
+            with connection.cursor() as cursor:
+                cursor.execute(INSERT_SQL, {
+                    "user_id": user.id, "subjects": SUBJECTS, "vocabulary": VOCABULARY, "n": len(VOCABULARY),
+                    "rare": RARE_WORD, "words": words, "start": start, "stop": stop,
+                })
+            self.stdout.write(f"  {stop}/{rows} interações sintéticas")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE ai_tutor_tutorinteraction")
+
+    @staticmethod
+    def _icontains(user, term):
+        """Busca ingênua: varre pergunta e resposta de todas as linhas do usuário"""
+        queryset = TutorInteraction.objects.filter(user=user)
+        for word in term.split():
+            queryset = queryset.filter(Q(question__icontains=word) | Q(answer__icontains=word))
+        return list(queryset.order_by("-created_at").values_list("id", flat=True)[:20])
+
+    @staticmethod
+    def _median(repeat, fn):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,55 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.ai_tutor.models import TopicCache
+from apps.llm.topics import canonical_topic
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede quantas chamadas ao Gemini o TopicCache teria evitado com chaves canônicas "
+        "(acentos, caixa, pontuação, stop words e apelidos). Com --apply, migra as linhas para as novas chaves."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help="Regrava as chaves e remove entradas duplicadas")
+        parser.add_argument('--top', type=int, default=10, help="Quantos grupos mesclados listar")
+
+    def handle(self, *args, **options):
+        groups = defaultdict(list)
+        rows = TopicCache.objects.only('id', 'topic', 'depth', 'prompt_version', 'created_at')
+        for row in rows.order_by('created_at', 'id'):
+            groups[(canonical_topic(row.topic), row.depth, row.prompt_version)].append(row)
+
+        total = sum(len(rows) for rows in groups.values())
+        if not total:
+            self.stdout.write("TopicCache vazio, nada a analisar.")
+            return
+
+        # Cada linha existente foi um cache miss pago; com a chave canônica, só a primeira de cada grupo seria
+        avoided = total - len(groups)
+        self.stdout.write(
+            f"Entradas: {total} | Chaves canônicas: {len(groups)} | "
+            f"Chamadas evitáveis: {avoided} ({avoided / total:.1%} dos misses viram hits)"
+        )
+
+        merged = sorted((g for g in groups.items() if len(g[1]) > 1), key=lambda g: -len(g[1]))
+        for (key, depth, _), rows in merged[:options['top']]:
+            variants = ", ".join(sorted({row.topic for row in rows}))
+            self.stdout.write(f"  {key} ({depth}): {len(rows)} entradas <- {variants}")
+
+        if options['apply']:
+            self._apply(groups)
+
+    def _apply(self, groups):
+        """Mantém a entrada mais antiga de cada grupo, já com a chave canônica"""
+        removed = renamed = 0
+        with transaction.atomic():
+            for (key, _, _), rows in groups.items():
+                keeper, duplicates = rows[0], rows[1:]
+                if duplicates:
+                    removed += TopicCache.objects.filter(id__in=[row.id for row in duplicates]).delete()[0]
+                if keeper.topic != key:
+                    TopicCache.objects.filter(id=keeper.id).update(topic=key)
+                    renamed += 1
+        self.stdout.write(self.style.SUCCESS(f"✅ {renamed} chaves regravadas, {removed} duplicatas removidas"))
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.ai_tutor.models import TutorInteractionArchive
+from apps.ai_tutor.partitions import DEFAULT_PARTITION, archive_expired, ensure_partitions, list_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Lista as partições mensais do histórico do tutor e cria as dos próximos meses. "
+        "Com --archive, move para o arquivo comprimido as que passaram da janela de retenção."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive', action='store_true', help="Arquiva as partições expiradas")
+        parser.add_argument(
+            '--retention-months', type=int, default=settings.TUTOR_HISTORY_PARTITIONS["RETENTION_MONTHS"]
+        )
+
+    def handle(self, *args, **options):
+        for name in ensure_partitions():
+            self.stdout.write(f"Partição criada: {name}")
+
+        if options['archive']:
+            archived = archive_expired(options['retention_months'])
+            for name, rows in archived.items():
+                self.stdout.write(f"Arquivada: {name} ({rows} interações)")
+            if not archived:
+                self.stdout.write("Nenhuma partição além da retenção.")
+
+        self.stdout.write(f"{'partição':<42} {'linhas (est.)':>14} {'tamanho':>10}")
+        with connection.cursor() as cursor:
+            for name in [name for name, _ in list_partitions()] + [DEFAULT_PARTITION]:
+                cursor.execute(
+                    "SELECT reltuples::bigint, pg_size_pretty(pg_total_relation_size(oid)) "
+                    "FROM pg_class WHERE oid = %s::regclass",
+                    [name],
+                )
+                rows, size = cursor.fetchone()
+                self.stdout.write(f"{name:<42} {max(rows, 0):>14} {size:>10}")
+        self.stdout.write(f"Arquivo: {TutorInteractionArchive.objects.count()} interações")
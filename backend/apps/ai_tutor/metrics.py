@@ -0,0 +1,23 @@
+from prometheus_client import Counter
+
+# Leituras do cache de análises por camada (tier: local, redis, db; result: hit, miss)
+TOPIC_CACHE_LOOKUPS = Counter(
+    "studyflow_topic_cache_lookups_total",
+    "Leituras do cache de análises de tópicos, por camada e resultado",
+    ["tier", "result"],
+)
+
+# Prefetch das demais depths após o 'initial'
+# (event: scheduled, rate_limited, skipped_cached, generated, used, missed)
+PREFETCH_EVENTS = Counter(
+    "studyflow_topic_prefetch_events_total",
+    "Eventos do prefetch especulativo de análises",
+    ["event"],
+)
+
+# Perguntas do chat respondidas (hit) ou não (miss) pelo índice de perguntas equivalentes
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    "studyflow_tutor_semantic_cache_lookups_total",
+    "Consultas ao cache semântico de respostas do AI Tutor",
+    ["result"],
+)
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='topiccache',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='topiccache',
+            name='prompt_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AlterUniqueTogether(
+            name='topiccache',
+            unique_together={('topic', 'depth', 'prompt_version')},
+        ),
+    ]
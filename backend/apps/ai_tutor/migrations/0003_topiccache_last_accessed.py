@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0002_topiccache_prompt_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topiccache',
+            name='last_accessed',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0003_topiccache_last_accessed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tutorinteraction',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='tutor_history_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0004_tutorinteraction_history_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tutorinteraction',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('question', config='portuguese', weight='A'), '||', django.contrib.postgres.search.SearchVector('answer', config='portuguese', weight='B'), django.contrib.postgres.search.SearchConfig('portuguese')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='tutorinteraction',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='tutor_search_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0005_tutorinteraction_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tutorinteraction',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0006_tutorinteraction_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TutorInteractionArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('subject', models.CharField(max_length=100)),
+                ('question', models.TextField()),
+                ('answer_preview', models.CharField(max_length=201)),
+                ('answer_compressed', models.BinaryField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_interactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='tutor_archive_history_idx')],
+            },
+        ),
+        # Já vem comprimida pelo zlib: o TOAST não precisa tentar comprimir de novo
+        migrations.RunSQL(
+            "ALTER TABLE ai_tutor_tutorinteractionarchive ALTER COLUMN answer_compressed SET STORAGE EXTERNAL",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,119 @@
+from django.db import migrations
+
+# Recria ai_tutor_tutorinteraction como tabela particionada por mês de created_at.
+# - A PK passa a ser (id, created_at): o Postgres exige a chave de partição em toda constraint única.
+#   Para o Django o pk continua sendo só o id (único de fato, vem de uma sequence).
+# - Até o PG 16 tabela particionada não aceita coluna IDENTITY: o id usa uma sequence própria.
+# - As partições dos meses seguintes e o arquivamento das antigas ficam em partitions.py (task diária).
+# O estado dos models não muda, então é só SQL.
+
+SEARCH_VECTOR = """
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese'::regconfig, COALESCE(question, '')), 'A')
+        || setweight(to_tsvector('portuguese'::regconfig, COALESCE(answer, '')), 'B')
+    ) STORED
+"""
+
+INDEXES = """
+CREATE INDEX ai_tutor_tutorinteraction_user_id_b8bed0d9 ON ai_tutor_tutorinteraction (user_id);
+CREATE INDEX tutor_history_idx ON ai_tutor_tutorinteraction (user_id, created_at DESC, id DESC);
+CREATE INDEX tutor_search_idx ON ai_tutor_tutorinteraction USING gin (search_vector);
+ALTER TABLE ai_tutor_tutorinteraction
+    ADD CONSTRAINT ai_tutor_tutorintera_user_id_b8bed0d9_fk_usuarios_
+    FOREIGN KEY (user_id) REFERENCES usuarios_usuario (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+COLUMNS = "id, user_id, subject, question, answer, created_at"
+
+PARTITION = f"""
+ALTER TABLE ai_tutor_tutorinteraction RENAME TO ai_tutor_tutorinteraction_unpartitioned;
+ALTER TABLE ai_tutor_tutorinteraction_unpartitioned
+    RENAME CONSTRAINT ai_tutor_tutorinteraction_pkey TO ai_tutor_tutorinteraction_unpartitioned_pkey;
+
+CREATE TABLE ai_tutor_tutorinteraction (
+    id bigint NOT NULL,
+    subject varchar(100) NOT NULL,
+    question text NOT NULL,
+    answer text NOT NULL,
+    created_at timestamptz NOT NULL,
+    user_id bigint NOT NULL,
+    {SEARCH_VECTOR},
+    CONSTRAINT ai_tutor_tutorinteraction_pkey PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Rede de segurança para datas fora das partições criadas
+CREATE TABLE ai_tutor_tutorinteraction_default PARTITION OF ai_tutor_tutorinteraction DEFAULT;
+
+-- Uma partição por mês, do registro mais antigo até 3 meses à frente
+DO $$
+DECLARE
+    month date := date_trunc('month', LEAST(
+        COALESCE((SELECT min(created_at) FROM ai_tutor_tutorinteraction_unpartitioned), now()), now()
+    ) AT TIME ZONE 'UTC')::date;
+    last_month date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months')::date;
+BEGIN
+    WHILE month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF ai_tutor_tutorinteraction FOR VALUES FROM (%L) TO (%L)',
+            'ai_tutor_tutorinteraction_p' || to_char(month, 'YYYY_MM'),
+            month::timestamp AT TIME ZONE 'UTC',
+            (month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+        month := (month + interval '1 month')::date;
+    END LOOP;
+END $$;
+
+INSERT INTO ai_tutor_tutorinteraction ({COLUMNS})
+SELECT {COLUMNS} FROM ai_tutor_tutorinteraction_unpartitioned;
+
+DROP TABLE ai_tutor_tutorinteraction_unpartitioned;
+
+CREATE SEQUENCE ai_tutor_tutorinteraction_id_seq OWNED BY ai_tutor_tutorinteraction.id;
+SELECT setval(
+    'ai_tutor_tutorinteraction_id_seq', COALESCE((SELECT max(id) FROM ai_tutor_tutorinteraction), 0) + 1, false
+);
+ALTER TABLE ai_tutor_tutorinteraction ALTER COLUMN id SET DEFAULT nextval('ai_tutor_tutorinteraction_id_seq');
+
+{INDEXES}
+"""
+
+UNPARTITION = f"""
+ALTER TABLE ai_tutor_tutorinteraction RENAME TO ai_tutor_tutorinteraction_partitioned;
+ALTER TABLE ai_tutor_tutorinteraction_partitioned
+    RENAME CONSTRAINT ai_tutor_tutorinteraction_pkey TO ai_tutor_tutorinteraction_partitioned_pkey;
+ALTER SEQUENCE ai_tutor_tutorinteraction_id_seq RENAME TO ai_tutor_tutorinteraction_partitioned_id_seq;
+DROP INDEX ai_tutor_tutorinteraction_user_id_b8bed0d9, tutor_history_idx, tutor_search_idx;
+
+CREATE TABLE ai_tutor_tutorinteraction (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    subject varchar(100) NOT NULL,
+    question text NOT NULL,
+    answer text NOT NULL,
+    created_at timestamptz NOT NULL,
+    user_id bigint NOT NULL,
+    {SEARCH_VECTOR}
+);
+
+INSERT INTO ai_tutor_tutorinteraction ({COLUMNS})
+SELECT {COLUMNS} FROM ai_tutor_tutorinteraction_partitioned;
+
+SELECT setval(
+    pg_get_serial_sequence('ai_tutor_tutorinteraction', 'id'),
+    COALESCE((SELECT max(id) FROM ai_tutor_tutorinteraction), 0) + 1, false
+);
+
+DROP TABLE ai_tutor_tutorinteraction_partitioned CASCADE;
+
+{INDEXES}
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0007_tutorinteractionarchive'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION, UNPARTITION),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0008_partition_tutorinteraction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InteractionFlush',
+            fields=[
+                ('flush_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('applied_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
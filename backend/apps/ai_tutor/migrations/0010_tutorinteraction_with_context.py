@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_tutor', '0009_interactionflush'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tutorinteraction',
+            name='with_context',
+            field=models.BooleanField(db_default=False, default=False),
+        ),
+    ]
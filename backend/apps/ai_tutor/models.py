@@ -1,16 +1,75 @@
+import zlib
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 
 class TutorInteraction(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="ai_interactions")
     subject = models.CharField(max_length=100, default="Geral")
     question = models.TextField()
     answer = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Resposta a uma pergunta de continuação (dependia da conversa): fica fora do cache semântico
+    with_context = models.BooleanField(default=False, db_default=False)
+    # Default em vez de auto_now_add: a gravação em lote (buffer) preserva o horário da pergunta
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Busca textual do histórico: calculada pelo próprio Postgres a cada escrita (pergunta pesa mais que resposta)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector("question", weight="A", config="portuguese")
+            + SearchVector("answer", weight="B", config="portuguese")
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # Histórico paginado por cursor: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=["user", "-created_at", "-id"], name="tutor_history_idx"),
+            GinIndex(fields=["search_vector"], name="tutor_search_idx"),
+        ]
 
-    class Meta: ordering = ["-created_at"]
     def __str__(self): return f"{self.user.email} - {self.subject}"
 
+class TutorInteractionArchive(models.Model):
+    """
+    Interações de partições mensais que passaram da janela de retenção (ver partitions.py).
+    Mantém o id original; a resposta fica comprimida com zlib e só o começo dela em texto.
+    """
+    PREVIEW_CHARS = 201
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_interactions")
+    subject = models.CharField(max_length=100)
+    question = models.TextField()
+    answer_preview = models.CharField(max_length=PREVIEW_CHARS)
+    answer_compressed = models.BinaryField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["user", "-created_at", "-id"], name="tutor_archive_history_idx")]
+
+    @property
+    def answer(self):
+        return zlib.decompress(bytes(self.answer_compressed)).decode()
+
+    def __str__(self): return f"Arquivo: {self.user_id} - {self.subject}"
+
+class InteractionFlush(models.Model):
+    """
+    Lotes do buffer de interações (buffer.py) já gravados no Postgres, na mesma transação do bulk_create:
+    se a limpeza das chaves no Redis falhar depois do commit, o próximo flush descarta o lote em vez de inserir de novo.
+    """
+    flush_id = models.CharField(max_length=32, primary_key=True)
+    applied_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self): return self.flush_id
+
 # --- CORREÇÃO AQUI ---
 class TopicCache(models.Model):
     # Removido unique=True, mantido apenas db_index=True para performance
@@ -18,11 +77,15 @@ class TopicCache(models.Model):
     
     data = models.JSONField() 
     depth = models.CharField(max_length=20, default="initial")
+    # Versão dos prompts/schemas que gerou a análise (mudar a versão invalida o cache inteiro)
+    prompt_version = models.PositiveSmallIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Último acesso consolidado em lote a partir do Redis (usado na limpeza de tópicos frios)
+    last_accessed = models.DateTimeField(null=True, blank=True, db_index=True)
 
     class Meta:
-        # Garante que não existam dois "redis" do tipo "initial", 
+        # Garante que não existam dois "redis" do tipo "initial" na mesma versão,
         # mas permite "redis" + "initial" E "redis" + "deep"
-        unique_together = ('topic', 'depth')
+        unique_together = ('topic', 'depth', 'prompt_version')
 
     def __str__(self): return f"Cache: {self.topic} ({self.depth})"
\ No newline at end of file
@@ -0,0 +1,146 @@
+import re
+import zlib
+from datetime import date, datetime, timezone
+from django.conf import settings
+from django.db import connection, transaction
+from .models import TutorInteraction, TutorInteractionArchive
+
+PARENT = TutorInteraction._meta.db_table
+DEFAULT_PARTITION = f"{PARENT}_default"
+# Colunas gravadas (search_vector é gerada pelo Postgres)
+COLUMNS = "id, user_id, subject, question, answer, created_at"
+# Ao mover linhas entre partições vai também o que o arquivo não guarda
+MOVED_COLUMNS = f"{COLUMNS}, with_context"
+
+_PARTITION_NAME = re.compile(rf"^{PARENT}_p(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month.year:04d}_{month.month:02d}"
+
+
+def list_partitions() -> list:
+    """[(nome, primeiro dia do mês)] das partições mensais existentes, em ordem"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [PARENT],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append((name, date(int(match[1]), int(match[2]), 1)))
+    return sorted(months, key=lambda item: item[1])
+
+
+def create_partition(month: date) -> bool:
+    """
+    Cria a partição do mês (se não existir). Linhas do mês que caíram na partição DEFAULT
+    são movidas para ela na mesma transação. Retorna True se criou.
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        in_range = "created_at >= %s AND created_at < %s"
+        cursor.execute(
+            f"CREATE TEMP TABLE moved_rows AS "
+            f"SELECT {MOVED_COLUMNS} FROM {DEFAULT_PARTITION} WHERE {in_range}",
+            [start, end],
+        )
+        cursor.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}", [start, end])
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM (%s) TO (%s)", [start, end]
+        )
+        cursor.execute(f"INSERT INTO {PARENT} ({MOVED_COLUMNS}) SELECT {MOVED_COLUMNS} FROM moved_rows")
+        cursor.execute("DROP TABLE moved_rows")
+    return True
+
+
+def ensure_partitions(months_ahead: int = None) -> list:
+    """Garante as partições do mês atual e dos próximos meses (a DEFAULT só pega o que escapar)"""
+    months_ahead = settings.TUTOR_HISTORY_PARTITIONS["MONTHS_AHEAD"] if months_ahead is None else months_ahead
+    current = month_start(datetime.now(timezone.utc))
+    return [
+        partition_name(month)
+        for month in (add_months(current, offset) for offset in range(months_ahead + 1))
+        if create_partition(month)
+    ]
+
+
+def compress_answer(answer: str) -> bytes:
+    return zlib.compress(answer.encode(), settings.TUTOR_HISTORY_PARTITIONS["COMPRESSION_LEVEL"])
+
+
+def _archive_rows(cursor) -> int:
+    """Copia as linhas lidas do cursor para o arquivo, em lotes, comprimindo as respostas"""
+    config = settings.TUTOR_HISTORY_PARTITIONS
+    preview_chars = TutorInteractionArchive.PREVIEW_CHARS
+    total = 0
+    while True:
+        batch = cursor.fetchmany(config["ARCHIVE_BATCH_SIZE"])
+        if not batch:
+            return total
+        TutorInteractionArchive.objects.bulk_create(
+            [
+                TutorInteractionArchive(
+                    id=row_id, user_id=user_id, subject=subject, question=question,
+                    answer_preview=answer[:preview_chars], answer_compressed=compress_answer(answer),
+                    created_at=created_at,
+                )
+                for row_id, user_id, subject, question, answer, created_at in batch
+            ],
+            ignore_conflicts=True,  # Reexecução após uma falha no meio do caminho
+        )
+        total += len(batch)
+
+
+def archive_partition(name: str) -> int:
+    """Move uma partição inteira para o arquivo e a descarta (DETACH + DROP: sem DELETE nem VACUUM)"""
+    with transaction.atomic():
+        with connection.chunked_cursor() as cursor:  # Cursor no servidor: a partição não vem toda para a memória
+            cursor.execute(f"SELECT {COLUMNS} FROM {name}")
+            moved = _archive_rows(cursor)
+        with connection.cursor() as cursor:
+            # FKs deferidas de linhas gravadas nesta mesma transação impediriam o DROP
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+    return moved
+
+
+def archive_expired(retention_months: int = None) -> dict:
+    """Arquiva as partições (e as linhas da DEFAULT) mais antigas que a janela de retenção"""
+    if retention_months is None:
+        retention_months = settings.TUTOR_HISTORY_PARTITIONS["RETENTION_MONTHS"]
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+
+    archived = {}
+    for name, month in list_partitions():
+        if add_months(month, 1) <= cutoff:
+            archived[name] = archive_partition(name)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < %s RETURNING {COLUMNS}", [cutoff.isoformat()]
+            )
+            moved = _archive_rows(cursor)
+    if moved:
+        archived[DEFAULT_PARTITION] = moved
+    return archived
@@ -0,0 +1,75 @@
+import time
+import hashlib
+from django.conf import settings
+from django_redis import get_redis_connection
+from config.celery import enqueue
+from .metrics import PREFETCH_EVENTS
+
+PREFIX = "ai_tutor:prefetch"
+
+
+def _digest(clean_topic):
+    return hashlib.sha1(clean_topic.encode()).hexdigest()[:16]
+
+
+def schedule_prefetch(topic, clean_topic, prompt_version):
+    """
+    Depois de servir o 'initial', enfileira as demais depths do tópico.
+    Uma vez por tópico a cada DEDUPE_SECONDS e no máximo MAX_PER_MINUTE tópicos por minuto (global).
+    """
+    config = settings.AI_TUTOR_PREFETCH
+    if not config["ENABLED"]:
+        return
+    from .tasks import prefetch_analyses
+
+    dedupe_key = f"{PREFIX}:topic:v{prompt_version}:{_digest(clean_topic)}"
+    rate_key = f"{PREFIX}:rate:{int(time.time() // 60)}"
+    try:
+        redis = get_redis_connection("default")
+        if not redis.set(dedupe_key, 1, nx=True, ex=config["DEDUPE_SECONDS"]):
+            return
+
+        pipe = redis.pipeline()
+        pipe.incr(rate_key)
+        pipe.expire(rate_key, 120)
+        scheduled_this_minute, _ = pipe.execute()
+        if scheduled_this_minute > config["MAX_PER_MINUTE"]:
+            redis.delete(dedupe_key)  # Tenta de novo na próxima vez que o tópico for pedido
+            PREFETCH_EVENTS.labels("rate_limited").inc()
+            return
+
+        if enqueue(prefetch_analyses, topic):
+            PREFETCH_EVENTS.labels("scheduled").inc()
+        else:
+            redis.delete(dedupe_key)
+    except Exception as e:
+        print(f"⚠️ Prefetch das análises não agendado: {e}")
+
+
+def mark_prefetched(clean_topic, depth, prompt_version):
+    """Marca a análise como gerada por prefetch para medir se ela chega a ser usada"""
+    PREFETCH_EVENTS.labels("generated").inc()
+    try:
+        get_redis_connection("default").set(
+            f"{PREFIX}:made:v{prompt_version}:{depth}:{_digest(clean_topic)}", 1,
+            ex=settings.AI_TUTOR_PREFETCH["DEDUPE_SECONDS"] * 7,
+        )
+    except Exception as e:
+        print(f"⚠️ Prefetch não registrado: {e}")
+
+
+def note_drilldown(clean_topic, depth, prompt_version, cache_hit: bool):
+    """
+    Conta o resultado de um aprofundamento (depth != initial):
+    used = hit numa análise feita pelo prefetch; missed = o usuário esperou o Gemini.
+    Taxa de acerto do prefetch = used / generated.
+    """
+    if not cache_hit:
+        PREFETCH_EVENTS.labels("missed").inc()
+        return
+    try:
+        made_key = f"{PREFIX}:made:v{prompt_version}:{depth}:{_digest(clean_topic)}"
+        if get_redis_connection("default").delete(made_key):
+            PREFETCH_EVENTS.labels("used").inc()
+    except Exception as e:
+        print(f"⚠️ Uso do prefetch não registrado: {e}")
@@ -0,0 +1,54 @@
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F
+from django.utils.html import escape
+from .models import TutorInteraction
+
+SEARCH_CONFIG = "portuguese"
+
+# Marcadores que não aparecem em texto normal: o trecho é escapado antes de virarem <mark>
+_START, _STOP = "\x02", "\x03"
+
+
+def search_query(text: str) -> SearchQuery:
+    """Sintaxe de busca web: palavras, "frase exata", -exclusão e OR"""
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+
+
+def ranked_ids(user, text: str, subject: str = None, limit: int = 20) -> list:
+    """[(id, rank)] das interações do usuário que batem com a busca, mais relevantes primeiro (índice GIN)"""
+    query = search_query(text)
+    queryset = TutorInteraction.objects.filter(user=user, search_vector=query)
+    if subject:
+        queryset = queryset.filter(subject=subject)
+    return list(
+        queryset.annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "-id")
+        .values_list("id", "rank")[:limit]
+    )
+
+
+def search_history(user, text: str, subject: str = None, limit: int = 20) -> list:
+    """
+    Busca textual no histórico do tutor com trechos destacados da resposta.
+
+    Em duas etapas: o ranking usa só o tsvector indexado; o ts_headline (que relê a resposta
+    inteira) roda depois, apenas para as `limit` interações que vão para a tela.
+    """
+    ranks = dict(ranked_ids(user, text, subject, limit))
+    if not ranks:
+        return []
+
+    rows = (
+        TutorInteraction.objects.filter(id__in=ranks)
+        .only("id", "subject", "question", "created_at")
+        .annotate(snippet=SearchHeadline(
+            "answer", search_query(text), config=SEARCH_CONFIG,
+            start_sel=_START, stop_sel=_STOP, max_words=35, min_words=15, max_fragments=2,
+        ))
+    )
+    results = []
+    for row in rows:
+        row.rank = ranks[row.id]
+        row.snippet = escape(row.snippet).replace(_START, "<mark>").replace(_STOP, "</mark>")
+        results.append(row)
+    return sorted(results, key=lambda row: (-row.rank, -row.id))
@@ -0,0 +1,179 @@
+import re
+import math
+import zlib
+import threading
+import numpy as np
+from django.conf import settings
+from apps.llm.lru import BoundedLRU
+from apps.llm.topics import STOP_WORDS, fold_accents
+from .metrics import SEMANTIC_CACHE_LOOKUPS
+from .models import TutorInteraction
+
+# Palavras que só formulam a pergunta ("o que é docker" == "explica docker" == "docker")
+QUESTION_WORDS = STOP_WORDS | {
+    "que", "oque", "qual", "quais", "quem", "e", "eh", "sao", "seria", "seriam",
+    "me", "explica", "explique", "explicar", "explicacao", "fale", "fala", "falar",
+    "significa", "significado", "definicao", "defina", "conceito",
+    "voce", "pode", "poderia", "favor", "duvida", "pergunta",
+}
+
+_SEPARATORS = re.compile(r"[^\w+#]+")
+
+MAX_QUESTION_CHARS = 500
+MIN_QUESTION_CHARS = 3
+
+_indexes = None
+_build_lock = threading.Lock()
+
+
+def normalize_question(question: str) -> str:
+    """Texto comparável da pergunta: sem acento, caixa, pontuação e palavras de formulação"""
+    words = _SEPARATORS.sub(" ", fold_accents(question[:MAX_QUESTION_CHARS]).lower()).split()
+    return " ".join(word for word in words if word not in QUESTION_WORDS)
+
+
+def _ngram_counts(text: str, n: int, dimensions: int) -> dict:
+    """Contagem dos n-gramas de caracteres (por palavra, com bordas) espalhados em `dimensions` buckets"""
+    counts = {}
+    for word in text.split():
+        padded = f" {word} "
+        for start in range(max(len(padded) - n + 1, 1)):
+            bucket = zlib.crc32(padded[start:start + n].encode()) % dimensions
+            counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+class SubjectIndex:
+    """
+    Índice de similaridade das perguntas já respondidas de uma matéria.
+
+    Cada pergunta vira um vetor TF-IDF de n-gramas de caracteres (hashing trick, sem vocabulário),
+    normalizado: a similaridade de cosseno contra todas as perguntas é um único produto matriz-vetor.
+    O IDF é calculado na montagem; perguntas adicionadas depois usam o mesmo IDF até a próxima montagem.
+    """
+
+    def __init__(self, pairs, ngram: int, dimensions: int):
+        self.ngram = ngram
+        self.dimensions = dimensions
+        self.answers = []
+        self._seen = {}   # pergunta normalizada -> linha
+        counts = []
+        for question, answer in pairs:
+            text = normalize_question(question)
+            if len(text) < MIN_QUESTION_CHARS or text in self._seen:
+                continue  # Os pares chegam do mais recente ao mais antigo: fica a resposta mais nova
+            self._seen[text] = len(self.answers)
+            self.answers.append(answer)
+            counts.append(_ngram_counts(text, ngram, dimensions))
+
+        document_frequency = np.zeros(dimensions, dtype=np.float32)
+        for row in counts:
+            document_frequency[list(row)] += 1
+        self.idf = np.log((1 + len(counts)) / (1 + document_frequency)).astype(np.float32) + 1
+
+        self.matrix = np.zeros((len(counts), dimensions), dtype=np.float32)
+        for i, row in enumerate(counts):
+            self.matrix[i] = self._weigh(row)
+
+    def _weigh(self, counts: dict):
+        """TF sublinear x IDF, normalizado (norma L2 = 1)"""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for bucket, count in counts.items():
+            vector[bucket] = (1 + math.log(count)) * self.idf[bucket]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, question: str):
+        """(resposta, similaridade) da pergunta mais parecida, ou (None, 0.0)"""
+        text = normalize_question(question)
+        if not self.answers or len(text) < MIN_QUESTION_CHARS:
+            return None, 0.0
+        if text in self._seen:
+            return self.answers[self._seen[text]], 1.0
+
+        scores = self.matrix @ self._weigh(_ngram_counts(text, self.ngram, self.dimensions))
+        best = int(np.argmax(scores))
+        return self.answers[best], float(scores[best])
+
+    def add(self, question: str, answer: str):
+        text = normalize_question(question)
+        if len(text) < MIN_QUESTION_CHARS or text in self._seen:
+            return
+        self._seen[text] = len(self.answers)
+        self.answers.append(answer)
+        vector = self._weigh(_ngram_counts(text, self.ngram, self.dimensions))
+        self.matrix = np.vstack([self.matrix, vector])
+
+    @property
+    def size_bytes(self):
+        return self.matrix.nbytes + sum(len(answer) for answer in self.answers)
+
+
+def _subject_key(subject: str) -> str:
+    return (subject or "").strip().lower() or "geral"
+
+
+def _index_tier():
+    """Índices por matéria no worker; o TTL força a remontagem com as respostas dos outros workers"""
+    global _indexes
+    if _indexes is None:
+        config = settings.TUTOR_SEMANTIC_CACHE
+        _indexes = BoundedLRU(config["MAX_SUBJECTS"], config["MAX_BYTES"], config["REBUILD_SECONDS"])
+    return _indexes
+
+
+def clear_semantic_index():
+    _index_tier().clear()
+
+
+def _build(subject: str) -> SubjectIndex:
+    config = settings.TUTOR_SEMANTIC_CACHE
+    pairs = (
+        TutorInteraction.objects.filter(subject__iexact=subject, with_context=False)
+        .exclude(answer__startswith="Erro")
+        .order_by("-created_at")
+        .values_list("question", "answer")[:config["MAX_ENTRIES_PER_SUBJECT"]]
+    )
+    return SubjectIndex(pairs, config["NGRAM"], config["DIMENSIONS"])
+
+
+def _subject_index(subject: str) -> SubjectIndex:
+    key = _subject_key(subject)
+    tier = _index_tier()
+    index = tier.get(key)
+    if index is None:
+        with _build_lock:
+            index = tier.get(key)
+            if index is None:
+                index = _build(subject)
+                tier.set(key, index, size=index.size_bytes)
+    return index
+
+
+def find_similar_answer(question: str, subject: str):
+    """Resposta já dada a uma pergunta equivalente da mesma matéria, ou None (segue para o LLM)"""
+    config = settings.TUTOR_SEMANTIC_CACHE
+    if not config["ENABLED"]:
+        return None
+    try:
+        answer, score = _subject_index(subject).search(question)
+    except Exception as e:
+        print(f"⚠️ Cache semântico indisponível: {e}")
+        return None
+
+    hit = answer is not None and score >= config["THRESHOLD"]
+    SEMANTIC_CACHE_LOOKUPS.labels("hit" if hit else "miss").inc()
+    if hit:
+        print(f"🧲 CACHE SEMÂNTICO: pergunta equivalente encontrada (similaridade {score:.2f})")
+        return answer
+    return None
+
+
+def remember_answer(question: str, subject: str, answer: str):
+    """Adiciona uma resposta nova ao índice do worker (os demais a veem na próxima montagem)"""
+    if not settings.TUTOR_SEMANTIC_CACHE["ENABLED"] or not answer:
+        return
+    index = _index_tier().get(_subject_key(subject))
+    if index is not None:
+        with _build_lock:
+            index.add(question, answer)
@@ -1,4 +1,60 @@
+from django.conf import settings
 from rest_framework import serializers
+from .models import TutorInteraction, TutorInteractionArchive
+
+ANSWER_PREVIEW_CHARS = 200
+ANALYSIS_DEPTHS = ['initial', 'deep', 'patterns', 'troubleshooting']
+
 class AskTutorSerializer(serializers.Serializer):
     question = serializers.CharField()
-    subject = serializers.CharField(default="Geral", required=False)
\ No newline at end of file
+    subject = serializers.CharField(default="Geral", required=False)
+    # Começa uma conversa nova (o histórico recente deixa de ir para o prompt)
+    new_conversation = serializers.BooleanField(default=False, required=False)
+
+class AnalyzeItemSerializer(serializers.Serializer):
+    topic = serializers.CharField(max_length=255)
+    depth = serializers.ChoiceField(choices=ANALYSIS_DEPTHS, default='initial')
+
+class AnalyzeBatchSerializer(serializers.Serializer):
+    items = serializers.ListField(
+        child=AnalyzeItemSerializer(), allow_empty=False, max_length=settings.AI_TUTOR_BATCH["MAX_ITEMS"]
+    )
+
+class InteractionPreviewSerializer(serializers.ModelSerializer):
+    """Item da listagem do histórico: a resposta vem cortada (o texto inteiro fica no detalhe)"""
+    answer_preview = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TutorInteraction
+        fields = ['id', 'subject', 'question', 'answer_preview', 'created_at']
+
+    def get_answer_preview(self, obj):
+        # A query traz ANSWER_PREVIEW_CHARS + 1 caracteres: o excedente só indica que houve corte
+        preview = obj.answer_head
+        return preview if len(preview) <= ANSWER_PREVIEW_CHARS else preview[:ANSWER_PREVIEW_CHARS].rstrip() + "…"
+
+class ArchivedInteractionPreviewSerializer(InteractionPreviewSerializer):
+    class Meta(InteractionPreviewSerializer.Meta):
+        model = TutorInteractionArchive
+
+class InteractionDetailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TutorInteraction
+        fields = ['id', 'subject', 'question', 'answer', 'created_at']
+
+class ArchivedInteractionDetailSerializer(serializers.ModelSerializer):
+    """Interação do arquivo: a resposta é descomprimida na leitura"""
+    answer = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = TutorInteractionArchive
+        fields = ['id', 'subject', 'question', 'answer', 'created_at']
+
+class InteractionSearchSerializer(serializers.ModelSerializer):
+    """Resultado da busca: `snippet` é HTML escapado, só com <mark> em volta dos termos encontrados"""
+    snippet = serializers.CharField()
+    rank = serializers.FloatField()
+
+    class Meta:
+        model = TutorInteraction
+        fields = ['id', 'subject', 'question', 'snippet', 'rank', 'created_at']
@@ -1,27 +1,27 @@
-import os
-import json
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from .models import TopicCache 
+from django.db import connection
+from apps.llm import gateway
+from apps.llm.breaker import CircuitOpen
+from apps.llm.jsonstream import recover_json
+from apps.llm.singleflight import SingleFlight
+from apps.llm.topics import canonical_topic
+from .cache import TopicCacheStore, freshness
+from .conversation import (
+    load_context, release_summary_lock, render_history, save_summary, schedule_summary, transcript,
+)
+from .metrics import PREFETCH_EVENTS
+from .prefetch import mark_prefetched, note_drilldown, schedule_prefetch
+from .semantic import find_similar_answer, remember_answer
+from .tasks import schedule_revalidation
 
-class AIService:
-    def __init__(self):
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.is_configured = True
-        else:
-            self.is_configured = False
+_analysis_flight = SingleFlight("ai_tutor:analysis")
 
-    def get_pedagogical_answer(self, question: str, subject: str = "Geral") -> str:
-        """
-        AI TUTOR (CHAT): Resposta humanizada, didática e rica em contexto.
-        Foca em explicar com analogias do mundo real e referências.
-        """
-        if not self.is_configured: return "Erro: API Key não configurada."
-        try:
-            # --- PERSONA: PROFESSOR SÊNIOR E CARISMÁTICO ---
-            system_instruction = """
+# Incrementar ao mudar os prompts/schemas das análises: invalida todas as camadas do cache
+ANALYSIS_PROMPT_VERSION = 1
+
+# --- PERSONA: PROFESSOR SÊNIOR E CARISMÁTICO ---
+TUTOR_SYSTEM_INSTRUCTION = """
             Você é o 'AI Tutor', um mentor de tecnologia sênior, apaixonado por ensinar. 
             Sua missão é explicar conceitos complexos de forma simples, como se estivesse conversando num café.
 
@@ -39,43 +39,312 @@ class AIService:
             Tom: Empático, motivador e levemente bem-humorado. Use emojis para separar as seções.
             Idioma: Português do Brasil.
             """
-            
-            model = genai.GenerativeModel(
-                "gemini-2.0-flash", 
-                system_instruction=system_instruction
+
+class AIService:
+    def __init__(self):
+        # O cliente do Gemini é configurado uma vez por worker pelo gateway
+        self.is_configured = gateway.configure()
+        self.cache = TopicCacheStore(ANALYSIS_PROMPT_VERSION)
+        self.answered_with_context = False  # Última resposta do chat dependia da conversa
+
+    def get_pedagogical_answer(self, question: str, subject: str = "Geral", user=None) -> str:
+        """
+        AI TUTOR (CHAT): Resposta humanizada, didática e rica em contexto.
+        Foca em explicar com analogias do mundo real e referências.
+        Com `user`, a pergunta segue a conversa em andamento (resumo + últimos turnos).
+        """
+        if not self.is_configured: return "Erro: API Key não configurada."
+
+        context = self._conversation(user, subject)
+        self.answered_with_context = context is not None
+        if context is None:
+            # Pergunta equivalente já respondida nesta matéria ("o que é docker" ~ "explica Docker?")
+            cached = find_similar_answer(question, subject)
+            if cached is not None:
+                return cached
+
+        try:
+            response = gateway.generate(
+                self._tutor_prompt(question, subject, context),
+                system_instruction=TUTOR_SYSTEM_INSTRUCTION,
+                timeout=settings.LLM_GATEWAY["TUTOR_TIMEOUT"]
             )
-            
-            # Adiciona contexto para a IA saber o que o aluno está estudando
-            full_prompt = f"Contexto: O aluno está estudando {subject}. Pergunta: {question}"
-            
-            response = model.generate_content(full_prompt)
+            if context is None:
+                remember_answer(question, subject, response.text)
             return response.text
             
+        except CircuitOpen:
+            raise  # A view responde 503 com Retry-After
         except Exception as e: return f"Erro IA: {str(e)}"
 
+    def stream_pedagogical_answer(self, question: str, subject: str = "Geral", user=None):
+        """
+        Versão streaming do get_pedagogical_answer: repassa os pedaços do texto
+        assim que o Gemini os envia (um hit do cache semântico sai num pedaço só).
+
+        Yields:
+            {"text": pedaço}; em caso de falha, um único {"error": "mensagem"}
+        """
+        if not self.is_configured:
+            yield {"error": "Erro: API Key não configurada."}
+            return
+
+        context = self._conversation(user, subject)
+        self.answered_with_context = context is not None
+        if context is None:
+            cached = find_similar_answer(question, subject)
+            if cached is not None:
+                yield {"text": cached}
+                return
+
+        parts = []
+        try:
+            response = gateway.generate(
+                self._tutor_prompt(question, subject, context),
+                system_instruction=TUTOR_SYSTEM_INSTRUCTION,
+                timeout=settings.LLM_GATEWAY["TUTOR_TIMEOUT"],
+                stream=True
+            )
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # Chunk sem texto (ex: só finish_reason)
+                if text:
+                    parts.append(text)
+                    yield {"text": text}
+
+        except CircuitOpen as e:
+            yield {"error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            print(f"❌ ERRO AI TUTOR (stream): {e}")
+            yield {"error": f"Erro IA: {str(e)}"}
+        else:
+            if context is None:
+                remember_answer(question, subject, "".join(parts))
+
+    def _conversation(self, user, subject):
+        """
+        Contexto da conversa em andamento, ou None para pergunta avulsa (sem usuário ou sem turnos recentes).
+        Perguntas de continuação dependem do contexto e por isso não passam pelo cache semântico.
+        """
+        if user is None or not settings.TUTOR_CONVERSATION["ENABLED"]:
+            return None
+        context = load_context(user.id, subject)
+        schedule_summary(user.id, subject, context)
+        return None if context.is_empty else context
+
+    @staticmethod
+    def _tutor_prompt(question: str, subject: str, context=None) -> str:
+        # Adiciona contexto para a IA saber o que o aluno está estudando
+        if context is None:
+            return f"Contexto: O aluno está estudando {subject}. Pergunta: {question}"
+        return (
+            f"Contexto: O aluno está estudando {subject}.\n\n"
+            f"Histórico da conversa:\n{render_history(context)}\n\n"
+            f"Pergunta atual (responda considerando o histórico): {question}"
+        )
+
+    def summarize_conversation(self, user_id, subject: str):
+        """Task de background: funde os turnos excedentes da conversa ao resumo rolante"""
+        try:
+            context = load_context(user_id, subject)
+            if not context.overflow or not self.is_configured:
+                return
+
+            prompt = f"""
+Resuma a conversa de estudo abaixo entre um aluno e o tutor ({subject}) em PT-BR.
+Mantenha o que o aluno já entendeu, dúvidas em aberto e termos/exemplos citados; no máximo 5 frases.
+
+Resumo anterior: {context.summary or "(nenhum)"}
+
+Novos turnos:
+{transcript(context.overflow)}
+"""
+            response = gateway.generate(
+                prompt,
+                generation_config={
+                    "temperature": 0.2,
+                    "max_output_tokens": settings.TUTOR_CONVERSATION["SUMMARY_MAX_TOKENS"],
+                },
+                timeout=settings.LLM_GATEWAY["TUTOR_TIMEOUT"]
+            )
+            save_summary(user_id, subject, response.text.strip(), context.overflow[-1].id, context.since)
+            print(f"🗜️ Conversa resumida: {len(context.overflow)} turno(s) compactados")
+        except Exception as e:
+            print(f"⚠️ Falha ao resumir a conversa: {e}")
+        finally:
+            release_summary_lock(user_id, subject)
+
     def analyze_topic(self, topic: str, depth: str = "initial") -> dict:
         """
         Gera análise estruturada com estratégia Cache-Aside.
         Suporta depths: 'initial', 'deep', 'patterns', 'troubleshooting'
         """
-        clean_topic = topic.strip().lower()
+        data = self._analyze(topic, depth)
+        if depth == "initial" and "error" not in data:
+            # Prefetch especulativo: deixa os aprofundamentos prontos antes do usuário pedir
+            schedule_prefetch(topic, canonical_topic(topic), ANALYSIS_PROMPT_VERSION)
+        return data
+
+    def analyze_many(self, items) -> list:
+        """
+        Várias análises de uma vez (montagem do plano de estudos). Os hits saem do cache numa leitura
+        em lote e os misses vão ao Gemini em paralelo (até AI_TUTOR_BATCH['MAX_WORKERS'] por vez).
+        Retorna, na ordem de `items` ([(topic, depth)]), {"topic", "depth", "cached", "data"}
+        ou {"topic", "depth", "error"} para o item que falhou.
+        """
+        keys = [(canonical_topic(topic), depth) for topic, depth in items]
+        entries = self.cache.get_many(keys)
+
+        results, misses = {}, {}
+        for (topic, depth), key in zip(items, keys):
+            if key in results or key in misses:
+                continue  # Pares repetidos no mesmo lote custam uma análise só
+            entry = entries.get(key)
+            state = freshness(entry, depth) if entry is not None else None
+            if depth != "initial":
+                note_drilldown(key[0], depth, ANALYSIS_PROMPT_VERSION, cache_hit=state in ("fresh", "stale"))
+            if state == "stale":
+                schedule_revalidation(topic, depth, ANALYSIS_PROMPT_VERSION)
+            if state in ("fresh", "stale"):
+                results[key] = (entry.data, True)
+            else:
+                misses[key] = topic
+
+        print(f"📦 Análises em lote: {len(results)} do cache, {len(misses)} para o Gemini")
+        for key, data in self._generate_many(misses, entries).items():
+            results[key] = (data, False)
+
+        output, prefetched = [], set()
+        for (topic, depth), key in zip(items, keys):
+            data, cached = results[key]
+            if "error" in data:
+                output.append({"topic": topic, "depth": depth, **data})
+                continue
+            output.append({"topic": topic, "depth": depth, "cached": cached, "data": data})
+            if depth == "initial" and key not in prefetched:
+                prefetched.add(key)
+                schedule_prefetch(topic, key[0], ANALYSIS_PROMPT_VERSION)
+        return output
+
+    def _generate_many(self, misses: dict, entries: dict) -> dict:
+        """Gera os misses do lote em paralelo; com o Gemini falhando, uma análise vencida vale mais que o erro"""
+        def generate(key, topic):
+            clean_topic, depth = key
+            if not self.is_configured:
+                data = {"error": "IA não configurada"}
+            else:
+                data = _analysis_flight.do(
+                    f"{clean_topic}_{depth}",
+                    lambda: self._generate_analysis(topic, clean_topic, depth)
+                )
+            if "error" in data and key in entries:
+                return entries[key].data
+            return data
+
+        def generate_in_thread(key, topic):
+            try:
+                return generate(key, topic)
+            finally:
+                connection.close()  # Cada thread abre a própria conexão com o banco
+
+        if len(misses) <= 1:
+            return {key: generate(key, topic) for key, topic in misses.items()}
+
+        workers = min(len(misses), settings.AI_TUTOR_BATCH["MAX_WORKERS"])
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze-batch") as executor:
+            futures = {key: executor.submit(generate_in_thread, key, topic) for key, topic in misses.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+    def _analyze(self, topic: str, depth: str) -> dict:
+        # Chave canônica: "Redis", "redis ", "Rédis" compartilham o mesmo cache
+        clean_topic = canonical_topic(topic)
         # A chave de cache inclui o 'depth' para diferenciar os tipos de conteúdo
         cache_key = f"{clean_topic}_{depth}"
 
         print(f"🔍 Buscando cache para: {clean_topic} (Nível: {depth})")
         
-        # 1. Tenta buscar no banco local
-        cached_entry = TopicCache.objects.filter(topic=clean_topic, depth=depth).first()
+        # 1. Tenta buscar no cache em camadas (memória do worker -> Redis -> banco)
+        entry = self.cache.get(clean_topic, depth)
+        state = freshness(entry, depth) if entry is not None else None
+        if depth != "initial":
+            note_drilldown(clean_topic, depth, ANALYSIS_PROMPT_VERSION, cache_hit=state in ("fresh", "stale"))
         
-        if cached_entry:
-            print("⚡ CACHE HIT: Retornando dados do banco local.")
-            return cached_entry.data
+        if entry is not None:
+            if state == "fresh":
+                print("⚡ CACHE HIT: Retornando análise do cache.")
+                return entry.data
+            if state == "stale":
+                # Stale-while-revalidate: responde na hora e regenera em background
+                print("♻️ CACHE STALE: Retornando análise antiga e revalidando em background.")
+                schedule_revalidation(topic, depth, ANALYSIS_PROMPT_VERSION)
+                return entry.data
+            print("⌛ CACHE EXPIRADO: Regenerando análise.")
 
-        # 2. Se não achar, consulta a IA
+        # 2. Se não achar (ou venceu o hard TTL), consulta a IA
         print("🤖 CACHE MISS: Consultando Gemini IA...")
         
         if not self.is_configured:
-            return {"error": "IA não configurada"}
+            return entry.data if entry else {"error": "IA não configurada"}
+
+        # Single-flight: só um worker gera cada (tópico, depth); os demais recebem o mesmo resultado
+        data = _analysis_flight.do(cache_key, lambda: self._generate_analysis(topic, clean_topic, depth))
+        if "error" in data and entry is not None:
+            # Gemini indisponível: uma análise vencida é melhor que nenhuma
+            return entry.data
+        return data
+
+    def refresh_analysis(self, topic: str, depth: str) -> dict:
+        """Regeneração em background (task) de uma análise que passou do soft TTL"""
+        clean_topic = canonical_topic(topic)
+        return _analysis_flight.do(
+            f"{clean_topic}_{depth}",
+            lambda: self._generate_analysis(topic, clean_topic, depth, revalidate=True)
+        )
+
+    def prefetch_depths(self, topic: str):
+        """Gera em background as depths ainda ausentes do tópico (task de prefetch)"""
+        clean_topic = canonical_topic(topic)
+        for depth in settings.AI_TUTOR_PREFETCH["DEPTHS"]:
+            entry = self.cache.get(clean_topic, depth)
+            if entry is not None and freshness(entry, depth) != "expired":
+                PREFETCH_EVENTS.labels("skipped_cached").inc()
+                continue
+
+            data = _analysis_flight.do(
+                f"{clean_topic}_{depth}",
+                lambda: self._generate_analysis(topic, clean_topic, depth)
+            )
+            if "error" in data:
+                print(f"⚠️ Prefetch interrompido em {depth}: {data['error']}")
+                return
+            mark_prefetched(clean_topic, depth, ANALYSIS_PROMPT_VERSION)
+
+    def warm_analysis(self, topic: str, depth: str):
+        """
+        Garante a análise no cache fora do fluxo do usuário (warm-up do currículo).
+        Retorna ("cached" | "generated" | "failed", dados); análises vencidas são regeneradas.
+        """
+        clean_topic = canonical_topic(topic)
+        entry = self.cache.get(clean_topic, depth)
+        if entry is not None and freshness(entry, depth) != "expired":
+            return "cached", entry.data
+
+        data = _analysis_flight.do(
+            f"{clean_topic}_{depth}",
+            lambda: self._generate_analysis(topic, clean_topic, depth)
+        )
+        return ("failed" if "error" in data else "generated"), data
+
+    def _generate_analysis(self, topic: str, clean_topic: str, depth: str, revalidate: bool = False) -> dict:
+        """Consulta o Gemini e grava no TopicCache (executado apenas pelo leader do single-flight)"""
+        # Outro voo pode ter gravado o cache enquanto esperávamos a trava
+        entry = self.cache.get(clean_topic, depth)
+        if entry is not None:
+            state = freshness(entry, depth)
+            if state == "fresh" or (state == "stale" and not revalidate):
+                return entry.data
 
         # ====================================================
         # ⚙️ CONFIGURAÇÃO DINÂMICA DE PROMPTS E SCHEMAS
@@ -146,25 +415,26 @@ class AIService:
                 "response_schema": current_config["schema"]
             }
 
-            model = genai.GenerativeModel(
-                model_name="gemini-2.0-flash",
+            response = gateway.generate(
+                current_config["prompt"],
                 system_instruction="Você é um Arquiteto de Software Sênior e Tutor Técnico.",
                 generation_config=generation_config
             )
-            
-            response = model.generate_content(current_config["prompt"])
-            json_data = json.loads(response.text)
+            json_data = recover_json(response.text, expect=dict)
+            if not isinstance(json_data, dict):
+                raise ValueError("Resposta da IA não é um objeto JSON")
 
             # 3. Salva no Cache
             print(f"💾 Salvando {depth} no Cache...")
-            TopicCache.objects.create(
-                topic=clean_topic,
-                depth=depth,
-                data=json_data
-            )
+            self.cache.set(clean_topic, depth, json_data)
             
             return json_data
 
+        except CircuitOpen as e:
+            # Gemini fora do ar: falha em milissegundos com a dica de quando tentar de novo
+            print(f"🔴 {e}")
+            return {"error": str(e), "retry_after": e.retry_after}
+
         except Exception as e:
             print(f"❌ ERRO AI SERVICES: {e}")
             return {"error": f"Falha na análise: {str(e)}"}
\ No newline at end of file
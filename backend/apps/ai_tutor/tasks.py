@@ -0,0 +1,66 @@
+import hashlib
+from celery import shared_task
+from django_redis import get_redis_connection
+from config.celery import enqueue
+from apps.llm.topics import canonical_topic
+from .cache import prune_stale_entries
+
+REVALIDATE_LOCK_SECONDS = 600
+
+
+def schedule_revalidation(topic, depth, prompt_version):
+    """Enfileira a regeneração de uma análise vencida (no máximo uma por tópico/depth a cada 10 min)"""
+    digest = hashlib.sha1(canonical_topic(topic).encode()).hexdigest()[:16]
+    lock_key = f"ai_tutor:revalidate:v{prompt_version}:{depth}:{digest}"
+    try:
+        redis = get_redis_connection("default")
+        if redis.set(lock_key, 1, nx=True, ex=REVALIDATE_LOCK_SECONDS) and \
+                not enqueue(refresh_topic_analysis, topic, depth):
+            redis.delete(lock_key)
+    except Exception as e:
+        print(f"⚠️ Revalidação da análise não agendada: {e}")
+
+
+@shared_task(ignore_result=True)
+def refresh_topic_analysis(topic, depth):
+    """Regenera em background uma análise que passou do soft TTL"""
+    from .services import AIService
+    AIService().refresh_analysis(topic, depth)
+
+
+@shared_task(ignore_result=True)
+def prefetch_analyses(topic):
+    """Gera as depths de aprofundamento de um tópico recém-consultado no 'initial'"""
+    from .services import AIService
+    AIService().prefetch_depths(topic)
+
+
+@shared_task(ignore_result=True)
+def summarize_conversation(user_id, subject):
+    """Compacta no resumo os turnos da conversa que saíram do orçamento de tokens"""
+    from .services import AIService
+    AIService().summarize_conversation(user_id, subject)
+
+
+@shared_task(ignore_result=True)
+def flush_interaction_buffer():
+    """Task periódica (e disparada quando o lote enche): grava as interações do chat em lote"""
+    from .buffer import InteractionBuffer
+    InteractionBuffer().flush()
+
+
+@shared_task(ignore_result=True)
+def prune_topic_cache():
+    """Task diária: consolida os acessos e apaga análises frias ou de prompts antigos"""
+    from .services import ANALYSIS_PROMPT_VERSION
+    deleted = prune_stale_entries(ANALYSIS_PROMPT_VERSION)
+    print(f"🧹 {deleted} análises removidas do TopicCache")
+
+
+@shared_task(ignore_result=True)
+def maintain_history_partitions():
+    """Task diária: cria as partições dos próximos meses e arquiva as que passaram da retenção"""
+    from .partitions import archive_expired, ensure_partitions
+    created = ensure_partitions()
+    archived = archive_expired()
+    print(f"🗂️ Partições do histórico: {len(created)} criadas, {sum(archived.values())} interações arquivadas")
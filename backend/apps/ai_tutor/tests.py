@@ -1,8 +1,28 @@
+import json
+import threading
+from io import StringIO
+from datetime import timedelta
 from django.urls import reverse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from django_redis import get_redis_connection
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from unittest.mock import patch, MagicMock
+from apps.llm import gateway
+from .buffer import FLUSH_MAX_KEYS, InteractionBuffer
+from .conversation import load_context
+from .cache import ACCESS_KEY, TopicCacheStore, clear_local_cache, prune_stale_entries
+from .models import TopicCache, TutorInteraction, TutorInteractionArchive
+from .partitions import add_months, archive_expired, create_partition, list_partitions, month_start
+from .semantic import SubjectIndex, clear_semantic_index
+from .services import ANALYSIS_PROMPT_VERSION, AIService
+from .metrics import PREFETCH_EVENTS
+from .tasks import prefetch_analyses, refresh_topic_analysis
 
 User = get_user_model()
 
@@ -11,9 +31,11 @@ class AITutorTest(APITestCase):
         self.user = User.objects.create_user(email="student@test.com", password="password123", name="Student")
         self.client.force_authenticate(user=self.user)
         self.url = reverse('ask-tutor')
+        gateway.clear_model_cache()
+        clear_semantic_index()
 
-    # Mockamos o genai.GenerativeModel
-    @patch('apps.ai_tutor.services.genai.GenerativeModel') 
+    # Mockamos o genai.GenerativeModel usado pelo gateway
+    @patch('apps.llm.gateway.genai.GenerativeModel') 
     def test_ask_tutor_success(self, mock_model_class):
         """Testa o fluxo de pergunta para o Gemini com sucesso (Mockado)"""
         
@@ -36,4 +58,488 @@ class AITutorTest(APITestCase):
     def test_ask_tutor_unauthenticated(self):
         self.client.logout()
         response = self.client.post(self.url, {"question": "Ola"})
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_ask_tutor_stream(self, mock_generate):
+        """Os pedaços chegam por SSE e a interação é gravada no fim"""
+        mock_generate.return_value = iter([MagicMock(text="Python é "), MagicMock(text="uma linguagem.")])
+
+        response = self.client.post(
+            reverse('ask-tutor-stream'), {"question": "O que é Python?"}, HTTP_ACCEPT='text/event-stream'
+        )
+        body = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(body.count("event: chunk"), 2)
+        interaction = TutorInteraction.objects.get(user=self.user)
+        self.assertEqual(interaction.answer, "Python é uma linguagem.")
+        self.assertIn(f'event: done\ndata: {{"interaction_id": {interaction.id}}}', body)
+
+class TopicCacheReportTest(APITestCase):
+    def test_report_merges_variants(self):
+        for topic in ["redis", "rédis", "REDIS "]:
+            TopicCache.objects.create(topic=topic, depth="initial", data={"definition": topic})
+
+        out = StringIO()
+        call_command('topic_cache_report', '--apply', stdout=out)
+
+        self.assertIn("Chamadas evitáveis: 2 (66.7%", out.getvalue())
+        self.assertEqual(list(TopicCache.objects.values_list('topic', 'data')), [("redis", {"definition": "redis"})])
+
+
+class TopicCacheStoreTest(APITestCase):
+    def setUp(self):
+        clear_local_cache()
+        cache.delete_pattern("ai_tutor:topic:*")
+        TopicCache.objects.create(topic="redis", depth="initial", data={"definition": "banco em memória"})
+
+    def test_read_through_fills_upper_tiers(self):
+        store = TopicCacheStore(prompt_version=1)
+        self.assertEqual(store.get("redis", "initial").data, {"definition": "banco em memória"})
+
+        # Segunda leitura: LRU do worker, sem consulta ao Postgres
+        with self.assertNumQueries(0):
+            self.assertEqual(store.get("redis", "initial").data, {"definition": "banco em memória"})
+
+        # Outro worker (LRU vazio) lê do Redis
+        clear_local_cache()
+        with self.assertNumQueries(0):
+            self.assertEqual(store.get("redis", "initial").data, {"definition": "banco em memória"})
+
+    def test_prompt_version_invalidates_every_tier(self):
+        TopicCacheStore(prompt_version=1).get("redis", "initial")
+        self.assertIsNone(TopicCacheStore(prompt_version=2).get("redis", "initial"))
+
+
+@override_settings(
+    TOPIC_CACHE={**settings.TOPIC_CACHE, "TTL_DAYS": {"default": (30, 180)}, "ACCESS_FLUSH_SECONDS": 0},
+    AI_TUTOR_PREFETCH={**settings.AI_TUTOR_PREFETCH, "ENABLED": False},
+)
+class TopicCacheExpiryTest(APITestCase):
+    def setUp(self):
+        clear_local_cache()
+        cache.delete_pattern("ai_tutor:topic:*")
+        redis = get_redis_connection("default")
+        redis.delete(ACCESS_KEY, *redis.keys("ai_tutor:revalidate:*"))
+        self.entry = TopicCache.objects.create(topic="redis", depth="initial", data={"definition": "antiga"})
+
+    def _age(self, days):
+        TopicCache.objects.filter(pk=self.entry.pk).update(created_at=timezone.now() - timedelta(days=days))
+
+    @patch('apps.ai_tutor.tasks.enqueue', return_value=True)
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_stale_entry_is_served_and_revalidated_in_background(self, mock_generate, mock_enqueue):
+        self._age(60)
+
+        self.assertEqual(AIService().analyze_topic("Redis"), {"definition": "antiga"})
+        self.assertEqual(AIService().analyze_topic("Redis"), {"definition": "antiga"})
+
+        mock_generate.assert_not_called()
+        mock_enqueue.assert_called_once_with(refresh_topic_analysis, "Redis", "initial")
+
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_expired_entry_is_regenerated_synchronously(self, mock_generate):
+        self._age(200)
+        mock_generate.return_value = MagicMock(text=json.dumps({"definition": "nova"}))
+
+        self.assertEqual(AIService().analyze_topic("Redis"), {"definition": "nova"})
+        self.assertEqual(TopicCache.objects.get().data, {"definition": "nova"})
+
+    def test_prune_removes_cold_topics_without_a_write_per_read(self):
+        TopicCache.objects.create(topic="kafka", depth="initial", data={})
+        TopicCache.objects.update(created_at=timezone.now() - timedelta(days=120))
+
+        with self.assertNumQueries(1):  # Só a leitura do banco; o acesso vai para o Redis
+            TopicCacheStore(prompt_version=1).get("redis", "initial")
+
+        self.assertEqual(prune_stale_entries(current_version=1), 1)
+        self.assertEqual(list(TopicCache.objects.values_list('topic', flat=True)), ["redis"])
+
+
+class PrefetchTest(APITestCase):
+    def setUp(self):
+        clear_local_cache()
+        cache.delete_pattern("ai_tutor:topic:*")
+        redis = get_redis_connection("default")
+        keys = redis.keys("ai_tutor:prefetch:*")
+        if keys:
+            redis.delete(*keys)
+        TopicCache.objects.create(topic="redis", depth="initial", data={"definition": "x"})
+        TopicCache.objects.create(topic="redis", depth="patterns", data={"common_patterns": "x"})
+
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_initial_prefetches_missing_depths_once(self, mock_generate):
+        mock_generate.return_value = MagicMock(text=json.dumps({"ok": True}))
+
+        with patch('apps.ai_tutor.prefetch.enqueue', side_effect=lambda task, *args: task(*args) or True) as mock_enqueue:
+            AIService().analyze_topic("Redis")
+            AIService().analyze_topic("redis")
+
+        # Deduplicado por tópico; 'patterns' já estava no cache
+        mock_enqueue.assert_called_once_with(prefetch_analyses, "Redis")
+        self.assertEqual(mock_generate.call_count, 2)
+        self.assertEqual(
+            sorted(TopicCache.objects.values_list('depth', flat=True)),
+            ["deep", "initial", "patterns", "troubleshooting"],
+        )
+
+        used_before = PREFETCH_EVENTS.labels("used")._value.get()
+        with self.assertNumQueries(0):
+            AIService().analyze_topic("Redis", depth="deep")
+        self.assertEqual(PREFETCH_EVENTS.labels("used")._value.get(), used_before + 1)
+
+
+class AnalyzeBatchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="planner@test.com", password="password123", name="Planner")
+        self.client.force_authenticate(user=self.user)
+        cache.delete_pattern("ai_tutor:topic:*")
+        clear_local_cache()
+        self.store = TopicCacheStore(ANALYSIS_PROMPT_VERSION)
+
+    def test_cached_pairs_are_read_in_one_query(self):
+        for topic in ("redis", "docker", "kafka"):
+            self.store.set(topic, "initial", {"definition": topic})
+        cache.delete_pattern("ai_tutor:topic:*")
+        clear_local_cache()
+
+        with self.assertNumQueries(1):
+            found = self.store.get_many([("redis", "initial"), ("docker", "initial"), ("kafka", "initial"), ("git", "deep")])
+        self.assertEqual({topic for topic, _ in found}, {"redis", "docker", "kafka"})
+        with self.assertNumQueries(0):  # Agora nas camadas de cima
+            self.assertEqual(len(self.store.get_many([("redis", "initial"), ("kafka", "initial")])), 2)
+
+    @patch('apps.ai_tutor.services.schedule_prefetch')
+    @patch.object(AIService, '_generate_analysis')
+    def test_misses_fan_out_in_parallel_with_partial_results(self, mock_generate, mock_prefetch):
+        lock, overlapped = threading.Lock(), threading.Event()
+        calls = {"active": 0, "peak": 0}
+
+        def slow_generation(topic, clean_topic, depth):
+            with lock:
+                calls["active"] += 1
+                calls["peak"] = max(calls["peak"], calls["active"])
+                if calls["active"] > 1:
+                    overlapped.set()
+            overlapped.wait(timeout=2)  # Segura a chamada até outra começar em paralelo
+            with lock:
+                calls["active"] -= 1
+            return {"error": "Falha na análise: timeout"} if topic == "Kafka" else {"definition": topic}
+        mock_generate.side_effect = slow_generation
+        self.store.set("redis", "initial", {"definition": "do cache"})
+
+        items = [{"topic": "Redis", "depth": "initial"}] + [
+            {"topic": topic, "depth": "deep"} for topic in ("Docker", "Kafka", "Git", "Linux")
+        ] + [{"topic": "docker", "depth": "deep"}]  # Mesma chave canônica: gerado uma vez só
+        response = self.client.post(reverse('analyze-batch'), {"items": items}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([item["topic"] for item in results], [item["topic"] for item in items])
+        self.assertEqual(results[0], {"topic": "Redis", "depth": "initial", "cached": True, "data": {"definition": "do cache"}})
+        self.assertEqual(results[1]["data"], {"definition": "Docker"})
+        self.assertFalse(results[1]["cached"])
+        self.assertEqual(results[2]["error"], "Falha na análise: timeout")
+        self.assertEqual(results[5]["data"], results[1]["data"])
+        self.assertEqual(mock_generate.call_count, 4)
+        self.assertGreater(calls["peak"], 1)  # Em série nunca haveria duas gerações ao mesmo tempo
+
+    @patch.object(AIService, '_generate_analysis', return_value={"error": "Gemini indisponível", "retry_after": 30})
+    def test_all_items_unavailable_returns_503(self, mock_generate):
+        response = self.client.post(
+            reverse('analyze-batch'), {"items": [{"topic": "Redis"}, {"topic": "Go", "depth": "deep"}]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "30")
+
+    def test_rejects_unknown_depth_and_oversized_batches(self):
+        url = reverse('analyze-batch')
+        self.assertEqual(self.client.post(url, {"items": [{"topic": "Redis", "depth": "x"}]}, format='json').status_code, 400)
+        items = [{"topic": f"tópico {i}"} for i in range(settings.AI_TUTOR_BATCH["MAX_ITEMS"] + 1)]
+        self.assertEqual(self.client.post(url, {"items": items}, format='json').status_code, 400)
+
+
+class SemanticAnswerCacheTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="semantic@test.com", password="password123", name="Semantic")
+        self.client.force_authenticate(user=self.user)
+        clear_semantic_index()
+        # Respondida para outro aluno: o cache semântico vale para todos da matéria
+        other = User.objects.create_user(email="other@test.com", password="password123", name="Other")
+        TutorInteraction.objects.create(
+            user=other, subject="DevOps", question="O que é Docker?", answer="Docker empacota apps em containers."
+        )
+
+    def test_index_matches_rewordings_only(self):
+        index = SubjectIndex(
+            [("O que é Docker?", "docker"), ("Como funciona o Kubernetes", "k8s")],
+            settings.TUTOR_SEMANTIC_CACHE["NGRAM"], settings.TUTOR_SEMANTIC_CACHE["DIMENSIONS"],
+        )
+        for wording in ("o que é docker", "Explica Docker", "me explica o que é o docker?"):
+            answer, score = index.search(wording)
+            self.assertEqual(answer, "docker")
+            self.assertGreaterEqual(score, 0.99)
+
+        _, score = index.search("Como instalar o Docker no Windows")
+        self.assertLess(score, settings.TUTOR_SEMANTIC_CACHE["THRESHOLD"])
+
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_similar_question_skips_the_llm(self, mock_generate):
+        response = self.client.post(reverse('ask-tutor'), {"question": "explica docker", "subject": "devops"})
+
+        self.assertEqual(response.data["answer"], "Docker empacota apps em containers.")
+        mock_generate.assert_not_called()
+
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_new_question_falls_through_and_is_indexed(self, mock_generate):
+        mock_generate.return_value = MagicMock(text="Volumes guardam dados fora do container.")
+        service = AIService()
+
+        first = service.get_pedagogical_answer("Para que servem volumes no Docker?", "DevOps")
+        again = service.get_pedagogical_answer("para que servem os volumes do docker", "DevOps")
+
+        self.assertEqual(first, again)
+        self.assertEqual(mock_generate.call_count, 1)
+
+    @patch('apps.ai_tutor.conversation.enqueue')
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_follow_up_answers_stay_out_of_the_rebuilt_index(self, mock_generate, mock_enqueue):
+        cache.delete_pattern("ai_tutor:conversation:*")
+        mock_generate.return_value = MagicMock(text="Como eu disse antes, use bind mounts.")
+        TutorInteraction.objects.create(user=self.user, subject="DevOps", question="O que é um volume?", answer="...")
+
+        self.client.post(reverse('ask-tutor'), {"question": "e no meu caso, qual usar?", "subject": "DevOps"})
+        self.assertTrue(TutorInteraction.objects.get(question="e no meu caso, qual usar?").with_context)
+
+        # Pergunta avulsa de outro aluno, depois da remontagem do índice: não herda a resposta da conversa
+        clear_semantic_index()
+        mock_generate.reset_mock()
+        AIService().get_pedagogical_answer("e no meu caso, qual usar?", "DevOps")
+        mock_generate.assert_called_once()
+
+
+@override_settings(TUTOR_CONVERSATION={**settings.TUTOR_CONVERSATION, "RECENT_TURNS": 2})
+class ConversationContextTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="chat@test.com", password="password123", name="Chat")
+        self.client.force_authenticate(user=self.user)
+        cache.delete_pattern("ai_tutor:conversation:*")
+        redis = get_redis_connection("default")
+        for key in redis.scan_iter("ai_tutor:conversation:*"):
+            redis.delete(key)
+        for i in range(1, 5):
+            TutorInteraction.objects.create(
+                user=self.user, subject="Redis", question=f"pergunta {i}", answer=f"resposta {i} " + "x" * 3000
+            )
+
+    @patch('apps.ai_tutor.conversation.enqueue')
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_follow_up_sends_summary_and_last_turns_only(self, mock_generate, mock_enqueue):
+        mock_generate.return_value = MagicMock(text="Resumo: o aluno já viu as perguntas 1 e 2.")
+        context = load_context(self.user.id, "Redis")
+        self.assertEqual([q for q, _ in context.turns], ["pergunta 3", "pergunta 4"])
+        self.assertEqual([row.question for row in context.overflow], ["pergunta 1", "pergunta 2"])
+
+        # Os turnos excedentes vão para o resumo em background, uma vez só
+        AIService().get_pedagogical_answer("e o TTL?", "Redis", user=self.user)
+        AIService().get_pedagogical_answer("e o TTL?", "Redis", user=self.user)
+        self.assertEqual(mock_enqueue.call_count, 1)
+        user_id, subject = mock_enqueue.call_args.args[1:]
+        AIService().summarize_conversation(user_id, subject)
+
+        mock_generate.reset_mock()
+        AIService().get_pedagogical_answer("e o TTL?", "Redis", user=self.user)
+        prompt = mock_generate.call_args.args[0]
+        self.assertIn("Resumo da conversa até aqui: Resumo: o aluno já viu", prompt)
+        self.assertIn("Aluno: pergunta 4", prompt)
+        self.assertNotIn("pergunta 1", prompt)
+        self.assertLess(len(prompt), settings.TUTOR_CONVERSATION["TOKEN_BUDGET"] * 4 + 500)
+
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_idle_gap_and_new_conversation_start_fresh(self, mock_generate):
+        mock_generate.return_value = MagicMock(text="Resposta.")
+        TutorInteraction.objects.filter(question="pergunta 4").update(created_at=timezone.now() - timedelta(hours=1))
+        TutorInteraction.objects.exclude(question="pergunta 4").update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertTrue(load_context(self.user.id, "Redis").is_empty)
+
+        TutorInteraction.objects.create(user=self.user, subject="Redis", question="pergunta 5", answer="ok")
+        self.assertEqual(len(load_context(self.user.id, "Redis").turns), 1)
+
+        self.client.post(reverse('ask-tutor'), {"question": "nova", "subject": "Redis", "new_conversation": True})
+        self.assertNotIn("Histórico", mock_generate.call_args.args[0])
+        self.assertEqual([q for q, _ in load_context(self.user.id, "Redis").turns], ["nova"])
+
+
+class TutorHistoryTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="history@test.com", password="password123", name="History")
+        self.client.force_authenticate(user=self.user)
+        other = User.objects.create_user(email="nosy@test.com", password="password123", name="Nosy")
+        self.foreign = TutorInteraction.objects.create(user=other, subject="Redis", question="alheia", answer="x")
+        for i in range(25):
+            TutorInteraction.objects.create(user=self.user, subject="Redis", question=f"pergunta {i}", answer="y" * 1000)
+
+    def test_cursor_pages_cover_history_without_count(self):
+        url, seen = f"{reverse('tutor-history')}?page_size=10", []
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn("count", response.data)
+            seen += [item["question"] for item in response.data["results"]]
+            url = response.data["next"]
+
+        self.assertEqual(seen, [f"pergunta {i}" for i in reversed(range(25))])
+        item = self.client.get(reverse('tutor-history')).data["results"][0]
+        self.assertEqual(len(item["answer_preview"]), 201)  # 200 caracteres + "…"
+        self.assertNotIn("answer", item)
+
+    def test_detail_returns_full_answer_of_own_interactions_only(self):
+        own = TutorInteraction.objects.filter(user=self.user).first()
+        self.assertEqual(len(self.client.get(reverse('tutor-history-detail', args=[own.id])).data["answer"]), 1000)
+        response = self.client.get(reverse('tutor-history-detail', args=[self.foreign.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class HistoryPartitionTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="archive@test.com", password="password123", name="Archive")
+        self.client.force_authenticate(user=self.user)
+        now = timezone.now()
+        self.old_month = add_months(month_start(now), -14)
+        old = timezone.make_aware(timezone.datetime(self.old_month.year, self.old_month.month, 10))
+
+        # Antes da partição existir a linha cai na DEFAULT; create_partition a move
+        self.early = TutorInteraction.objects.create(
+            user=self.user, subject="Redis", question="antiga", answer="resposta " * 300, created_at=old
+        )
+        self.assertTrue(create_partition(self.old_month))
+        self.later = TutorInteraction.objects.create(
+            user=self.user, subject="SQL", question="também antiga", answer="join", created_at=old + timedelta(days=1)
+        )
+        self.stray = TutorInteraction.objects.create(  # Sem partição: fica na DEFAULT
+            user=self.user, subject="SQL", question="muito antiga", answer="índice", created_at=now - timedelta(days=700)
+        )
+        self.live = TutorInteraction.objects.create(user=self.user, subject="Redis", question="recente", answer="ok")
+
+    def test_expired_partitions_move_to_compressed_archive(self):
+        archived = archive_expired(12)
+
+        self.assertEqual(sum(archived.values()), 3)
+        self.assertNotIn(self.old_month, [month for _, month in list_partitions()])
+        self.assertEqual(list(TutorInteraction.objects.values_list("id", flat=True)), [self.live.id])
+        row = TutorInteractionArchive.objects.get(id=self.early.id)
+        self.assertLess(len(row.answer_compressed), len(self.early.answer))
+        self.assertEqual(row.answer, self.early.answer)
+
+    def test_archived_history_is_read_transparently(self):
+        archive_expired(12)
+
+        detail = self.client.get(reverse('tutor-history-detail', args=[self.early.id]))
+        self.assertEqual(detail.data["answer"], self.early.answer)
+        listed = self.client.get(f"{reverse('tutor-history')}?archived=1").data["results"]
+        self.assertEqual([item["question"] for item in listed], ["também antiga", "antiga", "muito antiga"])
+        self.assertTrue(listed[1]["answer_preview"].endswith("…"))
+        live = self.client.get(reverse('tutor-history')).data["results"]
+        self.assertEqual([item["id"] for item in live], [self.live.id])
+
+
+class TutorSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="search@test.com", password="password123", name="Search")
+        self.client.force_authenticate(user=self.user)
+        other = User.objects.create_user(email="spy@test.com", password="password123", name="Spy")
+        TutorInteraction.objects.create(user=other, subject="Banco", question="Índices?", answer="Índices alheios.")
+        self.index = TutorInteraction.objects.create(
+            user=self.user, subject="Banco", question="O que é um índice no Postgres?",
+            answer="Um índice acelera consultas: custo < varredura & sem ler a tabela inteira, como o sumário de um livro.",
+        )
+        TutorInteraction.objects.create(
+            user=self.user, subject="Banco", question="O que é uma transação?",
+            answer="Uma transação agrupa operações; quando há índices, eles também são atualizados.",
+        )
+        TutorInteraction.objects.create(user=self.user, subject="Redes", question="O que é DNS?", answer="Agenda da internet.")
+
+    def test_ranked_results_with_escaped_highlights(self):
+        response = self.client.get(reverse('tutor-search'), {"q": "índices"})
+
+        results = response.data["results"]
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["id"], self.index.id)  # Termo na pergunta pesa mais
+        self.assertIn("<mark>índice</mark>", results[0]["snippet"])
+        self.assertIn("custo &lt; varredura &amp; sem", results[0]["snippet"])
+        self.assertGreater(results[0]["rank"], results[1]["rank"])
+
+    def test_subject_filter_and_required_query(self):
+        response = self.client.get(reverse('tutor-search'), {"q": "índice", "subject": "Redes"})
+        self.assertEqual(response.data["results"], [])
+        self.assertEqual(self.client.get(reverse('tutor-search')).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(TUTOR_INTERACTION_BUFFER={**settings.TUTOR_INTERACTION_BUFFER, "ENABLED": True, "BATCH_SIZE": 3})
+class InteractionBufferTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="buffer@test.com", password="password123", name="Buffer")
+        self.client.force_authenticate(user=self.user)
+        clear_semantic_index()
+        redis = get_redis_connection("default")
+        for key in redis.scan_iter("ai_tutor:interactions:*"):
+            redis.delete(key)
+
+    @patch('apps.ai_tutor.services.gateway.generate')
+    def test_buffered_turns_feed_the_conversation_and_flush_in_one_batch(self, mock_generate):
+        mock_generate.return_value = MagicMock(text="Um container isola processos.")
+        self.client.post(reverse('ask-tutor'), {"question": "o que é container?", "subject": "Docker"})
+        self.client.post(reverse('ask-tutor'), {"question": "e imagem?", "subject": "Docker"})
+
+        self.assertFalse(TutorInteraction.objects.exists())
+        self.assertIn("Aluno: o que é container?", mock_generate.call_args.args[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(InteractionBuffer().flush(), 2)
+        rows = list(TutorInteraction.objects.order_by('id'))
+        self.assertEqual([row.question for row in rows], ["o que é container?", "e imagem?"])
+        self.assertLess(rows[0].created_at, rows[1].created_at)
+        self.assertEqual(InteractionBuffer().pending(self.user.id, "Docker"), [])
+        self.assertEqual([q for q, _ in load_context(self.user.id, "Docker").turns], ["o que é container?", "e imagem?"])
+
+    @patch('apps.ai_tutor.buffer.enqueue')
+    def test_full_batch_triggers_a_single_flush(self, mock_enqueue):
+        buffer = InteractionBuffer()
+        for i in range(4):
+            buffer.add(self.user.id, "Docker", f"pergunta {i}", "resposta")
+        self.assertEqual(mock_enqueue.call_count, 1)
+
+    def test_overlapping_flush_and_failed_cleanup_do_not_insert_twice(self):
+        buffer = InteractionBuffer()
+        buffer.add(self.user.id, "Docker", "o que é container?", "resposta")
+        bulk_create = TutorInteraction.objects.bulk_create
+        overlapping = []
+
+        def create_and_flush_again(*args, **kwargs):
+            overlapping.append(InteractionBuffer().flush())
+            return bulk_create(*args, **kwargs)
+
+        # A limpeza pós-commit nunca roda: o lote continua na chave :flushing:
+        with patch.object(TutorInteraction.objects, 'bulk_create', side_effect=create_and_flush_again):
+            with self.captureOnCommitCallbacks(execute=False):
+                self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(overlapping, [0])
+        self.assertFalse(get_redis_connection("default").exists(InteractionBuffer.LOCK_KEY))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(TutorInteraction.objects.count(), 1)
+        self.assertEqual(buffer.pending(self.user.id, "Docker"), [])
+        self.assertEqual(list(get_redis_connection("default").scan_iter(f"{InteractionBuffer.BUFFER_KEY}:*")), [])
+
+    def test_flush_takes_a_bounded_number_of_leftover_batches(self):
+        redis = get_redis_connection("default")
+        buffer = InteractionBuffer()
+        for i in range(FLUSH_MAX_KEYS + 5):
+            buffer.add(self.user.id, "Docker", f"pergunta {i}", "resposta")
+            redis.rename(InteractionBuffer.BUFFER_KEY, f"{InteractionBuffer.BUFFER_KEY}:flushing:lote{i}")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(buffer.flush(), FLUSH_MAX_KEYS - 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(buffer.flush(), 6)
+        self.assertEqual(TutorInteraction.objects.count(), FLUSH_MAX_KEYS + 5)
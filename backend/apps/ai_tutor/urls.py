@@ -1,7 +1,12 @@
 from django.urls import path
-from .views import AskTutorView, AnalyzeTaskView
+from .views import AskTutorView, StreamTutorView, AnalyzeTaskView, AnalyzeBatchView, TutorHistoryView, TutorHistoryDetailView, TutorSearchView
 
 urlpatterns = [
     path('ask/', AskTutorView.as_view(), name='ask-tutor'),
+    path('ask/stream/', StreamTutorView.as_view(), name='ask-tutor-stream'),
     path('analyze/', AnalyzeTaskView.as_view(), name='analyze-task'), # Rota nova
+    path('analyze/batch/', AnalyzeBatchView.as_view(), name='analyze-batch'),
+    path('history/', TutorHistoryView.as_view(), name='tutor-history'),
+    path('history/search/', TutorSearchView.as_view(), name='tutor-search'),
+    path('history/<int:pk>/', TutorHistoryDetailView.as_view(), name='tutor-history-detail'),
 ]
\ No newline at end of file
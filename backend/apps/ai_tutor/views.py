@@ -1,9 +1,23 @@
+from django.db.models import F
+from django.db.models.functions import Left
+from django.shortcuts import get_object_or_404
+from rest_framework import generics
 from rest_framework.views import APIView
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .serializers import AskTutorSerializer
+from rest_framework.renderers import JSONRenderer
+from apps.llm.breaker import CircuitOpen, unavailable_response
+from apps.llm.sse import EventStreamRenderer, sse_event, sse_response
+from .buffer import save_interaction
+from .conversation import reset_conversation
+from .serializers import (
+    ANSWER_PREVIEW_CHARS, AnalyzeBatchSerializer, ArchivedInteractionDetailSerializer, ArchivedInteractionPreviewSerializer,
+    AskTutorSerializer, InteractionDetailSerializer, InteractionPreviewSerializer, InteractionSearchSerializer,
+)
+from .search import search_history
 from .services import AIService
-from .models import TutorInteraction
+from .models import TutorInteraction, TutorInteractionArchive
 
 class AskTutorView(APIView):
     """View original para o Chat"""
@@ -15,15 +29,57 @@ class AskTutorView(APIView):
             q = serializer.validated_data['question']
             s = serializer.validated_data.get('subject', 'Geral')
             
+            if serializer.validated_data.get('new_conversation'):
+                reset_conversation(request.user.id, s)
+
             service = AIService()
-            answer = service.get_pedagogical_answer(q, s)
+            try:
+                answer = service.get_pedagogical_answer(q, s, user=request.user)
+            except CircuitOpen as e:
+                return unavailable_response({"error": str(e), "retry_after": e.retry_after})
             
             if "Erro:" not in answer:
-                TutorInteraction.objects.create(user=request.user, subject=s, question=q, answer=answer)
+                save_interaction(request.user, s, q, answer, with_context=service.answered_with_context)
             
             return Response({"answer": answer})
         return Response(serializer.errors, status=400)
 
+class StreamTutorView(APIView):
+    """
+    Versão SSE do chat: repassa a resposta do Gemini pedaço a pedaço.
+    Eventos: chunk ({"text"}) -> done ({"interaction_id"}) | error
+    A TutorInteraction só é gravada quando a resposta chega inteira (ou vai para o buffer de gravação).
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def post(self, request):
+        serializer = AskTutorSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        q = serializer.validated_data['question']
+        s = serializer.validated_data.get('subject', 'Geral')
+        if serializer.validated_data.get('new_conversation'):
+            reset_conversation(request.user.id, s)
+        return sse_response(self._events(request.user, q, s))
+
+    def _events(self, user, question, subject):
+        parts = []
+        service = AIService()
+        for item in service.stream_pedagogical_answer(question, subject, user=user):
+            if "error" in item:
+                yield sse_event("error", item)
+                return
+            parts.append(item["text"])
+            yield sse_event("chunk", item)
+
+        interaction = save_interaction(
+            user, subject, question, "".join(parts), with_context=service.answered_with_context
+        )
+        # Com o buffer de gravação ligado a interação ainda não tem id
+        yield sse_event("done", {"interaction_id": interaction.id if interaction else None})
+
 class AnalyzeTaskView(APIView):
     """
     NOVA VIEW: Responsável por gerar a análise estruturada antes de criar a tarefa.
@@ -42,7 +98,103 @@ class AnalyzeTaskView(APIView):
         service = AIService()
         data = service.analyze_topic(topic, depth)
 
+        if "retry_after" in data:
+            return unavailable_response(data)
         if "error" in data:
             return Response(data, status=500)
 
-        return Response(data)
\ No newline at end of file
+        return Response(data)
+
+
+class AnalyzeBatchView(APIView):
+    """
+    Várias análises numa requisição só (plano de estudos com muitas tarefas): {"items": [{"topic", "depth"}]}.
+    Os hits saem do cache em lote e os misses são gerados em paralelo, então o lote leva mais ou menos
+    o tempo de uma chamada ao Gemini. Resposta parcial: cada item traz `data` ou o próprio `error`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = AnalyzeBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        items = [(item['topic'], item['depth']) for item in serializer.validated_data['items']]
+        results = AIService().analyze_many(items)
+
+        # Gemini fora e nada no cache: mesmo 503 com Retry-After da análise avulsa
+        if all("retry_after" in result for result in results):
+            return unavailable_response(results[0])
+        return Response({"results": results})
+
+
+class HistoryCursorPagination(CursorPagination):
+    """
+    Paginação por cursor (keyset) em vez da PageNumberPagination global:
+    sem COUNT(*) nem OFFSET, cada página é uma busca no índice (user, -created_at, -id).
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class TutorHistoryView(generics.ListAPIView):
+    """
+    Histórico de perguntas do usuário (mais recentes primeiro); ?subject= filtra pela matéria.
+    ?archived=1 lista as interações antigas, já movidas para o arquivo (ver partitions.py).
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = HistoryCursorPagination
+
+    def _archived(self):
+        return self.request.query_params.get('archived') in ('1', 'true')
+
+    def get_serializer_class(self):
+        return ArchivedInteractionPreviewSerializer if self._archived() else InteractionPreviewSerializer
+
+    def get_queryset(self):
+        if self._archived():
+            # O arquivo já guarda o começo da resposta em texto: nada é descomprimido na listagem
+            queryset = TutorInteractionArchive.objects.filter(user=self.request.user)
+            queryset = queryset.defer('answer_compressed').annotate(answer_head=F('answer_preview'))
+        else:
+            # Só o começo da resposta sai do banco
+            queryset = TutorInteraction.objects.filter(user=self.request.user).defer('answer', 'search_vector')
+            queryset = queryset.annotate(answer_head=Left('answer', ANSWER_PREVIEW_CHARS + 1))
+        subject = self.request.query_params.get('subject')
+        if subject:
+            queryset = queryset.filter(subject=subject)
+        return queryset
+
+
+class TutorHistoryDetailView(APIView):
+    """Interação completa (resposta inteira) do histórico do usuário, ativa ou já arquivada (mesmo id)"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        interaction = TutorInteraction.objects.filter(user=request.user, pk=pk).defer('search_vector').first()
+        if interaction is not None:
+            return Response(InteractionDetailSerializer(interaction).data)
+        archived = get_object_or_404(TutorInteractionArchive, user=request.user, pk=pk)
+        return Response(ArchivedInteractionDetailSerializer(archived).data)
+
+
+class TutorSearchView(APIView):
+    """
+    Busca textual no histórico do usuário (tsvector 'portuguese' + índice GIN).
+    ?q= termos (aceita "frase", -exclusão e OR), ?subject= filtra a matéria, ?limit= até 50.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({"error": "O parâmetro 'q' é obrigatório."}, status=400)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            limit = 20
+
+        results = search_history(request.user, text[:200], request.query_params.get('subject'), limit)
+        return Response({"results": InteractionSearchSerializer(results, many=True).data})
@@ -0,0 +1,98 @@
+import json
+import time
+import uuid
+import logging
+import redis
+from django.conf import settings
+from django.urls import reverse
+from django_redis import get_redis_connection
+from config.celery import enqueue
+
+logger = logging.getLogger(__name__)
+
+
+def wants_async(request) -> bool:
+    """Modo assíncrono é opt-in: {"async": true} no corpo ou ?async=1"""
+    flag = request.data.get('async', request.query_params.get('async', ''))
+    return str(flag).lower() in ('1', 'true')
+
+
+class QuizJobStore:
+    """
+    Estado dos jobs de geração de quiz no Redis (chave arena:quizjob:<id>, com TTL).
+    Status: pending -> running -> done | failed
+    """
+    PREFIX = "arena:quizjob"
+
+    def __init__(self, connection=None):
+        self.redis = connection or get_redis_connection("default")
+        self.ttl = settings.ARENA_QUIZ_JOBS["TTL_SECONDS"]
+
+    def _key(self, job_id):
+        return f"{self.PREFIX}:{job_id}"
+
+    def create(self, user_id) -> str:
+        job_id = uuid.uuid4().hex
+        self._save(job_id, {"status": "pending", "user_id": user_id})
+        return job_id
+
+    def get(self, job_id):
+        raw = self.redis.get(self._key(job_id))
+        return json.loads(raw) if raw else None
+
+    def mark_running(self, job_id):
+        job = self.get(job_id)
+        if job:
+            job["status"] = "running"
+            self._save(job_id, job)
+
+    def finish(self, job_id, data: dict, meta: dict):
+        job = self.get(job_id) or {}
+        if "error" in data and not data.get("questions"):
+            job.update({"status": "failed", "error": data["error"]})
+            if "retry_after" in data:
+                job["retry_after"] = data["retry_after"]
+        else:
+            job.update({"status": "done", "result": {**data, **meta}})
+        self._save(job_id, job)
+
+    def wait(self, job_id, timeout: float):
+        """Long-poll: aguarda até o job terminar ou o timeout estourar"""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job and job["status"] in ("pending", "running") and time.monotonic() < deadline:
+            time.sleep(0.25)
+            job = self.get(job_id)
+        return job
+
+    def discard(self, job_id):
+        self.redis.delete(self._key(job_id))
+
+    def _save(self, job_id, job):
+        self.redis.set(self._key(job_id), json.dumps(job), ex=self.ttl)
+
+
+def start_quiz_job(request, topic, difficulty, meta, refill_pool=False):
+    """
+    Cria o job e enfileira a geração no Celery.
+    Retorna o payload 202 para o cliente, ou None se o broker ou o Redis estiverem
+    indisponíveis (nesse caso a view segue no modo síncrono).
+    """
+    from .tasks import run_quiz_job
+
+    try:
+        store = QuizJobStore()
+        job_id = store.create(request.user.id)
+        if not enqueue(run_quiz_job, job_id, topic, difficulty, meta, refill_pool):
+            store.discard(job_id)
+            return None
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"⚠️ Job de quiz não criado (Redis indisponível), seguindo no modo síncrono: {e}")
+        return None
+
+    logger.info(f"📨 Job de quiz enfileirado: {job_id}")
+    return {
+        "job_id": job_id,
+        "status": "pending",
+        "status_url": request.build_absolute_uri(reverse('arena-job-status', args=[job_id])),
+    }
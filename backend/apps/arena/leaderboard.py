@@ -0,0 +1,196 @@
+import logging
+from django_redis import get_redis_connection
+from .models import PlayerProfile
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 5000
+REBUILD_LOCK_SECONDS = 60 * 10
+
+# ZINCRBY no ranking; durante um rebuild o incremento também vai para o journal, para ser
+# reaplicado no ZSET reconstruído. Incrementos diretos (após o commit no Postgres) entram no journal
+# desde o início do rebuild; os do buffer de XP só depois da leitura do buffer (fase 'journal').
+INCREMENT_SCRIPT = """
+redis.call('zincrby', KEYS[1], ARGV[2], ARGV[1])
+local phase = redis.call('get', KEYS[2])
+if phase == 'journal' or (phase and ARGV[3] == 'direct') then
+    redis.call('hincrby', KEYS[3], ARGV[1], ARGV[2])
+end
+return 1
+"""
+
+# Reaplica o journal no ZSET reconstruído, troca pelo ranking atual e marca o ranking como completo
+SWAP_SCRIPT = """
+local journal = redis.call('hgetall', KEYS[3])
+for i = 1, #journal, 2 do
+    redis.call('zincrby', KEYS[1], journal[i + 1], journal[i])
+end
+if redis.call('exists', KEYS[1]) == 1 then
+    redis.call('rename', KEYS[1], KEYS[2])
+else
+    redis.call('del', KEYS[2])
+end
+redis.call('del', KEYS[3], KEYS[4])
+redis.call('set', KEYS[5], 1)
+return #journal / 2
+"""
+
+
+class Leaderboard:
+    """
+    Ranking global por XP num ZSET do Redis (membro = user_id, score = xp).
+    Top-N, rank exato e janela "ao meu redor" custam O(log n) em vez de ORDER BY na tabela.
+    O Postgres continua sendo a fonte da verdade: rebuild() recarrega tudo e corrige divergências.
+
+    READY_KEY só existe depois de um rebuild completo: um FLUSHALL/restart do Redis o apaga e o
+    próximo acesso reconstrói o ranking, mesmo que um ZINCRBY já tenha recriado o ZSET parcial.
+    """
+    KEY = "arena:leaderboard"
+    READY_KEY = "arena:leaderboard:ready"
+    REBUILDING_KEY = "arena:leaderboard:rebuilding"
+    JOURNAL_KEY = "arena:leaderboard:journal"
+
+    def __init__(self, connection=None):
+        self.redis = connection or get_redis_connection("default")
+
+    def update(self, user_id, xp):
+        self.redis.zadd(self.KEY, {user_id: xp})
+
+    def add_player(self, user_id):
+        """Entra no ranking com 0 XP se ainda não estiver nele (o XP chega pelos incrementos)"""
+        self.redis.zadd(self.KEY, {user_id: 0}, nx=True)
+
+    def increment(self, user_id, amount, pipe=None, source="direct"):
+        """Incremento comutativo: commits concorrentes nunca sobrescrevem um ao outro"""
+        (pipe or self.redis).eval(
+            INCREMENT_SCRIPT, 3, self.KEY, self.REBUILDING_KEY, self.JOURNAL_KEY, user_id, amount, source
+        )
+
+    def is_ready(self) -> bool:
+        return bool(self.redis.exists(self.READY_KEY))
+
+    def total(self) -> int:
+        return self.redis.zcard(self.KEY)
+
+    def top(self, limit=10):
+        """[(user_id, xp)] dos primeiros colocados"""
+        return self._decode(self.redis.zrevrange(self.KEY, 0, limit - 1, withscores=True))
+
+    def rank(self, user_id):
+        """Posição (1-based) do usuário ou None se ele não estiver no ranking"""
+        rank = self.redis.zrevrank(self.KEY, user_id)
+        return None if rank is None else rank + 1
+
+    def around(self, user_id, radius=5):
+        """
+        Janela de jogadores ao redor do usuário.
+        Retorna (posição do primeiro da janela, [(user_id, xp)]) ou (None, []).
+        """
+        rank = self.redis.zrevrank(self.KEY, user_id)
+        if rank is None:
+            return None, []
+        start = max(rank - radius, 0)
+        entries = self.redis.zrevrange(self.KEY, start, rank + radius, withscores=True)
+        return start + 1, self._decode(entries)
+
+    def rebuild(self, rows, read_pending=None):
+        """
+        Recarrega o ranking a partir de (user_id, xp) vindos do Postgres.
+
+        Monta um ZSET temporário, soma o XP ainda no buffer (`read_pending(phase_key)` lê o buffer
+        e muda a fase para 'journal' de forma atômica) e troca pelo ranking atual com RENAME.
+        Incrementos que chegam durante o rebuild vão para o journal e são reaplicados na troca,
+        então placares altos ou baixos demais são corrigidos sem perder os pontos novos.
+        Retorna estatísticas da divergência encontrada no ranking antigo, ou None se outro
+        rebuild já estiver em andamento.
+        """
+        if not self.redis.set(self.REBUILDING_KEY, "loading", nx=True, ex=REBUILD_LOCK_SECONDS):
+            return None
+        tmp_key = f"{self.KEY}:rebuild"
+        try:
+            self.redis.delete(tmp_key, self.JOURNAL_KEY)
+            stats = {"loaded": 0, "drifted": 0, "missing": 0, "stale": 0, "replayed": 0}
+
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= REBUILD_BATCH_SIZE:
+                    self._load_batch(tmp_key, batch, stats)
+                    batch = []
+            if batch:
+                self._load_batch(tmp_key, batch, stats)
+
+            if read_pending:
+                pending = read_pending(self.REBUILDING_KEY)
+            else:
+                pending = {}
+                self.redis.set(self.REBUILDING_KEY, "journal", xx=True)
+            pipe = self.redis.pipeline()
+            for user_id, xp in pending.items():
+                pipe.zincrby(tmp_key, xp, user_id)
+            pipe.execute()
+
+            self._count_drift(tmp_key, stats)
+            # Membros no ranking antigo que não existem mais no banco
+            stats["stale"] = max(self.total() - (stats["loaded"] - stats["missing"]), 0)
+            stats["replayed"] = self.redis.eval(
+                SWAP_SCRIPT, 5, tmp_key, self.KEY, self.JOURNAL_KEY, self.REBUILDING_KEY, self.READY_KEY
+            )
+        except Exception:
+            self.redis.delete(tmp_key, self.JOURNAL_KEY, self.REBUILDING_KEY)
+            raise
+
+        logger.info(f"🏆 Leaderboard reconstruído: {stats}")
+        return stats
+
+    def _load_batch(self, tmp_key, batch, stats):
+        self.redis.zadd(tmp_key, {user_id: xp for user_id, xp in batch})
+        stats["loaded"] += len(batch)
+
+    def _count_drift(self, tmp_key, stats):
+        """Compara o ZSET reconstruído com o ranking atual, em lotes"""
+        batch = []
+        for entry in self.redis.zscan_iter(tmp_key, count=REBUILD_BATCH_SIZE):
+            batch.append(entry)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                self._compare(batch, stats)
+                batch = []
+        if batch:
+            self._compare(batch, stats)
+
+    def _compare(self, batch, stats):
+        current = self.redis.zmscore(self.KEY, [member for member, _ in batch])
+        for (_, xp), score in zip(batch, current):
+            if score is None:
+                stats["missing"] += 1
+            elif score != xp:
+                stats["drifted"] += 1
+
+    @staticmethod
+    def _decode(entries):
+        return [(int(member), int(score)) for member, score in entries]
+
+
+def rebuild_from_db():
+    """
+    Recarrega o ranking inteiro a partir da tabela PlayerProfile + o XP ainda no buffer.
+    Segura a trava do flush do buffer de XP: nenhum lote sai do buffer para o banco no meio
+    do caminho, então o snapshot do banco e a leitura do buffer não se sobrepõem nem deixam buracos.
+    Retorna None se a trava ou o rebuild estiverem ocupados (o próximo acesso tenta de novo).
+    """
+    from .xp_buffer import XPBuffer  # xp_buffer importa este módulo
+
+    board = Leaderboard()
+    buffer = XPBuffer(board.redis)
+    with buffer.flush_lock(REBUILD_LOCK_SECONDS) as acquired:
+        if not acquired:
+            logger.info("⏳ Flush do buffer de XP em andamento, rebuild do leaderboard adiado")
+            return None
+        rows = PlayerProfile.objects.values_list('user_id', 'xp').iterator(chunk_size=REBUILD_BATCH_SIZE)
+        return board.rebuild(rows, read_pending=buffer.pending)
+
+
+def ensure_ready(board):
+    """Reconstrói o ranking se ele não estiver completo (Redis novo, FLUSHALL, restart sem persistência)"""
+    if not board.is_ready():
+        rebuild_from_db()
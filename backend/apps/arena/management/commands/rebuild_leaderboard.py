@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.arena.leaderboard import rebuild_from_db
+
+
+class Command(BaseCommand):
+    help = "Recarrega o ranking (ZSET no Redis) a partir do Postgres e reporta as divergências corrigidas"
+
+    def handle(self, *args, **options):
+        stats = rebuild_from_db()
+        self.stdout.write(
+            f"Jogadores carregados: {stats['loaded']} | XP divergente: {stats['drifted']} | "
+            f"Ausentes no Redis: {stats['missing']} | Removidos (sem perfil): {stats['stale']}"
+        )
+        self.stdout.write(self.style.SUCCESS("✅ Leaderboard reconstruído"))
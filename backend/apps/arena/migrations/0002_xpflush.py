@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arena', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XPFlush',
+            fields=[
+                ('flush_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('applied_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -1,8 +1,27 @@
-from django.db import models
+import logging
+import redis
+from django.db import models, transaction
+from django.db.models import F
 from django.conf import settings
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+logger = logging.getLogger(__name__)
+
+def level_for_xp(xp):
+    return (xp // 1000) + 1 # Nível sobe a cada 1000 XP
+
+def level_expression(xp):
+    """Mesma regra do level_for_xp, calculada no SQL (divisão inteira)"""
+    return xp / 1000 + 1
+
+def _push_to_leaderboard(user_id, amount):
+    from .leaderboard import Leaderboard
+    try:
+        Leaderboard().increment(user_id, amount)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"⚠️ Leaderboard não atualizado (será corrigido no rebuild): {e}")
+
 class PlayerProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="player_profile")
     xp = models.IntegerField(default=0)
@@ -12,13 +31,51 @@ class PlayerProfile(models.Model):
     class Meta: ordering = ['-xp']
 
     def add_xp(self, amount):
-        self.xp += amount
-        self.quizzes_played += 1
-        self.level = (self.xp // 1000) + 1 # Nível sobe a cada 1000 XP
-        self.save()
+        """
+        Soma XP e conta a partida sem read-modify-write em Python.
+        - Padrão: UPDATE atômico com F(), nível calculado no próprio SQL.
+        - ARENA_XP_BUFFER['ENABLED']: acumula no Redis e a task flush_xp_buffer grava em lote.
+        """
+        if settings.ARENA_XP_BUFFER["ENABLED"]:
+            from .xp_buffer import XPBuffer
+            try:
+                pending_xp = XPBuffer().add(self.user_id, amount)
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"⚠️ Buffer de XP indisponível, gravando direto: {e}")
+            else:
+                # XP exibido = valor lido do banco + o que ainda está no buffer
+                if not hasattr(self, '_db_xp'):
+                    self._db_xp = self.xp
+                self.xp = self._db_xp + pending_xp
+                self.level = level_for_xp(self.xp)
+                return
+
+        new_xp = F('xp') + amount
+        PlayerProfile.objects.filter(pk=self.pk).update(
+            xp=new_xp,
+            quizzes_played=F('quizzes_played') + 1,
+            level=level_expression(new_xp),
+        )
+        self.refresh_from_db(fields=['xp', 'level', 'quizzes_played'])
+        self.sync_leaderboard(amount)
+
+    def sync_leaderboard(self, amount):
+        """Soma o XP no ranking do Redis só depois do commit (rollback não suja o ZSET)"""
+        user_id = self.user_id
+        transaction.on_commit(lambda: _push_to_leaderboard(user_id, amount))
 
     def __str__(self): return f"{self.user.name} ({self.xp} XP)"
 
+class XPFlush(models.Model):
+    """
+    Lotes do buffer de XP (xp_buffer.py) já somados no Postgres. Gravado na mesma transação do UPDATE:
+    se a limpeza das chaves no Redis falhar depois do commit, o próximo flush descarta o lote em vez de somar de novo.
+    """
+    flush_id = models.CharField(max_length=32, primary_key=True)
+    applied_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self): return self.flush_id
+
 # --- NOVO MODELO ---
 class TopicMastery(models.Model):
     """Rastreia o progresso em um tópico específico (ex: Python)"""
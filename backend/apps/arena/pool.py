@@ -0,0 +1,162 @@
+import json
+import time
+import logging
+import redis
+from django.conf import settings
+from django_redis import get_redis_connection
+from apps.llm.topics import canonical_topic
+
+logger = logging.getLogger(__name__)
+
+
+def pool_key(topic: str) -> str:
+    """Normaliza o tópico para identificar o pool (ex: " Python  Avançado" -> "python avancado")"""
+    return canonical_topic(topic)
+
+
+class QuizPool:
+    """
+    Estoque de quizzes pré-gerados por (tópico, dificuldade) guardado no Redis.
+
+    Estrutura das chaves:
+    - arena:quizpool:q:<difficulty>:<topic>  -> LIST com os quizzes (JSON) prontos
+    - arena:quizpool:lru                     -> ZSET pool_id -> último acesso (para eviction LRU)
+    - arena:quizpool:meta                    -> HASH pool_id -> {"topic", "difficulty"} originais
+    - arena:quizpool:refill:<pool_id>        -> trava de reabastecimento em andamento
+    - arena:quizpool:stale:<pool_id>         -> último quiz gerado (fallback com o Gemini fora do ar)
+    """
+    PREFIX = "arena:quizpool"
+
+    def __init__(self, connection=None):
+        self.redis = connection or get_redis_connection("default")
+        config = settings.ARENA_QUIZ_POOL
+        self.target_size = config["TARGET_SIZE"]
+        self.low_water = config["LOW_WATER"]
+        self.max_pools = config["MAX_POOLS"]
+        self.ttl = config["TTL_SECONDS"]
+
+    # --- Chaves ---
+    def _pool_id(self, topic, difficulty):
+        return f"{difficulty.lower()}:{pool_key(topic)}"
+
+    def _list_key(self, pool_id):
+        return f"{self.PREFIX}:q:{pool_id}"
+
+    def _stale_key(self, pool_id):
+        return f"{self.PREFIX}:stale:{pool_id}"
+
+    @property
+    def _lru_key(self):
+        return f"{self.PREFIX}:lru"
+
+    @property
+    def _meta_key(self):
+        return f"{self.PREFIX}:meta"
+
+    # --- Leitura ---
+    def pop(self, topic: str, difficulty: str):
+        """
+        Retira um quiz pronto do pool.
+        Retorna (quiz, restantes) ou (None, 0) em cache miss ou Redis indisponível.
+        """
+        pool_id = self._pool_id(topic, difficulty)
+        try:
+            pipe = self.redis.pipeline()
+            pipe.rpop(self._list_key(pool_id))
+            pipe.llen(self._list_key(pool_id))
+            pipe.zadd(self._lru_key, {pool_id: time.time()}, xx=True)
+            raw, remaining, _ = pipe.execute()
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"⚠️ Pool de quizzes indisponível: {e}")
+            return None, 0
+
+        if raw is None:
+            return None, 0
+        return json.loads(raw), remaining
+
+    def stale(self, topic: str, difficulty: str):
+        """Último quiz gerado para o tópico (repetido), usado só quando o LLM está indisponível"""
+        try:
+            raw = self.redis.get(self._stale_key(self._pool_id(topic, difficulty)))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"⚠️ Pool de quizzes indisponível: {e}")
+            return None
+        return json.loads(raw) if raw else None
+
+    def size(self, topic: str, difficulty: str) -> int:
+        return self.redis.llen(self._list_key(self._pool_id(topic, difficulty)))
+
+    # --- Escrita ---
+    def register(self, topic: str, difficulty: str):
+        """Marca o pool como ativo para que o reabastecimento periódico o conheça"""
+        pool_id = self._pool_id(topic, difficulty)
+        pipe = self.redis.pipeline()
+        pipe.zadd(self._lru_key, {pool_id: time.time()}, nx=True)
+        pipe.hset(self._meta_key, pool_id, json.dumps({"topic": topic, "difficulty": difficulty}))
+        pipe.execute()
+
+    def push(self, topic: str, difficulty: str, quiz: dict):
+        """Adiciona um quiz ao pool, respeitando o tamanho máximo (TARGET_SIZE)"""
+        pool_id = self._pool_id(topic, difficulty)
+        list_key = self._list_key(pool_id)
+        pipe = self.redis.pipeline()
+        pipe.lpush(list_key, json.dumps(quiz))
+        pipe.ltrim(list_key, 0, self.target_size - 1)
+        pipe.expire(list_key, self.ttl)
+        pipe.set(self._stale_key(pool_id), json.dumps(quiz), ex=self.ttl)
+        pipe.execute()
+
+    def remember(self, topic: str, difficulty: str, quiz: dict):
+        """Guarda um quiz gerado ao vivo como fallback (não entra no estoque)"""
+        try:
+            self.redis.set(self._stale_key(self._pool_id(topic, difficulty)), json.dumps(quiz), ex=self.ttl)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"⚠️ Pool de quizzes indisponível: {e}")
+
+    # --- Reabastecimento ---
+    def missing(self, topic: str, difficulty: str) -> int:
+        return max(self.target_size - self.size(topic, difficulty), 0)
+
+    def claim_refill(self, topic: str, difficulty: str) -> bool:
+        """Garante um único reabastecimento em andamento por pool (SET NX com expiração)"""
+        pool_id = self._pool_id(topic, difficulty)
+        return bool(self.redis.set(f"{self.PREFIX}:refill:{pool_id}", 1, nx=True, ex=300))
+
+    def release_refill(self, topic: str, difficulty: str):
+        self.redis.delete(f"{self.PREFIX}:refill:{self._pool_id(topic, difficulty)}")
+
+    def low_pools(self):
+        """Lista (topic, difficulty) dos pools ativos abaixo da marca mínima (LOW_WATER)"""
+        pool_ids = self.redis.zrange(self._lru_key, 0, -1)
+        if not pool_ids:
+            return []
+
+        pipe = self.redis.pipeline()
+        for pool_id in pool_ids:
+            pipe.llen(self._list_key(pool_id.decode()))
+        sizes = pipe.execute()
+        metas = self.redis.hmget(self._meta_key, pool_ids)
+
+        low = []
+        for size, meta in zip(sizes, metas):
+            if meta is not None and size < self.low_water:
+                meta = json.loads(meta)
+                low.append((meta["topic"], meta["difficulty"]))
+        return low
+
+    def evict_cold(self) -> int:
+        """Remove os pools acessados há mais tempo quando passamos de MAX_POOLS (LRU)"""
+        overflow = self.redis.zcard(self._lru_key) - self.max_pools
+        if overflow <= 0:
+            return 0
+
+        cold = [pool_id.decode() for pool_id in self.redis.zrange(self._lru_key, 0, overflow - 1)]
+        pipe = self.redis.pipeline()
+        for pool_id in cold:
+            pipe.delete(self._list_key(pool_id), self._stale_key(pool_id))
+        pipe.zrem(self._lru_key, *cold)
+        pipe.hdel(self._meta_key, *cold)
+        pipe.execute()
+
+        logger.info(f"🧹 {len(cold)} pools frios removidos do estoque de quizzes")
+        return len(cold)
@@ -19,4 +19,8 @@ class MasterySerializer(serializers.ModelSerializer):
 class GameResultSerializer(serializers.Serializer):
     topic = serializers.CharField()
     xp_gained = serializers.IntegerField()
-    passed = serializers.BooleanField() # Se passou de nível ou não
\ No newline at end of file
+    passed = serializers.BooleanField() # Se passou de nível ou não
+
+class BatchAnswerSerializer(serializers.Serializer):
+    session_id = serializers.CharField()
+    answers = serializers.ListField(child=serializers.IntegerField(allow_null=True), max_length=20)
@@ -1,29 +1,50 @@
-import os
-import json
 import re
 import logging
-import google.generativeai as genai
 import google.api_core.exceptions
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from apps.journey.curriculum import is_curriculum_prompt
+from apps.llm import gateway
+from apps.llm.jsonstream import JsonArrayStreamer, recover_json
+from apps.llm.breaker import CircuitOpen
+from apps.llm.singleflight import SingleFlight
+from .pool import pool_key
+from .validation import QUIZ_SIZE, question_errors, split_questions
 
 logger = logging.getLogger(__name__)
 
+_quiz_flight = SingleFlight("arena:quiz")
+
+# Configuração para modo JSON
+QUIZ_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "response_mime_type": "application/json"
+}
+
+# Mapeia dificuldade para contexto mais rico
+DIFFICULTY_CONTEXT = {
+    "easy": "iniciante - conceitos básicos e fundamentais",
+    "medium": "intermediário - aplicações práticas e melhores práticas",
+    "hard": "avançado - otimizações, edge cases e arquitetura"
+}
+
+# Teto de saída por pergunta no reparo (o quiz completo não tem limite explícito)
+REPAIR_TOKENS_PER_QUESTION = 400
+
 class ArenaService:
     def __init__(self):
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.is_configured = True
-            logger.info("✅ Gemini API configurada com sucesso")
-        else:
-            self.is_configured = False
-            logger.error("❌ GEMINI_API_KEY não encontrada")
+        # O cliente do Gemini é configurado uma vez por worker pelo gateway
+        self.is_configured = gateway.configure()
 
     def validate_topic(self, topic: str):
         """
         Higieniza e valida o tópico para evitar SSRF/Prompt Injection via input.
         """
+        # 0. Prompts das fases da Jornada vêm do currículo (têm ':', ',', '.' e passam de 100 caracteres)
+        if is_curriculum_prompt(topic):
+            return
+
         # 1. Limite de tamanho
         if len(topic) > 100:
             raise ValidationError("Tópico muito longo.")
@@ -44,17 +65,8 @@ class ArenaService:
         if any(bad in normalized_topic for bad in blacklist):
             raise ValidationError("Tópico não permitido por segurança.")
 
-    def generate_quiz(self, topic: str, difficulty: str = "medium") -> dict:
-        """
-        Gera um Quiz Gamificado usando o Gemini 1.5 Flash.
-        
-        Args:
-            topic: Tópico do quiz
-            difficulty: Nível de dificuldade (easy, medium, hard)
-            
-        Returns:
-            dict com formato {"questions": [...]} ou {"error": "mensagem"}
-        """
+    def _check_input(self, topic: str):
+        """Retorna o dict de erro padrão se a IA não estiver pronta ou o tópico for inválido"""
         if not self.is_configured:
             logger.error("API não configurada - verifique GEMINI_API_KEY")
             return {
@@ -71,15 +83,10 @@ class ArenaService:
                 "error": str(e.message),
                 "questions": []
             }
-        
-        # Mapeia dificuldade para contexto mais rico
-        difficulty_context = {
-            "easy": "iniciante - conceitos básicos e fundamentais",
-            "medium": "intermediário - aplicações práticas e melhores práticas",
-            "hard": "avançado - otimizações, edge cases e arquitetura"
-        }
-        
-        context = difficulty_context.get(difficulty.lower(), difficulty_context["medium"])
+        return None
+
+    def _build_prompt(self, topic: str, difficulty: str) -> str:
+        context = DIFFICULTY_CONTEXT.get(difficulty.lower(), DIFFICULTY_CONTEXT["medium"])
         
         # Prompt otimizado para JSON estruturado
         prompt = f"""
@@ -109,64 +116,68 @@ REGRAS OBRIGATÓRIAS:
 - Perguntas técnicas e práticas
 - Feedbacks com emojis e linguagem descontraída
 """
+        return prompt
+
+    def generate_quiz(self, topic: str, difficulty: str = "medium") -> dict:
+        """
+        Gera um Quiz Gamificado usando o Gemini 1.5 Flash.
         
-        try:
-            # Configuração para modo JSON
-            generation_config = {
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "response_mime_type": "application/json"
-            }
-            
-            # Usa o modelo estável (não o alias 'latest')
-            model = genai.GenerativeModel(
-                "gemini-2.0-flash",  # Modelo estável
-                generation_config=generation_config
-            )
+        Args:
+            topic: Tópico do quiz
+            difficulty: Nível de dificuldade (easy, medium, hard)
             
+        Returns:
+            dict com formato {"questions": [...]} ou {"error": "mensagem"}
+        """
+        error = self._check_input(topic)
+        if error:
+            return error
+
+        prompt = self._build_prompt(topic, difficulty)
+        
+        # Single-flight: pedidos idênticos simultâneos compartilham a mesma chamada ao Gemini
+        flight_key = f"{difficulty.lower()}:{pool_key(topic)}"
+        return _quiz_flight.do(flight_key, lambda: self._request_quiz(prompt, topic, difficulty))
+
+    def _request_quiz(self, prompt: str, topic: str, difficulty: str) -> dict:
+        """Chamada efetiva ao Gemini + parsing do JSON do quiz"""
+        try:
             logger.info(f"🤖 Gerando quiz: topic={topic}, difficulty={difficulty}")
-            response = model.generate_content(prompt)
+            response = gateway.generate(
+                prompt,
+                generation_config=QUIZ_GENERATION_CONFIG,
+                timeout=settings.LLM_GATEWAY["QUIZ_TIMEOUT"]
+            )
             
             # Extrai o texto da resposta
             text_response = response.text.strip()
             logger.debug(f"Resposta bruta: {text_response[:200]}...")
             
-            # Tenta parsear JSON diretamente
-            try:
-                quiz_data = json.loads(text_response)
-                
-                # Valida estrutura básica
-                if "questions" not in quiz_data:
-                    raise ValueError("Campo 'questions' não encontrado")
-                
-                if not isinstance(quiz_data["questions"], list):
-                    raise ValueError("'questions' deve ser uma lista")
-                
-                logger.info(f"✅ Quiz gerado com {len(quiz_data['questions'])} perguntas")
-                return quiz_data
-                
-            except json.JSONDecodeError as json_err:
-                logger.warning(f"JSON malformado, tentando limpeza: {json_err}")
-                
-                # Fallback 1: Remove markdown code blocks
-                cleaned = re.sub(r'```json\s*|\s*```', '', text_response)
-                
-                # Fallback 2: Extrai objeto JSON principal
-                match = re.search(r'\{.*\}', cleaned, re.DOTALL)
-                if match:
-                    quiz_data = json.loads(match.group(0))
-                    logger.info("✅ JSON extraído via regex")
-                    return quiz_data
-                
-                # Fallback 3: Se encontrou array, envelopa
-                match_arr = re.search(r'\[.*\]', cleaned, re.DOTALL)
-                if match_arr:
-                    quiz_data = {"questions": json.loads(match_arr.group(0))}
-                    logger.info("✅ Array convertido para objeto")
-                    return quiz_data
-                
-                raise ValueError("Não foi possível extrair JSON válido da resposta")
-        
+            # Parser tolerante em uma passada: cercas, prosa em volta, vírgulas sobrando e truncamento
+            parsed = recover_json(text_response)
+            if isinstance(parsed, list):
+                parsed = {"questions": parsed}
+
+            # Valida pergunta a pergunta; só as quebradas/faltantes voltam para o Gemini
+            questions, problems = split_questions(parsed)
+            missing = QUIZ_SIZE - len(questions)
+            if missing > 0:
+                logger.warning(f"🔧 {missing} pergunta(s) para regenerar: {problems}")
+                questions += self._repair_questions(topic, difficulty, questions, problems, missing)
+
+            if not questions:
+                raise ValueError("Nenhuma pergunta válida na resposta")
+
+            for position, question in enumerate(questions, start=1):
+                question["id"] = position
+            logger.info(f"✅ Quiz gerado com {len(questions)} perguntas")
+            return {"questions": questions}
+
+        except CircuitOpen as e:
+            # Gemini fora do ar: falha na hora e o chamador decide o fallback
+            logger.warning(f"🔴 {e}")
+            return {"error": str(e), "questions": [], "retry_after": e.retry_after}
+
         except google.api_core.exceptions.NotFound as e:
             # Erro específico de modelo não encontrado
             logger.error(f"❌ Modelo não encontrado: {str(e)}")
@@ -182,6 +193,109 @@ REGRAS OBRIGATÓRIAS:
                 "questions": []
             }
     
+    def _repair_questions(self, topic: str, difficulty: str, valid: list, problems: list, missing: int) -> list:
+        """
+        Pede ao Gemini apenas as perguntas que faltam (prompt e saída bem menores que o quiz inteiro).
+        Em caso de falha, devolve [] e o quiz segue com as perguntas válidas.
+        """
+        context = DIFFICULTY_CONTEXT.get(difficulty.lower(), DIFFICULTY_CONTEXT["medium"])
+        existing = "\n".join(f"- {q['text']}" for q in valid) or "- (nenhuma)"
+        issues = "; ".join(sorted({error for errors in problems for error in errors})) or "perguntas faltando"
+        prompt = f"""
+Crie {missing} pergunta(s) de quiz sobre: "{topic}"
+Nível: {context}. Idioma: PT-BR.
+Não repita estas perguntas:
+{existing}
+Evite os erros da tentativa anterior: {issues}
+
+Retorne APENAS JSON: {{"questions": [{{"text": "...", "options": ["A", "B", "C", "D"], "correct_index": 0, "feedback_correct": "...", "feedback_incorrect": "...", "explanation": "..."}}]}}
+"""
+        try:
+            response = gateway.generate(
+                prompt,
+                generation_config={**QUIZ_GENERATION_CONFIG, "max_output_tokens": REPAIR_TOKENS_PER_QUESTION * missing},
+                timeout=settings.LLM_GATEWAY["QUIZ_TIMEOUT"]
+            )
+            parsed = recover_json(response.text)
+            repaired, still_broken = split_questions({"questions": parsed} if isinstance(parsed, list) else parsed)
+        except Exception as e:
+            logger.warning(f"⚠️ Reparo das perguntas falhou, seguindo com {len(valid)}: {e}")
+            return []
+
+        if still_broken:
+            logger.warning(f"⚠️ {len(still_broken)} pergunta(s) continuam inválidas após o reparo")
+        logger.info(f"🔧 {len(repaired[:missing])} pergunta(s) regeneradas")
+        return repaired[:missing]
+
+    def stream_quiz(self, topic: str, difficulty: str = "medium"):
+        """
+        Versão streaming do generate_quiz: gera cada pergunta válida assim que
+        o Gemini termina de escrevê-la (usa o mesmo prompt e a mesma validação).
+
+        Yields:
+            dict da pergunta; em caso de falha, um único {"error": "mensagem"}
+        """
+        error = self._check_input(topic)
+        if error:
+            yield {"error": error["error"]}
+            return
+
+        prompt = self._build_prompt(topic, difficulty)
+        streamer = JsonArrayStreamer()
+        emitted = 0
+
+        try:
+            logger.info(f"🌊 Gerando quiz em streaming: topic={topic}, difficulty={difficulty}")
+            response = gateway.generate(
+                prompt,
+                generation_config=QUIZ_GENERATION_CONFIG,
+                timeout=settings.LLM_GATEWAY["QUIZ_TIMEOUT"],
+                stream=True
+            )
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # Chunk sem texto (ex: só finish_reason)
+
+                for question in streamer.feed(text):
+                    problems = question_errors(question)
+                    if problems:
+                        logger.warning(f"⚠️ Pergunta descartada no streaming: {problems}")
+                        continue
+                    emitted += 1
+                    yield question
+
+        except CircuitOpen as e:
+            logger.warning(f"🔴 {e}")
+            yield {"error": str(e), "retry_after": e.retry_after}
+            return
+
+        except Exception as e:
+            logger.exception(f"❌ Erro no streaming do quiz: {str(e)}")
+            yield {"error": f"Erro ao gerar quiz: {str(e)}"}
+            return
+
+        if not emitted:
+            yield {"error": "Falha ao gerar perguntas. Tente novamente."}
+
+    def grade_answers(self, answer_key: list, answers: list) -> list:
+        """
+        Corrige a partida inteira em uma passada a partir do gabarito da sessão.
+        Perguntas sem resposta contam como erradas.
+        """
+        results = []
+        for i, item in enumerate(answer_key):
+            user_answer = answers[i] if i < len(answers) else None
+            is_correct = user_answer == item["correct_index"]
+            results.append({
+                "is_correct": is_correct,
+                "feedback": item["feedback_correct"] if is_correct else item["feedback_incorrect"],
+                "explanation": item["explanation"],
+                "correct_answer": item["correct_answer"],
+            })
+        return results
+
     def validate_answer(self, question_data: dict, user_answer: int) -> dict:
         """
         Valida a resposta do usuário.
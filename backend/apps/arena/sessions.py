@@ -0,0 +1,53 @@
+import json
+import uuid
+import logging
+import redis
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+
+class QuizSessionStore:
+    """
+    Gabarito das partidas guardado no servidor (arena:quizsession:<id>, com TTL).
+
+    Guarda só o necessário para corrigir: índice correto, texto da alternativa
+    correta e os feedbacks. O cliente envia apenas os índices escolhidos.
+    Cada sessão é corrigida uma única vez (GETDEL), evitando replay de XP.
+    """
+    PREFIX = "arena:quizsession"
+
+    def __init__(self, connection=None):
+        self.redis = connection or get_redis_connection("default")
+        self.ttl = settings.ARENA_QUIZ_SESSIONS["TTL_SECONDS"]
+
+    def create(self, user_id, topic, questions) -> str:
+        session_id = uuid.uuid4().hex
+        answer_key = [
+            {
+                "correct_index": q["correct_index"],
+                "correct_answer": q["options"][q["correct_index"]],
+                "feedback_correct": q.get("feedback_correct", "Correto!"),
+                "feedback_incorrect": q.get("feedback_incorrect", "Incorreto!"),
+                "explanation": q.get("explanation", ""),
+            }
+            for q in questions
+        ]
+        record = {"user_id": user_id, "topic": topic, "answer_key": answer_key}
+        self.redis.set(f"{self.PREFIX}:{session_id}", json.dumps(record, ensure_ascii=False), ex=self.ttl)
+        return session_id
+
+    def pop(self, session_id):
+        """Retira a sessão para correção (só pode ser usada uma vez)"""
+        raw = self.redis.getdel(f"{self.PREFIX}:{session_id}")
+        return json.loads(raw) if raw else None
+
+
+def open_session(user_id, topic, questions):
+    """Registra o gabarito da partida. Sem Redis, retorna None e o cliente segue no fluxo antigo."""
+    try:
+        return QuizSessionStore().create(user_id, topic, questions)
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ Sessão de quiz não registrada: {e}")
+        return None
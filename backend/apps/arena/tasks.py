@@ -0,0 +1,86 @@
+import logging
+import redis
+from celery import shared_task
+from config.celery import enqueue
+from .jobs import QuizJobStore
+from .leaderboard import rebuild_from_db
+from .pool import QuizPool
+from .sessions import open_session
+from .xp_buffer import XPBuffer
+from .services import ArenaService
+
+logger = logging.getLogger(__name__)
+
+
+def schedule_refill(topic, difficulty, pool=None):
+    """Registra o pool e enfileira seu reabastecimento (no máximo um em andamento por pool)"""
+    pool = pool or QuizPool()
+    try:
+        pool.register(topic, difficulty)
+        if pool.claim_refill(topic, difficulty) and not enqueue(refill_quiz_pool, topic, difficulty):
+            pool.release_refill(topic, difficulty)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"⚠️ Não foi possível agendar reabastecimento do pool: {e}")
+
+
+@shared_task(ignore_result=True)
+def refill_quiz_pool(topic, difficulty):
+    """Gera quizzes até o pool (topic, difficulty) atingir o TARGET_SIZE"""
+    pool = QuizPool()
+    try:
+        missing = pool.missing(topic, difficulty)
+        if not missing:
+            return
+
+        logger.info(f"🔄 Reabastecendo pool: topic={topic}, difficulty={difficulty}, faltam={missing}")
+        service = ArenaService()
+        for _ in range(missing):
+            quiz = service.generate_quiz(topic=topic, difficulty=difficulty)
+            if "error" in quiz or not quiz.get("questions"):
+                logger.warning(f"⚠️ Reabastecimento interrompido: {quiz.get('error')}")
+                break
+            pool.push(topic, difficulty, quiz)
+    finally:
+        pool.release_refill(topic, difficulty)
+
+
+@shared_task(ignore_result=True)
+def refill_low_quiz_pools():
+    """Task periódica: remove pools frios (LRU) e reabastece os que estão abaixo do LOW_WATER"""
+    pool = QuizPool()
+    pool.evict_cold()
+    for topic, difficulty in pool.low_pools():
+        schedule_refill(topic, difficulty, pool=pool)
+
+
+@shared_task(ignore_result=True)
+def run_quiz_job(job_id, topic, difficulty, meta, refill_pool=False):
+    """Executa a geração de um quiz pedido em modo assíncrono e publica o resultado no job"""
+    store = QuizJobStore()
+    store.mark_running(job_id)
+    try:
+        data = ArenaService().generate_quiz(topic=topic, difficulty=difficulty)
+    except Exception as e:
+        logger.exception(f"❌ Erro no job de quiz {job_id}: {e}")
+        data = {"error": f"Erro ao gerar quiz: {str(e)}", "questions": []}
+
+    if data.get("questions") and "player_status" in meta:
+        job = store.get(job_id) or {}
+        meta = {**meta, "session_id": open_session(job.get("user_id"), meta["player_status"]["topic"], data["questions"])}
+
+    store.finish(job_id, data, meta)
+
+    if refill_pool and data.get("questions"):
+        schedule_refill(topic, difficulty)
+
+
+@shared_task(ignore_result=True)
+def rebuild_leaderboard():
+    """Task periódica: reconcilia o ZSET do ranking com o Postgres"""
+    rebuild_from_db()
+
+
+@shared_task(ignore_result=True)
+def flush_xp_buffer():
+    """Task periódica: grava no Postgres os incrementos de XP acumulados no Redis"""
+    XPBuffer().flush()
@@ -0,0 +1,375 @@
+import json
+import redis
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django_redis import get_redis_connection
+from unittest.mock import patch, MagicMock
+
+from apps.llm.breaker import CircuitBreaker
+from .leaderboard import Leaderboard, rebuild_from_db
+from .models import PlayerProfile, XPFlush
+from .pool import QuizPool
+from .services import ArenaService
+from .xp_buffer import XPBuffer
+from .tasks import refill_quiz_pool
+
+User = get_user_model()
+
+FAKE_QUIZ = {
+    "questions": [
+        {"id": 1, "text": "O que é Python?", "options": ["A", "B", "C", "D"], "correct_index": 0}
+    ]
+}
+
+
+class QuizPoolTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="player@test.com", password="password123", name="Player")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('arena-start')
+
+        # Limpa o estoque de quizzes entre os testes
+        redis = get_redis_connection("default")
+        keys = redis.keys(f"{QuizPool.PREFIX}*") + redis.keys(f"{Leaderboard.KEY}*")
+        if keys:
+            redis.delete(*keys)
+        self.pool = QuizPool()
+
+    @patch('apps.arena.views.ArenaService.generate_quiz')
+    def test_quiz_served_from_pool(self, mock_generate):
+        """Com estoque disponível, o quiz sai do pool sem chamar o Gemini"""
+        for _ in range(3):
+            self.pool.push("Python", "easy", FAKE_QUIZ)
+
+        response = self.client.post(self.url, {"topic": "Python"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['questions'], FAKE_QUIZ['questions'])
+        mock_generate.assert_not_called()
+        self.assertEqual(self.pool.size("Python", "easy"), 2)
+
+    @patch('apps.arena.tasks.enqueue', return_value=True)
+    @patch('apps.arena.views.ArenaService.generate_quiz', return_value=dict(FAKE_QUIZ))
+    def test_pool_miss_falls_back_and_schedules_refill(self, mock_generate, mock_enqueue):
+        """Sem estoque, gera ao vivo e agenda um único reabastecimento"""
+        response = self.client.post(self.url, {"topic": "Python"})
+        self.client.post(self.url, {"topic": "Python"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mock_generate.call_count, 2)
+        mock_enqueue.assert_called_once_with(refill_quiz_pool, "Python", "easy")
+        self.assertIn(("Python", "easy"), self.pool.low_pools())
+
+    @patch('apps.arena.tasks.ArenaService.generate_quiz', return_value=FAKE_QUIZ)
+    def test_refill_fills_pool_to_target(self, mock_generate):
+        self.pool.register("Python", "easy")
+        self.pool.claim_refill("Python", "easy")
+
+        refill_quiz_pool("Python", "easy")
+
+        self.assertEqual(self.pool.size("Python", "easy"), self.pool.target_size)
+        self.assertEqual(self.pool.low_pools(), [])
+        # A trava de reabastecimento é liberada ao final
+        self.assertTrue(self.pool.claim_refill("Python", "easy"))
+
+    @patch('apps.arena.tasks.ArenaService.generate_quiz', return_value=dict(FAKE_QUIZ))
+    def test_async_mode_returns_job_and_status(self, mock_generate):
+        """Modo assíncrono: POST devolve 202 + job_id e o GET traz o quiz quando pronto"""
+        def run_inline(task, *args):
+            task(*args)
+            return True
+
+        with patch('apps.arena.jobs.enqueue', side_effect=run_inline), \
+             patch('apps.arena.tasks.enqueue', return_value=True):
+            response = self.client.post(self.url, {"topic": "Python", "async": True}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data['job_id']
+
+        status_response = self.client.get(reverse('arena-job-status', args=[job_id]))
+        self.assertEqual(status_response.data['status'], 'done')
+        self.assertEqual(status_response.data['result']['questions'], FAKE_QUIZ['questions'])
+        self.assertEqual(status_response.data['result']['player_status']['level'], 1)
+
+        # Outro usuário não enxerga o job
+        other = User.objects.create_user(email="other@test.com", password="password123", name="Other")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(reverse('arena-job-status', args=[job_id])).status_code, 404)
+
+    @patch('apps.arena.views.ArenaService.generate_quiz', return_value=dict(FAKE_QUIZ))
+    def test_async_mode_falls_back_to_sync_without_redis(self, mock_generate):
+        with patch('apps.arena.jobs.QuizJobStore.create', side_effect=redis.exceptions.ConnectionError("fora do ar")), \
+             patch('apps.arena.tasks.enqueue', return_value=True):
+            response = self.client.post(self.url, {"topic": "Python", "async": True}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['questions'], FAKE_QUIZ['questions'])
+
+        with patch('apps.arena.views.QuizJobStore.get', side_effect=redis.exceptions.ConnectionError("fora do ar")):
+            status_response = self.client.get(reverse('arena-job-status', args=["abc"]))
+        self.assertEqual(status_response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @patch('apps.arena.tasks.enqueue', return_value=True)
+    @patch('apps.arena.services.gateway.generate')
+    def test_stream_emits_questions_over_sse(self, mock_generate, mock_enqueue):
+        """O endpoint SSE envia cada pergunta válida assim que o JSON dela fecha"""
+        payload = json.dumps({"questions": [
+            FAKE_QUIZ["questions"][0],
+            {"id": 2, "text": "Quebrada", "options": ["A"], "correct_index": 3},
+        ]})
+        mock_generate.return_value = [MagicMock(text=payload[i:i + 7]) for i in range(0, len(payload), 7)]
+
+        response = self.client.post(reverse('arena-stream'), {"topic": "Python"}, HTTP_ACCEPT='text/event-stream')
+        body = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(body.count("event: question"), 1)
+        self.assertIn('event: done\ndata: {"total": 1, "session_id": ', body)
+
+
+class QuizRepairTest(APITestCase):
+    @patch('apps.arena.services.gateway.generate')
+    def test_only_broken_questions_are_regenerated(self, mock_generate):
+        good = FAKE_QUIZ["questions"][0]
+        broken = {"id": 2, "text": "Sem alternativas", "correct_index": 0}
+        repaired = {"text": "Nova pergunta", "options": ["A", "B"], "correct_index": 1}
+        mock_generate.side_effect = [
+            MagicMock(text=json.dumps({"questions": [good, broken, {**good, "id": 3}]})),
+            MagicMock(text=json.dumps({"questions": [repaired]})),
+        ]
+
+        quiz = ArenaService().generate_quiz("Python", "easy")
+
+        self.assertEqual([q["id"] for q in quiz["questions"]], [1, 2, 3])
+        self.assertEqual(quiz["questions"][2]["text"], "Nova pergunta")
+        repair_prompt = mock_generate.call_args_list[1].args[0]
+        self.assertIn("Crie 1 pergunta(s)", repair_prompt)
+        self.assertIn("'options' deve ter ao menos 2 alternativas", repair_prompt)
+        self.assertEqual(mock_generate.call_args_list[1].kwargs["generation_config"]["max_output_tokens"], 400)
+
+
+class LeaderboardTest(APITestCase):
+    def setUp(self):
+        redis = get_redis_connection("default")
+        redis.delete(
+            Leaderboard.KEY, Leaderboard.READY_KEY, Leaderboard.REBUILDING_KEY, Leaderboard.JOURNAL_KEY,
+            XPBuffer.XP_KEY, XPBuffer.QUIZZES_KEY, XPBuffer.LOCK_KEY,
+        )
+
+        self.players = []
+        for i, xp in enumerate([300, 1200, 50, 900]):
+            user = User.objects.create_user(email=f"p{i}@test.com", password="password123", name=f"P{i}")
+            with self.captureOnCommitCallbacks(execute=True):
+                user.player_profile.add_xp(xp)
+            self.players.append(user)
+
+    def test_my_rank_and_window(self):
+        """Rank exato e janela ao redor do usuário direto do ZSET"""
+        self.client.force_authenticate(user=self.players[0])  # 300 XP -> 3º lugar
+
+        response = self.client.get(reverse('arena-my-rank'), {"radius": 1})
+
+        self.assertEqual(response.data['rank'], 3)
+        self.assertEqual([row['user']['name'] for row in response.data['around']], ["P3", "P0", "P2"])
+        self.assertEqual(response.data['around'][0]['rank'], 2)
+
+        top = self.client.get(reverse('arena-leaderboard'), {"limit": 2})
+        self.assertEqual([row['xp'] for row in top.data['results']], [1200, 900])
+
+    def test_rebuild_reconciles_drift(self):
+        """Mudanças feitas direto no banco são corrigidas pelo rebuild"""
+        PlayerProfile.objects.filter(user=self.players[2]).update(xp=5000)
+
+        stats = rebuild_from_db()
+
+        self.assertEqual(stats['drifted'], 1)
+        self.assertEqual(Leaderboard().rank(self.players[2].id), 1)
+
+    def test_rebuild_replaces_scores_and_replays_increments(self):
+        """Placar alto demais é corrigido; XP do buffer e incrementos durante o rebuild continuam valendo"""
+        board = Leaderboard()
+        board.update(self.players[2].id, 99999)                # XP contado duas vezes
+        board.update(999999, 10)                               # Usuário que não existe mais
+        XPBuffer().add(self.players[0].id, 1000)               # XP ainda não gravado no Postgres
+
+        def rows():
+            snapshot = list(PlayerProfile.objects.values_list('user_id', 'xp'))
+            yield from snapshot[:2]
+            board.increment(self.players[3].id, 400)           # Commit direto que chega no meio do rebuild
+            XPBuffer().add(self.players[1].id, 30)             # Entra pela leitura do buffer, não pelo journal
+            yield from snapshot[2:]
+
+        stats = board.rebuild(rows(), read_pending=XPBuffer().pending)
+
+        self.assertEqual((stats['stale'], stats['replayed']), (1, 1))
+        self.assertEqual(board.top(5), [
+            (self.players[3].id, 1300), (self.players[0].id, 1300),
+            (self.players[1].id, 1230), (self.players[2].id, 50),
+        ])
+        self.assertTrue(board.is_ready())
+
+    def test_partial_board_after_redis_flush_is_rebuilt_on_read(self):
+        self.client.force_authenticate(user=self.players[0])
+        self.client.get(reverse('arena-leaderboard'))
+        redis = get_redis_connection("default")
+        redis.delete(Leaderboard.KEY, Leaderboard.READY_KEY)   # FLUSHALL
+        with self.captureOnCommitCallbacks(execute=True):
+            self.players[2].player_profile.add_xp(10)          # ZINCRBY recria um ZSET só com ele
+
+        response = self.client.get(reverse('arena-leaderboard'))
+
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual([row['xp'] for row in response.data['results']], [1200, 900, 300, 60])
+
+    def test_postgres_fallback_keeps_the_same_contract(self):
+        self.client.force_authenticate(user=self.players[0])
+        from_redis = self.client.get(reverse('arena-my-rank'), {"radius": 1}).data
+        top_from_redis = self.client.get(reverse('arena-leaderboard'), {"limit": 2}).data
+
+        with patch('apps.arena.views.Leaderboard', side_effect=redis.exceptions.RedisError("fora do ar")):
+            my_rank = self.client.get(reverse('arena-my-rank'), {"radius": 1})
+            top = self.client.get(reverse('arena-leaderboard'), {"limit": 2})
+
+        self.assertEqual(my_rank.status_code, status.HTTP_200_OK)
+        self.assertEqual(my_rank.data, from_redis)
+        self.assertEqual(top.data, top_from_redis)
+
+
+class AddXPTest(APITestCase):
+    def setUp(self):
+        redis = get_redis_connection("default")
+        keys = redis.keys(f"{XPBuffer.XP_KEY}*") + redis.keys(f"{XPBuffer.QUIZZES_KEY}*")
+        redis.delete(*keys, XPBuffer.LOCK_KEY)
+        self.user = User.objects.create_user(email="xp@test.com", password="password123", name="XP")
+
+    def test_concurrent_increments_are_not_lost(self):
+        """Duas instâncias desatualizadas do mesmo perfil não sobrescrevem o XP uma da outra"""
+        first = PlayerProfile.objects.get(user=self.user)
+        second = PlayerProfile.objects.get(user=self.user)
+
+        first.add_xp(900)
+        second.add_xp(200)
+
+        profile = PlayerProfile.objects.get(user=self.user)
+        self.assertEqual((profile.xp, profile.quizzes_played, profile.level), (1100, 2, 2))
+        self.assertEqual(second.xp, 1100)
+
+    @override_settings(ARENA_XP_BUFFER={"ENABLED": True})
+    def test_buffered_mode_flushes_in_batch(self):
+        profile = PlayerProfile.objects.get(user=self.user)
+        profile.add_xp(600)
+        profile.add_xp(600)
+
+        self.assertEqual(profile.xp, 1200)
+        self.assertEqual(PlayerProfile.objects.get(user=self.user).xp, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(XPBuffer().flush(), 1)
+
+        profile.refresh_from_db()
+        self.assertEqual((profile.xp, profile.quizzes_played, profile.level), (1200, 2, 2))
+        self.assertEqual(XPBuffer().flush(), 0)
+
+    @override_settings(ARENA_XP_BUFFER={"ENABLED": True})
+    def test_overlapping_flushes_apply_xp_once(self):
+        """Um segundo flush que começa no meio do primeiro não soma o mesmo lote"""
+        PlayerProfile.objects.get(user=self.user).add_xp(600)
+        apply_batch = XPBuffer._apply_batch
+        overlapping = []
+
+        def apply_and_flush_again(batch):
+            overlapping.append(XPBuffer().flush())
+            apply_batch(batch)
+
+        with patch.object(XPBuffer, '_apply_batch', side_effect=apply_and_flush_again):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(XPBuffer().flush(), 1)
+
+        self.assertEqual(overlapping, [0])
+        self.assertEqual(PlayerProfile.objects.get(user=self.user).xp, 600)
+        self.assertFalse(get_redis_connection("default").exists(XPBuffer.LOCK_KEY))
+
+    @override_settings(ARENA_XP_BUFFER={"ENABLED": True})
+    def test_batch_left_in_redis_after_commit_is_not_reapplied(self):
+        PlayerProfile.objects.get(user=self.user).add_xp(600)
+
+        # A limpeza pós-commit nunca roda: as chaves :flushing: continuam no Redis
+        with self.captureOnCommitCallbacks(execute=False):
+            self.assertEqual(XPBuffer().flush(), 1)
+        self.assertEqual(XPFlush.objects.count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(XPBuffer().flush(), 0)
+
+        self.assertEqual(PlayerProfile.objects.get(user=self.user).xp, 600)
+        self.assertEqual(get_redis_connection("default").keys(f"{XPBuffer.XP_KEY}:flushing:*"), [])
+
+
+class QuizSessionTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="session@test.com", password="password123", name="Session")
+        self.client.force_authenticate(user=self.user)
+        redis = get_redis_connection("default")
+        keys = redis.keys(f"{QuizPool.PREFIX}*")
+        if keys:
+            redis.delete(*keys)
+
+    @patch('apps.arena.tasks.enqueue', return_value=True)
+    @patch('apps.arena.views.ArenaService.generate_quiz')
+    def test_batch_answers_graded_once(self, mock_generate, mock_enqueue):
+        """Todas as respostas numa requisição: corrige, aplica XP/nível e invalida a sessão"""
+        question = FAKE_QUIZ["questions"][0]
+        mock_generate.return_value = {"questions": [question, {**question, "id": 2, "correct_index": 2}]}
+
+        start = self.client.post(reverse('arena-start'), {"topic": "Python"})
+        session_id = start.data['session_id']
+        self.assertIsNotNone(session_id)
+
+        payload = {"session_id": session_id, "answers": [0, 1]}
+        response = self.client.post(reverse('arena-answers'), payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["is_correct"] for r in response.data['results']], [True, False])
+        self.assertEqual(response.data['results'][1]['correct_answer'], "C")
+        self.assertEqual(response.data['global_xp'], 100)
+        self.assertEqual(response.data['mastery_update']['new_level'], 2)
+
+        # A mesma sessão não rende XP duas vezes
+        replay = self.client.post(reverse('arena-answers'), payload, format='json')
+        self.assertEqual(replay.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(PlayerProfile.objects.get(user=self.user).xp, 100)
+
+
+class DegradedModeTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="degraded@test.com", password="password123", name="Degraded")
+        self.client.force_authenticate(user=self.user)
+        redis = get_redis_connection("default")
+        keys = redis.keys(f"{QuizPool.PREFIX}*")
+        if keys:
+            redis.delete(*keys)
+        self.breaker = CircuitBreaker()
+        self.breaker.reset()
+        self.addCleanup(self.breaker.reset)
+        self.breaker._trip("teste")
+
+    @patch('apps.llm.gateway.genai.GenerativeModel')
+    def test_open_circuit_fails_fast_with_retry_after(self, mock_model_class):
+        response = self.client.post(reverse('arena-start'), {"topic": "Python"})
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
+        mock_model_class.return_value.generate_content.assert_not_called()
+
+    @patch('apps.arena.tasks.enqueue', return_value=True)
+    def test_open_circuit_serves_stale_quiz(self, mock_enqueue):
+        QuizPool().remember("Python", "easy", FAKE_QUIZ)
+
+        response = self.client.post(reverse('arena-start'), {"topic": "Python"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['degraded'])
+        self.assertEqual(response.data['questions'], FAKE_QUIZ['questions'])
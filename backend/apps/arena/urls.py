@@ -1,9 +1,13 @@
 from django.urls import path
-from .views import GenerateQuizView, SubmitScoreView, LeaderboardView, MyMasteryListView
+from .views import GenerateQuizView, StreamQuizView, QuizJobStatusView, SubmitScoreView, SubmitAnswersView, LeaderboardView, MyRankView, MyMasteryListView
 
 urlpatterns = [
     path('battle/start/', GenerateQuizView.as_view(), name='arena-start'),
+    path('battle/stream/', StreamQuizView.as_view(), name='arena-stream'),
+    path('battle/jobs/<str:job_id>/', QuizJobStatusView.as_view(), name='arena-job-status'),
     path('battle/submit/', SubmitScoreView.as_view(), name='arena-submit'),
+    path('battle/answers/', SubmitAnswersView.as_view(), name='arena-answers'),
     path('leaderboard/', LeaderboardView.as_view(), name='arena-leaderboard'),
+    path('leaderboard/me/', MyRankView.as_view(), name='arena-my-rank'),
     path('my-mastery/', MyMasteryListView.as_view(), name='my-mastery'), 
 ]
\ No newline at end of file
@@ -0,0 +1,64 @@
+QUIZ_SIZE = 3
+
+# Esquema de uma pergunta: campo -> (obrigatório, checagem, mensagem de erro)
+QUESTION_SCHEMA = {
+    "text": (True, lambda v, q: isinstance(v, str) and v.strip() != "", "'text' ausente"),
+    "options": (
+        True,
+        lambda v, q: isinstance(v, list) and len(v) >= 2 and all(isinstance(o, str) and o.strip() for o in v),
+        "'options' deve ter ao menos 2 alternativas em texto",
+    ),
+    "correct_index": (
+        True,
+        lambda v, q: isinstance(v, int) and not isinstance(v, bool)
+        and isinstance(q.get("options"), list) and 0 <= v < len(q["options"]),
+        "'correct_index' fora das alternativas",
+    ),
+    "feedback_correct": (False, lambda v, q: isinstance(v, str), "'feedback_correct' deve ser texto"),
+    "feedback_incorrect": (False, lambda v, q: isinstance(v, str), "'feedback_incorrect' deve ser texto"),
+    "explanation": (False, lambda v, q: isinstance(v, str), "'explanation' deve ser texto"),
+}
+
+
+def _compile(schema):
+    """Transforma o esquema numa lista de checagens, montada uma única vez no import"""
+    checks = []
+    for field, (required, check, message) in schema.items():
+        def run(question, field=field, required=required, check=check, message=message):
+            if field not in question:
+                return message if required else None
+            return None if check(question[field], question) else message
+        checks.append(run)
+    return checks
+
+
+_QUESTION_CHECKS = _compile(QUESTION_SCHEMA)
+
+
+def question_errors(question) -> list:
+    """Lista os problemas de uma pergunta do quiz (lista vazia = pergunta válida)"""
+    if not isinstance(question, dict):
+        return ["pergunta não é um objeto"]
+    return [error for error in (check(question) for check in _QUESTION_CHECKS) if error]
+
+
+def split_questions(quiz_data):
+    """
+    Separa as perguntas válidas das quebradas.
+    Retorna (válidas, [erros de cada pergunta quebrada]); levanta ValueError se a estrutura do quiz estiver errada.
+    """
+    if not isinstance(quiz_data, dict) or "questions" not in quiz_data:
+        raise ValueError("Campo 'questions' não encontrado")
+
+    if not isinstance(quiz_data["questions"], list):
+        raise ValueError("'questions' deve ser uma lista")
+
+    valid, problems = [], []
+    for question in quiz_data["questions"]:
+        errors = question_errors(question)
+        if errors:
+            problems.append(errors)
+        else:
+            valid.append(question)
+    return valid, problems
+
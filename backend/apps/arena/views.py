@@ -1,13 +1,66 @@
 import logging
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.contrib.auth import get_user_model
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework import generics
+from apps.llm.breaker import unavailable_response
+from apps.llm.sse import EventStreamRenderer, sse_event, sse_response
+from apps.llm.topics import canonical_topic
 from .services import ArenaService
-from .models import PlayerProfile, TopicMastery
-from .serializers import LeaderboardSerializer, MasterySerializer, GameResultSerializer
+from .pool import QuizPool
+from .jobs import QuizJobStore, start_quiz_job, wants_async
+from .sessions import QuizSessionStore, open_session
+from .tasks import schedule_refill
+from .leaderboard import Leaderboard, ensure_ready
+from .models import PlayerProfile, TopicMastery, level_for_xp
+from .serializers import MasterySerializer, GameResultSerializer, BatchAnswerSerializer
 
 logger = logging.getLogger(__name__)
+User = get_user_model()
+
+
+def resolve_quiz_context(request, raw_topic):
+    """Busca/cria o progresso do usuário no tópico e mapeia o nível para a dificuldade"""
+    # Normaliza o tópico (ex: "Python Avançado" -> "python avancado", "Rédis" -> "redis")
+    topic_key = canonical_topic(raw_topic) or "geral"
+
+    # Busca ou cria o progresso
+    mastery, created = TopicMastery.objects.get_or_create(
+        user=request.user, 
+        topic=topic_key,
+        defaults={'topic': topic_key}
+    )
+    
+    if created:
+        logger.info(f"📊 Novo tópico criado: {topic_key} para {request.user.email}")
+
+    # CORREÇÃO: Mapeia o nível para dificuldade padrão
+    # Nível 1-3 = easy, 4-7 = medium, 8-10 = hard
+    if mastery.level <= 3:
+        difficulty = "easy"
+    elif mastery.level <= 7:
+        difficulty = "medium"
+    else:
+        difficulty = "hard"
+    
+    logger.info(f"📈 Nível do jogador: {mastery.level}, Dificuldade: {difficulty}")
+
+    # Metadados do progresso para o frontend
+    player_status = {
+        'topic': topic_key,
+        'level': mastery.level,
+        'tier': mastery.tier,
+        'tier_display': mastery.get_tier_display(),
+        'xp_required': mastery.get_xp_for_next_level()
+    }
+    return difficulty, player_status
+
 
 class GenerateQuizView(APIView):
     """Inicia o jogo baseando-se no nível atual do usuário"""
@@ -18,36 +71,42 @@ class GenerateQuizView(APIView):
             raw_topic = request.data.get('topic', 'Geral')
             logger.info(f"🎮 [GenerateQuiz] User={request.user.email}, Topic={raw_topic}")
             
-            # Normaliza o tópico (ex: "Python Avançado" -> "python")
-            topic_key = raw_topic.strip().lower().split()[0]
-
-            # Busca ou cria o progresso
-            mastery, created = TopicMastery.objects.get_or_create(
-                user=request.user, 
-                topic=topic_key,
-                defaults={'topic': topic_key}
-            )
-            
-            if created:
-                logger.info(f"📊 Novo tópico criado: {topic_key} para {request.user.email}")
-
-            # CORREÇÃO: Mapeia o nível para dificuldade padrão
-            # Nível 1-3 = easy, 4-7 = medium, 8-10 = hard
-            if mastery.level <= 3:
-                difficulty = "easy"
-            elif mastery.level <= 7:
-                difficulty = "medium"
+            difficulty, player_status = resolve_quiz_context(request, raw_topic)
+
+            # 1. Tenta servir um quiz pré-gerado do pool (instantâneo)
+            pool = QuizPool()
+            data, remaining = pool.pop(raw_topic, difficulty)
+
+            if data is not None:
+                logger.info(f"⚡ Quiz servido do pool ({remaining} restantes)")
             else:
-                difficulty = "hard"
-            
-            logger.info(f"📈 Nível do jogador: {mastery.level}, Dificuldade: {difficulty}")
-            
-            # Chama o serviço com parâmetros corretos
-            service = ArenaService()
-            data = service.generate_quiz(
-                topic=raw_topic,  # Mantém o tópico original (ex: "Python Avançado")
-                difficulty=difficulty
-            )
+                # Modo assíncrono (opt-in): devolve o job_id e libera o worker na hora
+                if wants_async(request):
+                    job = start_quiz_job(
+                        request, raw_topic, difficulty,
+                        meta={'player_status': player_status},
+                        refill_pool=True
+                    )
+                    if job:
+                        return Response(job, status=202)
+
+                # 2. Pool vazio: gera ao vivo (mantém o tópico original, ex: "Python Avançado")
+                logger.info("🧊 Pool vazio, gerando quiz ao vivo")
+                service = ArenaService()
+                data = service.generate_quiz(
+                    topic=raw_topic,
+                    difficulty=difficulty
+                )
+
+                if "retry_after" in data:
+                    # Gemini fora do ar: repete o último quiz do tópico ou falha rápido com Retry-After
+                    stale = pool.stale(raw_topic, difficulty)
+                    if stale is None:
+                        return unavailable_response(data)
+                    logger.warning("🧊 Gemini indisponível, servindo quiz repetido")
+                    data = {**stale, "degraded": True}
+                elif data.get("questions"):
+                    pool.remember(raw_topic, difficulty, data)
             
             # Verifica se houve erro na geração
             if "error" in data and not data.get("questions"):
@@ -62,14 +121,13 @@ class GenerateQuizView(APIView):
                     "questions": []
                 }, status=500)
             
-            # Adiciona metadados do progresso para o frontend
-            data['player_status'] = {
-                'topic': topic_key,
-                'level': mastery.level,
-                'tier': mastery.tier,
-                'tier_display': mastery.get_tier_display(),
-                'xp_required': mastery.get_xp_for_next_level()
-            }
+            # Pool abaixo da marca mínima: reabastece em background
+            if remaining < pool.low_water:
+                schedule_refill(raw_topic, difficulty, pool=pool)
+
+            data['player_status'] = player_status
+            # Gabarito fica no servidor: o cliente responde tudo de uma vez em battle/answers
+            data['session_id'] = open_session(request.user.id, player_status['topic'], data['questions'])
             
             logger.info(f"✅ Quiz gerado com {len(data['questions'])} perguntas")
             return Response(data)
@@ -82,6 +140,87 @@ class GenerateQuizView(APIView):
             }, status=500)
 
 
+class StreamQuizView(APIView):
+    """
+    Versão SSE do battle/start: envia cada pergunta assim que ela fica pronta.
+    Eventos: status (player_status) -> question (uma por pergunta) -> done | error
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def post(self, request):
+        raw_topic = request.data.get('topic', 'Geral')
+        logger.info(f"🌊 [StreamQuiz] User={request.user.email}, Topic={raw_topic}")
+
+        difficulty, player_status = resolve_quiz_context(request, raw_topic)
+        pool = QuizPool()
+        pooled, remaining = pool.pop(raw_topic, difficulty)
+
+        return sse_response(self._events(raw_topic, difficulty, player_status, pool, pooled, remaining))
+
+    def _events(self, raw_topic, difficulty, player_status, pool, pooled, remaining):
+        yield sse_event("status", player_status)
+
+        # Quiz do pool sai inteiro na hora; senão, pergunta a pergunta do Gemini
+        if pooled is not None:
+            questions = pooled["questions"]
+        else:
+            questions = self._live_or_stale(raw_topic, difficulty, pool)
+
+        sent = []
+        for question in questions:
+            if "error" in question:
+                yield sse_event("error", question)
+                return
+            sent.append(question)
+            yield sse_event("question", question)
+
+        if remaining < pool.low_water:
+            schedule_refill(raw_topic, difficulty, pool=pool)
+
+        session_id = open_session(self.request.user.id, player_status['topic'], sent)
+        yield sse_event("done", {"total": len(sent), "session_id": session_id})
+
+    def _live_or_stale(self, raw_topic, difficulty, pool):
+        """Perguntas do Gemini; com o circuito aberto, repete o último quiz do tópico"""
+        for question in ArenaService().stream_quiz(topic=raw_topic, difficulty=difficulty):
+            if "retry_after" in question:
+                stale = pool.stale(raw_topic, difficulty)
+                if stale is not None:
+                    logger.warning("🧊 Gemini indisponível, servindo quiz repetido")
+                    yield from stale["questions"]
+                    return
+            yield question
+
+
+class QuizJobStatusView(APIView):
+    """Status/resultado de um job assíncrono de quiz (aceita long-poll curto via ?wait=<segundos>)"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            wait = min(float(request.query_params.get('wait', 0)), settings.ARENA_QUIZ_JOBS["MAX_WAIT_SECONDS"])
+        except ValueError:
+            wait = 0
+
+        try:
+            store = QuizJobStore()
+            job = store.wait(job_id, wait) if wait > 0 else store.get(job_id)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"⚠️ Status do job indisponível (Redis fora do ar): {e}")
+            return Response(
+                {"error": "Status do quiz indisponível no momento. Tente novamente."},
+                status=503, headers={"Retry-After": "5"},
+            )
+
+        # Jobs de outros usuários são tratados como inexistentes
+        if not job or job.get("user_id") != request.user.id:
+            return Response({"error": "Job não encontrado ou expirado."}, status=404)
+
+        job.pop("user_id")
+        return Response({"job_id": job_id, **job})
+
+
 class SubmitScoreView(APIView):
     """Salva XP e Progresso no Tópico"""
     permission_classes = [IsAuthenticated]
@@ -100,38 +239,7 @@ class SubmitScoreView(APIView):
             
             logger.info(f"💾 [SubmitScore] User={request.user.email}, Topic={topic}, XP={xp}, Passed={passed}")
 
-            # 1. Atualiza XP Global
-            profile, _ = PlayerProfile.objects.get_or_create(user=request.user)
-            old_xp = profile.xp
-            profile.add_xp(xp)
-            logger.info(f"📊 XP atualizado: {old_xp} → {profile.xp}")
-
-            # 2. Atualiza Progresso do Tópico (Se passou)
-            mastery_info = {}
-            if passed:
-                mastery, _ = TopicMastery.objects.get_or_create(
-                    user=request.user, 
-                    topic=topic
-                )
-                old_level = mastery.level
-                upgraded, reason = mastery.level_up()
-                
-                mastery_info = {
-                    'new_level': mastery.level,
-                    'new_tier': mastery.tier,
-                    'tier_display': mastery.get_tier_display(),
-                    'event': reason,  # "Level Up" ou "Tier Up: gold"
-                    'level_changed': mastery.level > old_level
-                }
-                
-                if upgraded:
-                    logger.info(f"🎉 {reason}: Level {old_level} → {mastery.level}")
-
-            return Response({
-                "success": True,
-                "global_xp": profile.xp,
-                "mastery_update": mastery_info
-            })
+            return Response(apply_game_result(request.user, topic, xp, passed))
             
         except Exception as e:
             logger.exception(f"❌ Erro ao salvar score: {str(e)}")
@@ -140,6 +248,78 @@ class SubmitScoreView(APIView):
             }, status=500)
 
 
+class SubmitAnswersView(APIView):
+    """
+    Recebe todas as respostas da partida de uma vez e corrige no servidor.
+    Partida inteira = 2 requisições (battle/start + battle/answers).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BatchAnswerSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        try:
+            session = QuizSessionStore().pop(serializer.validated_data['session_id'])
+        except redis.RedisError as e:
+            logger.error(f"❌ Redis indisponível ao corrigir partida: {e}")
+            return Response({"error": "Correção indisponível no momento. Tente novamente."}, status=503)
+
+        # Sessões de outros usuários são tratadas como inexistentes
+        if not session or session["user_id"] != request.user.id:
+            return Response({"error": "Sessão não encontrada, expirada ou já corrigida."}, status=404)
+
+        results = ArenaService().grade_answers(session["answer_key"], serializer.validated_data['answers'])
+        correct = sum(1 for r in results if r["is_correct"])
+        xp = correct * settings.ARENA_QUIZ_SESSIONS["XP_PER_CORRECT"]
+
+        logger.info(f"💾 [SubmitAnswers] User={request.user.email}, Topic={session['topic']}, Acertos={correct}/{len(results)}")
+
+        return Response({
+            **apply_game_result(request.user, session["topic"], xp, passed=correct > 0),
+            "results": results,
+            "correct": correct,
+            "total": len(results),
+            "xp_gained": xp,
+        })
+
+
+def apply_game_result(user, topic, xp, passed):
+    """Aplica XP global e progresso no tópico numa única transação"""
+    with transaction.atomic():
+        # 1. Atualiza XP Global
+        profile, _ = PlayerProfile.objects.get_or_create(user=user)
+        old_xp = profile.xp
+        profile.add_xp(xp)
+        logger.info(f"📊 XP atualizado: {old_xp} → {profile.xp}")
+
+        # 2. Atualiza Progresso do Tópico (Se passou)
+        mastery_info = {}
+        if passed:
+            mastery, _ = TopicMastery.objects.get_or_create(user=user, topic=topic)
+            mastery = TopicMastery.objects.select_for_update().get(pk=mastery.pk)
+            old_level = mastery.level
+            upgraded, reason = mastery.level_up()
+
+            mastery_info = {
+                'new_level': mastery.level,
+                'new_tier': mastery.tier,
+                'tier_display': mastery.get_tier_display(),
+                'event': reason,  # "Level Up" ou "Tier Up: gold"
+                'level_changed': mastery.level > old_level
+            }
+
+            if upgraded:
+                logger.info(f"🎉 {reason}: Level {old_level} → {mastery.level}")
+
+    return {
+        "success": True,
+        "global_xp": profile.xp,
+        "mastery_update": mastery_info
+    }
+
+
 class MyMasteryListView(generics.ListAPIView):
     """Lista todos os tópicos que o usuário já jogou"""
     permission_classes = [IsAuthenticated]
@@ -151,10 +331,93 @@ class MyMasteryListView(generics.ListAPIView):
         ).order_by('-level', 'topic')
 
 
-class LeaderboardView(generics.ListAPIView):
-    """Top 10 jogadores globais por XP"""
+def _int_param(request, name, default, low, high):
+    try:
+        return min(max(int(request.query_params.get(name, default)), low), high)
+    except ValueError:
+        return default
+
+
+def _leaderboard_rows(entries, start_rank):
+    """Converte [(user_id, xp)] do ZSET no formato do ranking (nomes em uma única query)"""
+    names = dict(User.objects.filter(id__in=[user_id for user_id, _ in entries]).values_list('id', 'name'))
+    return [
+        {
+            'rank': start_rank + i,
+            'user': {'name': names.get(user_id, '')},
+            'xp': xp,
+            'level': level_for_xp(xp),
+        }
+        for i, (user_id, xp) in enumerate(entries)
+    ]
+
+
+def _ranked_profiles():
+    """(user_id, xp) na ordem do ranking, para quando o Redis está fora do ar"""
+    return PlayerProfile.objects.order_by('-xp', '-user_id').values_list('user_id', 'xp')
+
+
+class LeaderboardView(APIView):
+    """Top N jogadores globais por XP (?limit=10, máx. 100) servidos do ZSET no Redis"""
     permission_classes = [IsAuthenticated]
-    serializer_class = LeaderboardSerializer
-    
-    def get_queryset(self):
-        return PlayerProfile.objects.select_related('user').order_by('-xp')[:10]
\ No newline at end of file
+
+    def get(self, request):
+        limit = _int_param(request, 'limit', 10, 1, 100)
+        try:
+            board = Leaderboard()
+            ensure_ready(board)  # Primeiro acesso após deploy/flush do Redis
+            return Response({
+                "count": board.total(),
+                "results": _leaderboard_rows(board.top(limit), start_rank=1),
+            })
+        except redis.exceptions.RedisError as e:
+            # Redis fora do ar: volta para a consulta direta no Postgres
+            logger.warning(f"⚠️ Leaderboard via Postgres (Redis indisponível): {e}")
+            return Response({
+                "count": PlayerProfile.objects.count(),
+                "results": _leaderboard_rows(list(_ranked_profiles()[:limit]), start_rank=1),
+            })
+
+
+class MyRankView(APIView):
+    """Posição exata do usuário no ranking + janela de jogadores ao redor (?radius=5, máx. 25)"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        radius = _int_param(request, 'radius', 5, 0, 25)
+        try:
+            board = Leaderboard()
+            ensure_ready(board)
+
+            # Com o ranking completo, quem não está nele ainda não pontuou: todo XP dele chega por ZINCRBY
+            # (um ZADD com o XP do banco somaria duas vezes um incremento ainda na fila do on_commit)
+            if board.rank(request.user.id) is None:
+                PlayerProfile.objects.get_or_create(user=request.user)
+                board.add_player(request.user.id)
+
+            start, entries = board.around(request.user.id, radius)
+            rank, count = board.rank(request.user.id), board.total()
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"⚠️ Posição no ranking via Postgres (Redis indisponível): {e}")
+            rank, start, entries = self._from_db(request.user, radius)
+            count = PlayerProfile.objects.count()
+
+        me = next(xp for user_id, xp in entries if user_id == request.user.id)
+        return Response({
+            "rank": rank,
+            "count": count,
+            "xp": me,
+            "level": level_for_xp(me),
+            "around": _leaderboard_rows(entries, start_rank=start),
+        })
+
+    @staticmethod
+    def _from_db(user, radius):
+        """Mesmo cálculo do ZSET direto na tabela: (rank, posição do primeiro da janela, [(user_id, xp)])"""
+        me, _ = PlayerProfile.objects.get_or_create(user=user)
+        rank = PlayerProfile.objects.filter(
+            Q(xp__gt=me.xp) | Q(xp=me.xp, user_id__gt=me.user_id)
+        ).count() + 1
+        start = max(rank - radius, 1)
+        entries = list(_ranked_profiles()[start - 1:rank + radius])
+        return rank, start, entries
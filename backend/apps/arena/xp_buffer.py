@@ -0,0 +1,186 @@
+import uuid
+import logging
+from contextlib import contextmanager
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from django_redis import get_redis_connection
+from .leaderboard import Leaderboard
+from .models import PlayerProfile, XPFlush, level_expression
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 500
+FLUSH_LOCK_SECONDS = 60
+MAX_LEFTOVER_BATCHES = 50       # Sobras recuperadas por flush (o resto fica para os próximos)
+LEDGER_RETENTION = timedelta(days=1)
+
+# Move os buffers atuais para chaves de flush de uma vez (novos incrementos vão para hashes novos)
+SWAP_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('exists', key) == 1 then
+        redis.call('rename', key, key .. ':flushing:' .. ARGV[1])
+    end
+end
+return 1
+"""
+
+# Lê os hashes do buffer de uma vez; com ARGV[1] = 1, KEYS[1] é a fase do rebuild do leaderboard,
+# que passa para 'journal' atomicamente com a leitura (incrementos seguintes vão para o journal)
+READ_SCRIPT = """
+local first = 1
+if ARGV[1] == '1' then
+    redis.call('set', KEYS[1], 'journal', 'XX')
+    first = 2
+end
+local result = {}
+for i = first, #KEYS do
+    table.insert(result, redis.call('hgetall', KEYS[i]))
+end
+return result
+"""
+
+# Libera a trava apenas se ela ainda pertence a este flush (compare-and-delete atômico)
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class XPBuffer:
+    """
+    Acumula incrementos de XP no Redis para rajadas de pontuação.
+
+    - arena:xpbuffer:xp       -> HASH user_id -> XP pendente
+    - arena:xpbuffer:quizzes  -> HASH user_id -> partidas pendentes
+
+    O ranking (ZSET) é atualizado na hora; o Postgres recebe os totais em lote
+    pela task flush_xp_buffer.
+    """
+    XP_KEY = "arena:xpbuffer:xp"
+    QUIZZES_KEY = "arena:xpbuffer:quizzes"
+    LOCK_KEY = "arena:xpbuffer:flush_lock"
+
+    def __init__(self, connection=None):
+        self.redis = connection or get_redis_connection("default")
+
+    def add(self, user_id, amount) -> int:
+        """Registra o incremento e retorna o XP ainda pendente de gravação para o usuário"""
+        pipe = self.redis.pipeline()
+        pipe.hincrby(self.XP_KEY, user_id, amount)
+        pipe.hincrby(self.QUIZZES_KEY, user_id, 1)
+        Leaderboard(self.redis).increment(user_id, amount, pipe=pipe, source="buffer")
+        pending_xp, _, _ = pipe.execute()
+        return pending_xp
+
+    def pending(self, phase_key=None) -> dict:
+        """
+        {user_id: XP} ainda não gravado no Postgres: buffer atual + lotes de flush não aplicados.
+        Deve ser chamado com a trava do flush (flush_lock): as chaves não mudam de nome no meio da leitura.
+        `phase_key` (rebuild do leaderboard) passa para a fase 'journal' na mesma operação atômica da leitura.
+        """
+        keys = [key.decode() for key in self.redis.scan_iter(match=f"{self.XP_KEY}:flushing:*", count=100)]
+        keys.append(self.XP_KEY)
+        phase = [phase_key] if phase_key else []
+        hashes = self.redis.eval(READ_SCRIPT, len(phase) + len(keys), *phase, *keys, len(phase))
+        applied = set(XPFlush.objects.filter(
+            flush_id__in=[key.rsplit(":", 1)[1] for key in keys]
+        ).values_list("flush_id", flat=True))
+
+        totals = {}
+        for key, values in zip(keys, hashes):
+            if key.rsplit(":", 1)[1] in applied:
+                continue  # Já somado no banco, só falta a limpeza no Redis
+            for user_id, value in zip(values[::2], values[1::2]):
+                totals[int(user_id)] = totals.get(int(user_id), 0) + int(value)
+        return totals
+
+    @contextmanager
+    def flush_lock(self, seconds=FLUSH_LOCK_SECONDS):
+        """Trava com token do flush; rende True se foi obtida (liberada só por quem a tem)"""
+        token = uuid.uuid4().hex
+        acquired = bool(self.redis.set(self.LOCK_KEY, token, nx=True, ex=seconds))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.redis.eval(RELEASE_SCRIPT, 1, self.LOCK_KEY, token)
+
+    def flush(self) -> int:
+        """
+        Grava os incrementos pendentes no Postgres. Retorna quantos perfis foram atualizados.
+
+        Um flush por vez (trava com token); cada lote é identificado pelo flush_id do rename e
+        registrado em XPFlush na mesma transação do UPDATE, então um lote nunca é somado duas vezes.
+        """
+        with self.flush_lock() as acquired:
+            if not acquired:
+                return 0  # Outro worker já está gravando (ou o leaderboard está sendo reconstruído)
+            return self._flush()
+
+    def _flush(self) -> int:
+        flush_id = uuid.uuid4().hex
+        self.redis.eval(SWAP_SCRIPT, 2, self.XP_KEY, self.QUIZZES_KEY, flush_id)
+
+        # Lote deste flush + sobras de flushes anteriores que caíram no meio do caminho (SCAN, não KEYS)
+        batches = {flush_id: []}
+        for prefix in (self.XP_KEY, self.QUIZZES_KEY):
+            for key in self.redis.scan_iter(match=f"{prefix}:flushing:*", count=100):
+                key = key.decode()
+                batch_id = key.rsplit(":", 1)[1]
+                if batch_id in batches or len(batches) <= MAX_LEFTOVER_BATCHES:
+                    batches.setdefault(batch_id, []).append(key)
+        batches = {batch_id: keys for batch_id, keys in batches.items() if keys}
+        if not batches:
+            return 0
+
+        # Lotes já gravados cuja limpeza no Redis falhou: só apaga as chaves
+        applied = set(XPFlush.objects.filter(flush_id__in=batches).values_list("flush_id", flat=True))
+        keys = [key for batch_keys in batches.values() for key in batch_keys]
+        pending = {batch_id: batch_keys for batch_id, batch_keys in batches.items() if batch_id not in applied}
+        if applied:
+            logger.warning(f"⚠️ {len(applied)} lote(s) de XP já gravados descartados do Redis")
+
+        increments = {}
+        for batch_keys in pending.values():
+            for key in batch_keys:
+                field = "xp" if key.startswith(f"{self.XP_KEY}:") else "quizzes"
+                for user_id, value in self.redis.hgetall(key).items():
+                    entry = increments.setdefault(int(user_id), {"xp": 0, "quizzes": 0})
+                    entry[field] += int(value)
+
+        try:
+            with transaction.atomic():
+                # Chave primária: um flush concorrente com o mesmo lote falha aqui e não soma nada
+                XPFlush.objects.bulk_create([XPFlush(flush_id=batch_id) for batch_id in pending])
+                user_ids = list(increments)
+                for start in range(0, len(user_ids), FLUSH_BATCH_SIZE):
+                    self._apply_batch({uid: increments[uid] for uid in user_ids[start:start + FLUSH_BATCH_SIZE]})
+                XPFlush.objects.filter(applied_at__lt=timezone.now() - LEDGER_RETENTION).delete()
+                transaction.on_commit(lambda: self.redis.delete(*keys))
+        except IntegrityError:
+            logger.warning("⚠️ Lote de XP gravado por outro flush; nada foi somado")
+            return 0
+
+        logger.info(f"💾 Buffer de XP gravado: {len(increments)} perfis")
+        return len(increments)
+
+    @staticmethod
+    def _apply_batch(batch):
+        """Um único UPDATE por lote com CASE por usuário (sem ler os valores atuais)"""
+        def delta(field):
+            return Case(
+                *[When(user_id=uid, then=Value(values[field])) for uid, values in batch.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+
+        new_xp = F('xp') + delta("xp")
+        PlayerProfile.objects.filter(user_id__in=batch.keys()).update(
+            xp=new_xp,
+            quizzes_played=F('quizzes_played') + delta("quizzes"),
+            level=level_expression(new_xp),
+        )
@@ -1,4 +1,5 @@
 # backend/apps/journey/curriculum.py
+from typing import NamedTuple
 
 SAGA_DATA = [
     {
@@ -75,17 +76,58 @@ SAGA_DATA = [
     }
 ]
 
+def iter_levels():
+    """Percorre todas as fases do currículo: (level_dict, world_dict, is_boss), bosses depois dos níveis do mundo"""
+    for world in SAGA_DATA:
+        for level in world['levels']:
+            yield level, world, False
+        yield world['boss'], world, True
+
+def quiz_prompt(level_data, world_data, is_boss):
+    """
+    Tópico enviado à Arena para gerar o quiz da fase (o contexto do Prompt para a IA).
+    Retorna: (prompt_topic, difficulty)
+    """
+    role_title = world_data.get('role', 'Dev').upper()
+
+    if is_boss:
+        prompt_topic = (
+            f"Você é o BOSS FINAL do nível {role_title}. "
+            f"O desafio é sobre: {level_data['topic']}. "
+            f"Crie perguntas difíceis baseadas em cenários de falha real."
+        )
+        return prompt_topic, "hard"
+
+    prompt_topic = (
+        f"Treinamento para se tornar {role_title}. "
+        f"Tópico da aula: {level_data['topic']}."
+    )
+    return prompt_topic, "medium"
+
+class LevelEntry(NamedTuple):
+    level: dict
+    world: dict
+    is_boss: bool
+    ordinal: int  # Posição da fase na trilha inteira (0 = primeira fase do primeiro mundo)
+
+# Índice montado no import: id da fase -> LevelEntry (SAGA_DATA é estático)
+LEVEL_INDEX = {
+    level['id']: LevelEntry(level, world, is_boss, ordinal)
+    for ordinal, (level, world, is_boss) in enumerate(iter_levels())
+}
+
 def get_level_data(level_id):
     """
-    Helper para encontrar os dados de um nível ou boss pelo ID.
+    Helper para encontrar os dados de um nível ou boss pelo ID (consulta O(1) no LEVEL_INDEX).
     Retorna: (level_dict, world_dict, is_boss_boolean)
     """
-    for world in SAGA_DATA:
-        # Verifica Níveis Normais
-        for level in world['levels']:
-            if level['id'] == level_id:
-                return level, world, False
-        # Verifica Boss
-        if world['boss']['id'] == level_id:
-            return world['boss'], world, True
-    return None, None, None
\ No newline at end of file
+    entry = LEVEL_INDEX.get(level_id) if isinstance(level_id, str) else None
+    if entry is None:
+        return None, None, None
+    return entry.level, entry.world, entry.is_boss
+
+# Prompts das fases: texto do próprio servidor, aceito pela validação de tópicos da Arena
+CURRICULUM_QUIZ_PROMPTS = frozenset(quiz_prompt(*entry)[0] for entry in iter_levels())
+
+def is_curriculum_prompt(topic):
+    return topic in CURRICULUM_QUIZ_PROMPTS
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.journey.warmup import CurriculumWarmer
+
+
+class Command(BaseCommand):
+    help = (
+        "Pré-gera as análises do AI Tutor (todas as depths) e o estoque de quizzes de todas as fases da Jornada. "
+        "Pula o que já está no cache: rodar de novo retoma uma execução interrompida."
+    )
+
+    def add_arguments(self, parser):
+        config = settings.CURRICULUM_WARMUP
+        parser.add_argument('--concurrency', type=int, default=config["CONCURRENCY"])
+        parser.add_argument(
+            '--rpm', type=int, default=config["REQUESTS_PER_MINUTE"],
+            help="Chamadas ao Gemini por minuto (0 = sem limite)"
+        )
+        parser.add_argument('--depths', nargs='+', choices=config["DEPTHS"], default=config["DEPTHS"])
+        parser.add_argument('--skip-analyses', action='store_true')
+        parser.add_argument('--skip-quizzes', action='store_true')
+        parser.add_argument('--dry-run', action='store_true', help="Só lista o que falta gerar")
+
+    def handle(self, *args, **options):
+        warmer = CurriculumWarmer(
+            concurrency=options['concurrency'], per_minute=options['rpm'], depths=options['depths'],
+            analyses=not options['skip_analyses'], quizzes=not options['skip_quizzes'], progress=self._progress,
+        )
+
+        if options['dry_run']:
+            units = warmer.plan()
+            for unit in units:
+                self.stdout.write(f"{unit.level_id:<8} {unit.kind:<9} {unit.depth:<16} {unit.calls:>3} chamada(s)")
+            calls = sum(unit.calls for unit in units)
+            minutes = calls / options['rpm'] if options['rpm'] > 0 else 0
+            self.stdout.write(f"Pendentes: {calls} chamadas ao Gemini (~{minutes:.1f} min no ritmo de --rpm)")
+            return
+
+        report = warmer.run()
+        style = self.style.WARNING if report.interrupted else self.style.SUCCESS
+        self.stdout.write(style(f"Warm-up do currículo: {report.summary()}"))
+
+    def _progress(self, unit, status, done, total):
+        self.stdout.write(f"[{done}/{total}] {unit.level_id} {unit.kind} {unit.depth}: {status}")
@@ -0,0 +1,67 @@
+import re
+import json
+import gzip
+import zlib
+import hashlib
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from .curriculum import SAGA_DATA
+
+_ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class PrecompiledMap:
+    """
+    Payload do mapa da Jornada com o currículo (estático) serializado e comprimido uma vez por processo.
+
+    - curriculum_response: só o currículo, gzip pronto e ETag pelo hash do conteúdo.
+    - map_response: {"worlds", "progress"} no formato de sempre; por request só o bloco de progresso
+      do usuário é serializado e comprimido, continuando o gzip do currículo a partir de uma cópia
+      do compressor (zlib.compressobj.copy) em vez de recomprimir tudo.
+    ETags fracas (a mesma para gzip e identidade); If-None-Match igual devolve 304 sem corpo.
+    """
+
+    def __init__(self, worlds):
+        worlds_json = _dumps(worlds)
+        self.version = hashlib.sha256(worlds_json).hexdigest()[:16]
+        self.curriculum_json = worlds_json
+        self.curriculum_gzip = gzip.compress(worlds_json, compresslevel=9, mtime=0)
+
+        self._prefix = b'{"worlds":' + worlds_json + b',"progress":'
+        self._compressor = zlib.compressobj(9, zlib.DEFLATED, 31)  # wbits 31 = cabeçalho/trailer gzip
+        self._gzip_prefix = self._compressor.compress(self._prefix) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def curriculum_response(self, request):
+        return self._respond(request, f'W/"{self.version}"', self.curriculum_json, lambda: self.curriculum_gzip)
+
+    def map_response(self, request, progress):
+        tail = _dumps(progress) + b"}"
+        etag = f'W/"{self.version}-{hashlib.sha1(tail).hexdigest()[:16]}"'
+
+        def compressed():
+            compressor = self._compressor.copy()
+            return self._gzip_prefix + compressor.compress(tail) + compressor.flush()
+
+        return self._respond(request, etag, self._prefix + tail, compressed)
+
+    @staticmethod
+    def _respond(request, etag, body, compressed):
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        elif _ACCEPTS_GZIP.search(request.headers.get("Accept-Encoding", "")):
+            response = HttpResponse(compressed(), content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        response["Vary"] = "Accept-Encoding"
+        # Sempre revalida: o ETag transforma a revalidação num 304 barato
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+JOURNEY_MAP = PrecompiledMap(SAGA_DATA)
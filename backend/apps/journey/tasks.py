@@ -0,0 +1,12 @@
+import logging
+from celery import shared_task
+from .warmup import CurriculumWarmer
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def warm_curriculum():
+    """Task diária: gera as análises e os quizzes das fases que ainda não estão no cache"""
+    report = CurriculumWarmer().run()
+    logger.info(f"🔥 Warm-up do currículo: {report.summary()}")
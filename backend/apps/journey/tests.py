@@ -0,0 +1,154 @@
+import gzip
+import json
+from django.urls import reverse
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.test import APITestCase
+from unittest.mock import patch
+
+from apps.ai_tutor.cache import TopicCacheStore, clear_local_cache
+from apps.ai_tutor.services import ANALYSIS_PROMPT_VERSION
+from apps.arena.pool import QuizPool
+from apps.arena.services import ArenaService
+from apps.llm.topics import canonical_topic
+from .curriculum import LEVEL_INDEX, SAGA_DATA, get_level_data, iter_levels, quiz_prompt
+from .warmup import LOCK_KEY, CurriculumWarmer
+
+User = get_user_model()
+
+FAKE_QUIZ = {
+    "questions": [
+        {"id": 1, "text": "O que é um container?", "options": ["A", "B", "C", "D"], "correct_index": 0}
+    ]
+}
+
+
+def _clear_redis():
+    redis = get_redis_connection("default")
+    redis.delete(*redis.keys(f"{QuizPool.PREFIX}*"), LOCK_KEY)
+    cache.delete_pattern("ai_tutor:topic:*")
+    clear_local_cache()
+
+
+class CurriculumWarmupTest(APITestCase):
+    def setUp(self):
+        _clear_redis()
+        self.pool = QuizPool()
+        self.levels = list(iter_levels())
+
+    @patch('apps.journey.warmup.ArenaService.generate_quiz', side_effect=lambda **kwargs: dict(FAKE_QUIZ))
+    @patch('apps.journey.warmup.AIService.warm_analysis', return_value=("generated", {"definition": "ok"}))
+    def test_warms_every_level_and_resumes_where_it_stopped(self, mock_analysis, mock_quiz):
+        # Uma análise já no cache fica de fora do plano
+        first = self.levels[0][0]
+        TopicCacheStore(ANALYSIS_PROMPT_VERSION).set(canonical_topic(first['topic']), "initial", {"definition": "x"})
+
+        report = CurriculumWarmer(concurrency=4, per_minute=0).run()
+
+        analyses = len(self.levels) * 4 - 1
+        quizzes = len(self.levels) * self.pool.target_size
+        self.assertEqual(report.counts["analysis:generated"], analyses)
+        self.assertEqual(report.counts["quiz:generated"], quizzes)
+        self.assertEqual(mock_quiz.call_count, quizzes)
+        for level, world, is_boss in self.levels:
+            self.assertEqual(self.pool.size(*quiz_prompt(level, world, is_boss)), self.pool.target_size)
+
+        # Segunda execução: os estoques já estão cheios, nenhum quiz novo
+        mock_quiz.reset_mock()
+        CurriculumWarmer(concurrency=4, per_minute=0, analyses=False).run()
+        mock_quiz.assert_not_called()
+
+    @patch('apps.journey.warmup.ArenaService.generate_quiz',
+           return_value={"error": "Gemini indisponível", "questions": [], "retry_after": 30})
+    def test_stops_at_open_circuit_and_reports(self, mock_quiz):
+        report = CurriculumWarmer(concurrency=1, per_minute=0, analyses=False).run()
+
+        mock_quiz.assert_called_once()
+        self.assertEqual(report.interrupted, "Gemini indisponível")
+        self.assertEqual(report.counts["quiz:skipped"], len(self.levels) - 1)
+        self.assertFalse(get_redis_connection("default").exists(LOCK_KEY))
+
+    def test_refuses_concurrent_runs(self):
+        get_redis_connection("default").set(LOCK_KEY, 1)
+        report = CurriculumWarmer(per_minute=0).run()
+        self.assertEqual(report.interrupted, "outro warm-up em andamento")
+
+    def test_expired_run_does_not_release_the_next_runs_lock(self):
+        redis = get_redis_connection("default")
+
+        def lock_taken_over(*args, **kwargs):
+            redis.set(LOCK_KEY, "outra-execucao")  # A trava expirou e outra execução a pegou
+            return []
+
+        with patch.object(CurriculumWarmer, 'plan', side_effect=lock_taken_over):
+            CurriculumWarmer(per_minute=0).run()
+        self.assertEqual(redis.get(LOCK_KEY), b"outra-execucao")
+
+
+class StartLevelTest(APITestCase):
+    def setUp(self):
+        _clear_redis()
+        self.user = User.objects.create_user(email="journey@test.com", password="password123", name="Journey")
+        self.client.force_authenticate(user=self.user)
+
+    def test_curriculum_prompts_pass_topic_validation(self):
+        for level, world, is_boss in iter_levels():
+            ArenaService().validate_topic(quiz_prompt(level, world, is_boss)[0])  # Não levanta
+
+    @patch('apps.journey.views.ArenaService.generate_quiz')
+    def test_level_quiz_served_from_warm_pool(self, mock_generate):
+        level_id = SAGA_DATA[0]['levels'][0]['id']
+        prompt_topic, difficulty = quiz_prompt(*get_level_data(level_id))
+        for _ in range(3):
+            QuizPool().push(prompt_topic, difficulty, FAKE_QUIZ)
+
+        response = self.client.post(reverse('journey_start'), {"level_id": level_id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['questions'], FAKE_QUIZ['questions'])
+        self.assertEqual(response.data['journey_meta']['level_id'], level_id)
+        mock_generate.assert_not_called()
+
+
+class JourneyMapTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="map@test.com", password="password123", name="Map")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('journey_map')
+
+    def test_level_index_matches_curriculum_order(self):
+        self.assertEqual([entry.level['id'] for entry in LEVEL_INDEX.values()], [l['id'] for l, _, _ in iter_levels()])
+        self.assertEqual(LEVEL_INDEX["boss_1"].ordinal, len(SAGA_DATA[0]['levels']))
+        self.assertEqual(get_level_data("boss_2")[1]['id'], "world_2")
+        self.assertEqual(get_level_data(["w1_l1"]), (None, None, None))
+
+    def test_map_payload_gzip_and_conditional_get(self):
+        plain = self.client.get(self.url)
+        packed = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertEqual(plain.status_code, status.HTTP_200_OK)
+        data = json.loads(plain.content)
+        self.assertEqual(data["worlds"], SAGA_DATA)
+        self.assertEqual(data["progress"]["completed_levels"], [])
+        self.assertEqual(packed["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(packed.content)), data)
+        self.assertEqual(packed["ETag"], plain["ETag"])
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=plain["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Progresso novo muda o ETag
+        self.client.post(reverse('journey_complete'), {"level_id": "w1_l1", "passed": True}, format='json')
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=plain["ETag"])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(changed.content)["progress"]["completed_levels"], ["w1_l1"])
+
+    def test_static_curriculum_is_served_precompressed(self):
+        url = reverse('journey_curriculum')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(json.loads(gzip.decompress(response.content)), SAGA_DATA)
+        revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
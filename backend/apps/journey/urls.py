@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import JourneyMapView, StartLevelView, CompleteLevelView
+from .views import JourneyMapView, CurriculumView, StartLevelView, CompleteLevelView
 
 urlpatterns = [
     path('map/', JourneyMapView.as_view(), name='journey_map'),
+    path('curriculum/', CurriculumView.as_view(), name='journey_curriculum'),
     path('start/', StartLevelView.as_view(), name='journey_start'),
     path('complete/', CompleteLevelView.as_view(), name='journey_complete'),
 ]
\ No newline at end of file
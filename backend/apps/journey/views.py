@@ -3,9 +3,14 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import UserJourney
 from .serializers import UserJourneySerializer
-from .curriculum import SAGA_DATA, get_level_data
+from .curriculum import get_level_data, quiz_prompt
+from .payload import JOURNEY_MAP
 from apps.arena.services import ArenaService
+from apps.arena.jobs import start_quiz_job, wants_async
 from apps.arena.models import PlayerProfile
+from apps.arena.pool import QuizPool
+from apps.arena.tasks import schedule_refill
+from apps.llm.breaker import unavailable_response
 
 class JourneyMapView(APIView):
     """
@@ -18,10 +23,15 @@ class JourneyMapView(APIView):
         # Usando o serializer para formatar os dados do progresso
         serializer = UserJourneySerializer(journey)
         
-        return Response({
-            "worlds": SAGA_DATA,
-            "progress": serializer.data
-        })
+        # O currículo já vem serializado e comprimido (payload.py): só o progresso é montado aqui
+        return JOURNEY_MAP.map_response(request, serializer.data)
+
+class CurriculumView(APIView):
+    """Só o currículo estático (gzip pronto + ETag), para clientes que guardam o mapa e buscam o progresso à parte"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return JOURNEY_MAP.curriculum_response(request)
 
 class StartLevelView(APIView):
     """
@@ -37,32 +47,37 @@ class StartLevelView(APIView):
             return Response({"error": "Nível não encontrado"}, status=404)
 
         # Configura o contexto do Prompt para a IA
-        role_title = world_data.get('role', 'Dev').upper()
-        
-        if is_boss:
-            prompt_topic = (
-                f"Você é o BOSS FINAL do nível {role_title}. "
-                f"O desafio é sobre: {level_data['topic']}. "
-                f"Crie perguntas difíceis baseadas em cenários de falha real."
-            )
-            difficulty = "hard"
-        else:
-            prompt_topic = (
-                f"Treinamento para se tornar {role_title}. "
-                f"Tópico da aula: {level_data['topic']}."
-            )
-            difficulty = "medium"
-
-        # Reutiliza o serviço da Arena para gerar o JSON das perguntas
-        service = ArenaService()
-        game_data = service.generate_quiz(topic=prompt_topic, difficulty=difficulty)
-        
-        # Injeta metadados da jornada para o Frontend saber o que fazer ao vencer
-        game_data['journey_meta'] = {
+        prompt_topic, difficulty = quiz_prompt(level_data, world_data, is_boss)
+
+        # Metadados da jornada para o Frontend saber o que fazer ao vencer
+        journey_meta = {
             'level_id': level_id,
             'is_boss': is_boss,
             'world_id': world_data['id']
         }
+
+        # Quiz pré-gerado (warm-up do currículo ou reabastecimento): sai na hora
+        pool = QuizPool()
+        game_data, remaining = pool.pop(prompt_topic, difficulty)
+
+        if game_data is None:
+            # Modo assíncrono (opt-in): a geração roda no Celery e o cliente consulta o job
+            if wants_async(request):
+                job = start_quiz_job(
+                    request, prompt_topic, difficulty, meta={'journey_meta': journey_meta}, refill_pool=True
+                )
+                if job:
+                    return Response(job, status=202)
+
+            # Reutiliza o serviço da Arena para gerar o JSON das perguntas
+            service = ArenaService()
+            game_data = service.generate_quiz(topic=prompt_topic, difficulty=difficulty)
+            if "retry_after" in game_data:
+                return unavailable_response(game_data)
+
+        if game_data.get('questions') and remaining < pool.low_water:
+            schedule_refill(prompt_topic, difficulty, pool=pool)
+        game_data['journey_meta'] = journey_meta
         
         return Response(game_data)
 
@@ -0,0 +1,209 @@
+import time
+import uuid
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from django.conf import settings
+from django.db import connection
+from django_redis import get_redis_connection
+from apps.ai_tutor.cache import freshness
+from apps.ai_tutor.services import AIService
+from apps.arena.pool import QuizPool
+from apps.arena.services import ArenaService
+from apps.llm import gateway
+from apps.llm.singleflight import RELEASE_SCRIPT
+from apps.llm.topics import canonical_topic
+from .curriculum import iter_levels, quiz_prompt
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "journey:warmup:lock"
+
+
+class RateLimiter:
+    """Espaça as chamadas entre as threads: no máximo `per_minute` por minuto (0 = sem limite)"""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+@dataclass
+class WarmupUnit:
+    """Uma análise (topic, depth) ou o estoque de quizzes de uma fase (topic=prompt, depth=dificuldade)"""
+    kind: str
+    level_id: str
+    topic: str
+    depth: str
+    calls: int
+
+
+@dataclass
+class WarmupReport:
+    counts: Counter = field(default_factory=Counter)
+    usage: dict = field(default_factory=dict)
+    elapsed: float = 0.0
+    interrupted: str = ""
+
+    @property
+    def cost_usd(self) -> float:
+        config = settings.CURRICULUM_WARMUP
+        return (
+            self.usage.get("prompt_tokens", 0) * config["INPUT_USD_PER_MILLION"]
+            + self.usage.get("output_tokens", 0) * config["OUTPUT_USD_PER_MILLION"]
+        ) / 1_000_000
+
+    def summary(self) -> str:
+        counts = ", ".join(f"{key}={value}" for key, value in sorted(self.counts.items())) or "nada a fazer"
+        text = (
+            f"{counts} | {self.usage.get('calls', 0)} chamadas, {self.usage.get('prompt_tokens', 0)} tokens de entrada, "
+            f"{self.usage.get('output_tokens', 0)} de saída, ~US$ {self.cost_usd:.4f} em {self.elapsed:.1f}s"
+        )
+        return f"{text} | interrompido: {self.interrupted}" if self.interrupted else text
+
+
+class CurriculumWarmer:
+    """
+    Pré-gera o conteúdo das fases da Jornada (conjunto finito e conhecido) para que o primeiro
+    aluno não pague a chamada fria ao Gemini:
+    - análises do AI Tutor (TopicCache) do tópico de cada nível e boss, em todas as depths;
+    - estoque de quizzes de cada fase no QuizPool (até o TARGET_SIZE do pool).
+
+    Concorrência limitada (ThreadPoolExecutor) e ritmo abaixo da cota do Gemini (RateLimiter).
+    Retomável: o que já está no cache é pulado, então uma execução interrompida continua de onde parou.
+    O primeiro CircuitOpen (Gemini fora do ar) encerra a execução; o resto fica para a próxima.
+    """
+
+    def __init__(self, concurrency=None, per_minute=None, depths=None, analyses=True, quizzes=True, progress=None):
+        config = settings.CURRICULUM_WARMUP
+        self.concurrency = max(concurrency or config["CONCURRENCY"], 1)
+        self.limiter = RateLimiter(config["REQUESTS_PER_MINUTE"] if per_minute is None else per_minute)
+        self.depths = depths or config["DEPTHS"]
+        self.analyses = analyses
+        self.quizzes = quizzes
+        self.progress = progress or (lambda unit, status, done, total: None)
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._interrupted = ""
+
+    def plan(self) -> list:
+        """Unidades com chamadas pendentes (o que já está no cache fica de fora)"""
+        units = []
+        store = AIService().cache
+        pool = QuizPool()
+        for level, world, is_boss in iter_levels():
+            if self.analyses:
+                clean_topic = canonical_topic(level['topic'])
+                for depth in self.depths:
+                    entry = store.get(clean_topic, depth)
+                    if entry is None or freshness(entry, depth) == "expired":
+                        units.append(WarmupUnit("analysis", level['id'], level['topic'], depth, 1))
+            if self.quizzes:
+                prompt_topic, difficulty = quiz_prompt(level, world, is_boss)
+                missing = pool.missing(prompt_topic, difficulty)
+                if missing:
+                    units.append(WarmupUnit("quiz", level['id'], prompt_topic, difficulty, missing))
+        return units
+
+    def run(self) -> WarmupReport:
+        report = WarmupReport()
+        redis = get_redis_connection("default")
+        token = uuid.uuid4().hex
+        if not redis.set(LOCK_KEY, token, nx=True, ex=settings.CURRICULUM_WARMUP["LOCK_SECONDS"]):
+            report.interrupted = "outro warm-up em andamento"
+            return report
+
+        started, usage_before = time.monotonic(), gateway.usage()
+        try:
+            units = self.plan()
+            done = Counter()
+
+            def work(unit):
+                try:
+                    status = self._warm(unit)
+                except Exception as e:
+                    logger.exception(f"❌ Warm-up falhou em {unit.level_id}/{unit.kind}: {e}")
+                    status = "failed"
+                    self._count(unit.kind, status)
+                finally:
+                    connection.close()  # Cada thread abre a própria conexão com o banco
+                with self._lock:
+                    done["units"] += 1
+                    position = done["units"]
+                self.progress(unit, status, position, len(units))
+
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warmup") as executor:
+                list(executor.map(work, units))
+        finally:
+            # Só libera a trava se ainda for dela: uma execução que passou do LOCK_SECONDS não derruba a seguinte
+            redis.eval(RELEASE_SCRIPT, 1, LOCK_KEY, token)
+
+        usage_after = gateway.usage()
+        report.counts = self._counts
+        report.usage = {key: usage_after[key] - usage_before[key] for key in usage_after}
+        report.elapsed = time.monotonic() - started
+        report.interrupted = self._interrupted
+        return report
+
+    def _warm(self, unit) -> str:
+        if self._stop.is_set():
+            self._count(unit.kind, "skipped")
+            return "skipped"
+        if unit.kind == "analysis":
+            return self._warm_analysis(unit)
+        return self._warm_quizzes(unit)
+
+    def _warm_analysis(self, unit) -> str:
+        self.limiter.acquire()
+        status, data = AIService().warm_analysis(unit.topic, unit.depth)
+        if "retry_after" in data:
+            self._halt(data["error"])
+        self._count("analysis", status)
+        return status
+
+    def _warm_quizzes(self, unit) -> str:
+        """Quizzes da mesma fase em sequência: o single-flight juntaria pedidos simultâneos num quiz só"""
+        pool = QuizPool()
+        if not pool.claim_refill(unit.topic, unit.depth):
+            self._count("quiz", "skipped")
+            return "skipped"  # Reabastecimento do pool já em andamento
+        try:
+            pool.register(unit.topic, unit.depth)
+            service = ArenaService()
+            for _ in range(pool.missing(unit.topic, unit.depth)):
+                if self._stop.is_set():
+                    return "skipped"
+                self.limiter.acquire()
+                quiz = service.generate_quiz(topic=unit.topic, difficulty=unit.depth)
+                if not quiz.get("questions"):
+                    if "retry_after" in quiz:
+                        self._halt(quiz["error"])
+                    self._count("quiz", "failed")
+                    return "failed"
+                pool.push(unit.topic, unit.depth, quiz)
+                self._count("quiz", "generated")
+            return "generated"
+        finally:
+            pool.release_refill(unit.topic, unit.depth)
+
+    def _count(self, kind, status):
+        with self._lock:
+            self._counts[f"{kind}:{status}"] += 1
+
+    def _halt(self, reason):
+        if not self._stop.is_set():
+            logger.warning(f"🔴 Warm-up interrompido: {reason}")
+            self._interrupted = reason
+            self._stop.set()
@@ -0,0 +1,160 @@
+import math
+import time
+import logging
+import redis
+from django.conf import settings
+from django_redis import get_redis_connection
+from rest_framework.response import Response
+from .metrics import BREAKER_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Conta a chamada no balde atual do HASH da janela e remove os baldes que já saíram dela
+# (o HASH tem poucos campos: um par calls/failures por balde da janela)
+RECORD_SCRIPT = """
+redis.call('hincrby', KEYS[1], ARGV[1] .. ':calls', 1)
+if ARGV[2] == '1' then
+    redis.call('hincrby', KEYS[1], ARGV[1] .. ':failures', 1)
+end
+for _, field in ipairs(redis.call('hkeys', KEYS[1])) do
+    if tonumber(string.match(field, '^(%d+):')) < tonumber(ARGV[3]) then
+        redis.call('hdel', KEYS[1], field)
+    end
+end
+redis.call('expire', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+class CircuitOpen(Exception):
+    """O LLM está fora do ar (circuito aberto): falha na hora em vez de esperar o timeout"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(f"IA temporariamente indisponível. Tente novamente em {retry_after}s.")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker das chamadas ao LLM com estado no Redis (todos os workers enxergam o mesmo circuito).
+
+    - closed:    chamadas passam; sucessos/falhas/lentidões são contados em baldes de 10s
+                 (campos de um único HASH por circuito: o reset é um DEL só)
+    - open:      taxa de falha (erros + chamadas lentas) acima do limite -> rejeita por OPEN_SECONDS
+    - half-open: após o cooldown, uma única chamada de teste (probe) passa; sucesso fecha, falha reabre
+
+    Se o próprio Redis falhar, o breaker deixa a chamada passar (não derruba o LLM junto).
+    """
+    BUCKET_SECONDS = 10
+
+    def __init__(self, name="gemini", connection=None):
+        self.name = name
+        self.connection = connection
+        config = settings.LLM_BREAKER
+        self.enabled = config["ENABLED"]
+        self.failure_rate = config["FAILURE_RATE"]
+        self.min_calls = config["MIN_CALLS"]
+        self.slow_call_seconds = config["SLOW_CALL_SECONDS"]
+        self.window_seconds = config["WINDOW_SECONDS"]
+        self.open_seconds = config["OPEN_SECONDS"]
+        self.probe_timeout = config["PROBE_TIMEOUT"]
+
+        base = f"llm:breaker:{name}"
+        self.open_key = f"{base}:open"          # Existe enquanto o circuito está aberto (TTL = cooldown)
+        self.tripped_key = f"{base}:tripped"    # Circuito aberto ou em half-open (aguardando probe)
+        self.probe_key = f"{base}:probe"        # Trava da chamada de teste em half-open
+        self.window_key = f"{base}:window"      # HASH <balde>:calls / <balde>:failures
+
+    @property
+    def redis(self):
+        if self.connection is None:
+            self.connection = get_redis_connection("default")
+        return self.connection
+
+    def before_call(self) -> bool:
+        """
+        Autoriza a chamada ou levanta CircuitOpen.
+        Retorna True se esta chamada é o probe do half-open.
+        """
+        if not self.enabled:
+            return False
+        try:
+            remaining_ms = self.redis.pttl(self.open_key)
+            if remaining_ms > 0:
+                self._reject()
+                raise CircuitOpen(math.ceil(remaining_ms / 1000))
+
+            if not self.redis.exists(self.tripped_key):
+                return False
+
+            # Half-open: só um worker testa o Gemini, os demais continuam rejeitando
+            if self.redis.set(self.probe_key, 1, nx=True, ex=self.probe_timeout):
+                logger.info(f"🔌 Circuito '{self.name}' em half-open: enviando probe")
+                return True
+            self._reject()
+            raise CircuitOpen(1)
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Circuit breaker sem Redis, liberando chamada: {e}")
+            return False
+
+    def record(self, ok: bool, elapsed: float, probe: bool = False):
+        """Registra o resultado de uma chamada (erro ou lentidão contam como falha)"""
+        if not self.enabled:
+            return
+        failed = not ok or elapsed > self.slow_call_seconds
+        try:
+            if probe:
+                if failed:
+                    self._trip("probe falhou")
+                else:
+                    self._close()
+                return
+
+            buckets = self._window_buckets()
+            self.redis.eval(
+                RECORD_SCRIPT, 1, self.window_key, buckets[-1], int(failed), buckets[0],
+                self.window_seconds + self.BUCKET_SECONDS,
+            )
+
+            if failed:
+                calls, failures = self._window_totals()
+                if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                    self._trip(f"{failures}/{calls} falhas na janela")
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Circuit breaker sem Redis, resultado não registrado: {e}")
+
+    def _window_buckets(self):
+        now_bucket = int(time.time() // self.BUCKET_SECONDS)
+        return range(now_bucket - self.window_seconds // self.BUCKET_SECONDS + 1, now_bucket + 1)
+
+    def _window_totals(self):
+        fields = [f"{bucket}:{kind}" for bucket in self._window_buckets() for kind in ("calls", "failures")]
+        values = [int(value or 0) for value in self.redis.hmget(self.window_key, fields)]
+        return sum(values[0::2]), sum(values[1::2])
+
+    def _trip(self, reason):
+        pipe = self.redis.pipeline()
+        pipe.set(self.open_key, 1, ex=self.open_seconds)
+        pipe.set(self.tripped_key, 1, ex=self.open_seconds + self.probe_timeout * 10)
+        pipe.delete(self.probe_key)
+        pipe.execute()
+        BREAKER_EVENTS.labels(self.name, "opened").inc()
+        logger.error(f"🔴 Circuito '{self.name}' aberto por {self.open_seconds}s ({reason})")
+
+    def _close(self):
+        self.reset()
+        BREAKER_EVENTS.labels(self.name, "closed").inc()
+        logger.info(f"🟢 Circuito '{self.name}' fechado: Gemini respondeu ao probe")
+
+    def _reject(self):
+        BREAKER_EVENTS.labels(self.name, "rejected").inc()
+
+    def reset(self):
+        """Fecha o circuito e zera as janelas (uso: testes/admin)"""
+        self.redis.delete(self.open_key, self.tripped_key, self.probe_key, self.window_key)
+
+
+def unavailable_response(data: dict):
+    """503 com Retry-After para quando o LLM está indisponível e não há fallback"""
+    retry_after = data.get("retry_after", 30)
+    return Response(data, status=503, headers={"Retry-After": str(retry_after)})
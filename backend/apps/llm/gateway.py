@@ -0,0 +1,153 @@
+"""
+Gateway único para o Gemini, compartilhado por todos os serviços do processo.
+
+- O cliente é configurado UMA vez por worker (genai.configure descarta os
+  clientes/canais já abertos, então chamá-lo a cada request custava TLS/gRPC novo).
+- Os GenerativeModel são cacheados por (modelo, system_instruction, generation_config).
+- Toda chamada tem timeout explícito.
+- warm_up() é chamado no post_fork do gunicorn para abrir o canal antes da primeira request.
+- Circuit breaker compartilhado: com o Gemini fora do ar, generate() levanta
+  CircuitOpen na hora em vez de segurar o worker até o timeout.
+- usage() soma chamadas e tokens do processo (relatório de custo do warm-up).
+"""
+import os
+import json
+import time
+import logging
+import threading
+import google.generativeai as genai
+from django.conf import settings
+from .breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_MODELS = 64
+
+_lock = threading.Lock()
+_configured = False
+_models = {}
+_usage = {"calls": 0, "prompt_tokens": 0, "output_tokens": 0}
+
+
+class LLMNotConfigured(Exception):
+    pass
+
+
+def configure(api_key=None, transport=None, api_endpoint=None, force=False) -> bool:
+    """Configura o cliente Gemini do processo. Retorna False se não houver API KEY."""
+    global _configured
+    if _configured and not force:
+        return True
+
+    with _lock:
+        if _configured and not force:
+            return True
+
+        api_key = api_key or os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            logger.error("❌ GEMINI_API_KEY não encontrada")
+            return False
+
+        config = settings.LLM_GATEWAY
+        endpoint = api_endpoint or config["API_ENDPOINT"]
+        genai.configure(
+            api_key=api_key,
+            transport=transport or config["TRANSPORT"],
+            client_options={"api_endpoint": endpoint} if endpoint else None,
+        )
+        _models.clear()
+        _configured = True
+        logger.info(f"✅ Gemini API configurada (pid={os.getpid()})")
+        return True
+
+
+def clear_model_cache():
+    _models.clear()
+
+
+def usage() -> dict:
+    """Chamadas bem-sucedidas e tokens (entrada/saída) consumidos por este processo"""
+    with _lock:
+        return dict(_usage)
+
+
+def _record_usage(response):
+    metadata = getattr(response, "usage_metadata", None)
+    counts = {
+        "prompt_tokens": getattr(metadata, "prompt_token_count", 0),
+        "output_tokens": getattr(metadata, "candidates_token_count", 0),
+    }
+    with _lock:
+        _usage["calls"] += 1
+        for kind, count in counts.items():
+            if isinstance(count, int):
+                _usage[kind] += count
+
+
+def get_model(model_name=None, system_instruction=None, generation_config=None):
+    """Retorna um GenerativeModel reaproveitado para a mesma combinação de parâmetros"""
+    model_name = model_name or settings.LLM_GATEWAY["MODEL"]
+    key = (model_name, system_instruction, json.dumps(generation_config, sort_keys=True, default=str))
+
+    model = _models.get(key)
+    if model is None:
+        if len(_models) >= MAX_CACHED_MODELS:
+            _models.clear()
+        model = genai.GenerativeModel(
+            model_name,
+            system_instruction=system_instruction,
+            generation_config=generation_config,
+        )
+        _models[key] = model
+    return model
+
+
+def generate(prompt, *, model_name=None, system_instruction=None, generation_config=None,
+             timeout=None, stream=False):
+    """Executa generate_content com o modelo cacheado e timeout explícito"""
+    if not configure():
+        raise LLMNotConfigured("IA não configurada. Verifique a API KEY no servidor.")
+
+    breaker = CircuitBreaker()
+    probe = breaker.before_call()
+    model = get_model(model_name, system_instruction, generation_config)
+
+    started = time.monotonic()
+    try:
+        response = model.generate_content(
+            prompt,
+            stream=stream,
+            request_options={"timeout": timeout or settings.LLM_GATEWAY["TIMEOUT"]},
+        )
+    except Exception:
+        breaker.record(False, time.monotonic() - started, probe)
+        raise
+
+    if stream:
+        return _guarded_stream(response, breaker, started, probe)
+    breaker.record(True, time.monotonic() - started, probe)
+    _record_usage(response)
+    return response
+
+
+def _guarded_stream(response, breaker, started, probe):
+    """No streaming, o resultado só é conhecido ao fim da iteração"""
+    try:
+        for chunk in response:
+            yield chunk
+    except Exception:
+        breaker.record(False, time.monotonic() - started, probe)
+        raise
+    breaker.record(True, time.monotonic() - started, probe)
+    _record_usage(response)  # No streaming, o usage_metadata chega com o último pedaço
+
+
+def warm_up():
+    """Configura o cliente e abre o canal com o Gemini (uso: post_fork do gunicorn)"""
+    if not configure():
+        return
+    try:
+        genai.get_model(f"models/{settings.LLM_GATEWAY['MODEL']}", request_options={"timeout": 5})
+        logger.info(f"🔥 Canal com o Gemini aquecido (pid={os.getpid()})")
+    except Exception as e:
+        logger.warning(f"⚠️ Warm-up do Gemini falhou: {e}")
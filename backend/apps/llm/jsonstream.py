@@ -0,0 +1,177 @@
+import re
+import json
+from itertools import islice
+
+
+class JsonArrayStreamer:
+    """
+    Parser incremental para respostas JSON do LLM recebidas em pedaços (streaming).
+
+    Alimente com feed(chunk) e receba cada objeto do array principal assim que
+    ele fecha, sem esperar o resto da resposta. Funciona tanto para
+    {"questions": [{...}, {...}]} quanto para um array solto [{...}, {...}].
+    Texto fora do JSON (ex: cercas de markdown) é ignorado.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0            # Próximo caractere ainda não analisado
+        self.stack = []         # Containers abertos: '{' ou '['
+        self.in_string = False
+        self.escape = False
+        self.item_start = None  # Início do objeto-item atual no buffer
+
+    def feed(self, chunk: str):
+        """Consome um pedaço de texto e retorna a lista de itens completados por ele"""
+        self.buffer += chunk
+        items = []
+
+        for i in range(self.pos, len(self.buffer)):
+            char = self.buffer[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+
+            if char == '"':
+                self.in_string = bool(self.stack)
+            elif char in "{[":
+                if char == "{" and self._at_item_level():
+                    self.item_start = i
+                self.stack.append(char)
+            elif char in "}]" and self.stack:
+                self.stack.pop()
+                if char == "}" and self.item_start is not None and self._at_item_level():
+                    items.append(self._decode(self.buffer[self.item_start:i + 1]))
+                    self.item_start = None
+
+        self.pos = len(self.buffer)
+        return [item for item in items if item is not None]
+
+    def _at_item_level(self):
+        # Itens são objetos dentro do array da raiz: ['{', '['] ou ['[']
+        return self.stack in (["{", "["], ["["])
+
+    @staticmethod
+    def _decode(text):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+
+# Tokens relevantes para a recuperação: strings inteiras (com ou sem aspas de fechamento) e
+# estruturais. Escalares e espaços ficam entre tokens; cada token é um match do regex (em C).
+_TOKENS = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*(")?|[{}\[\]:,]')
+_ROOT = re.compile(r"[{\[]")
+_OBJECT_ROOT = re.compile(r"{")
+MAX_ROOTS = 8           # Raízes candidatas tentadas antes de desistir
+_CLOSERS = {"{": "}", "[": "]"}
+_decoder = json.JSONDecoder()
+
+
+def recover_json(text: str, expect=None):
+    """
+    Extrai o JSON principal de uma resposta do LLM.
+
+    - Ignora cercas de markdown e texto antes/depois do JSON.
+    - Remove vírgulas sobrando antes de '}' ou ']'.
+    - Resposta truncada: fecha os containers abertos e mantém apenas os
+      valores completos (o campo cortado no meio é descartado; perguntas
+      incompletas ficam para a validação do quiz).
+    - Prosa com colchetes antes do JSON ("Veja [1] abaixo: {...}"): uma raiz sem
+      nenhum objeto dentro é pulada e a próxima candidata é tentada.
+      Com expect=dict só objetos servem como raiz.
+
+    Levanta ValueError se não houver nada aproveitável.
+    """
+    roots = _OBJECT_ROOT if expect is dict else _ROOT
+    fallback, error = None, ValueError("Nenhum JSON encontrado na resposta")
+    for root in islice(roots.finditer(text), MAX_ROOTS):
+        try:
+            parsed = _recover_from(text, root.start())
+        except ValueError as e:
+            error = e
+            continue
+        if isinstance(parsed, dict) or (isinstance(parsed, list) and any(isinstance(i, dict) for i in parsed)):
+            return parsed
+        if fallback is None:
+            fallback = (parsed,)
+    if fallback is not None:
+        return fallback[0]  # Só havia containers sem objetos (ex: "[]"): devolve o primeiro, como antes
+    raise error
+
+
+def _recover_from(text, root):
+    """Recupera o JSON que começa em text[root] em uma única passada"""
+    # Caminho rápido (parser em C): JSON íntegro com prosa/cercas em volta
+    try:
+        return _decoder.raw_decode(text, root)[0]
+    except json.JSONDecodeError:
+        pass
+
+    stack = []
+    drop = []           # Posições de vírgulas sobrando
+    last_comma = None
+    after_colon = False
+    prev_end = root
+    cut = None          # (fim, containers abertos) do último valor completo
+
+    for token in _TOKENS.finditer(text, root):
+        start, end = token.span()
+        char = text[start]
+
+        if char == '"':
+            if token.group(1) is None:
+                break  # String truncada: o que veio antes é o que dá para salvar
+            if after_colon or stack[-1] == "[":
+                cut = (end, tuple(stack))
+            after_colon = False
+            last_comma = None
+        elif char == ":":
+            after_colon = True
+        elif char == ",":
+            # Escalar (número, true, null...) completo antes da vírgula também é ponto de corte
+            if start > prev_end and not text[prev_end:start].isspace():
+                cut = (start, tuple(stack))
+            last_comma = start
+            after_colon = False
+        elif char in "{[":
+            stack.append(char)
+            after_colon = False
+            last_comma = None
+        else:
+            if last_comma is not None and (start == last_comma + 1 or text[last_comma + 1:start].isspace()):
+                drop.append(last_comma)
+            after_colon = False
+            last_comma = None
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return _loads(text, root, end, drop, ())
+            cut = (end, tuple(stack))
+        prev_end = end
+
+    if cut is None:
+        raise ValueError("JSON truncado antes do primeiro valor completo")
+    end, open_containers = cut
+    return _loads(text, root, end, [i for i in drop if i < end], open_containers)
+
+
+def _loads(text, start, end, drop, open_containers):
+    parts, pos = [], start
+    for i in drop:
+        parts.append(text[pos:i])
+        pos = i + 1
+    parts.append(text[pos:end])
+    parts.extend(_CLOSERS[c] for c in reversed(open_containers))
+    try:
+        return json.loads("".join(parts))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON irrecuperável: {e}") from e
@@ -0,0 +1,100 @@
+import re
+import json
+import time
+from django.core.management.base import BaseCommand
+from apps.llm.jsonstream import recover_json
+
+QUIZ = {
+    "questions": [
+        {
+            "id": i,
+            "text": f"Pergunta {i} sobre Redis: qual estrutura usar para um ranking com \"score\"?",
+            "options": ["Sorted Set", "List", "Hash", "String"],
+            "correct_index": 0,
+            "feedback_correct": "🎉 Isso aí! ZSET é feito para ranking.",
+            "feedback_incorrect": "😅 Quase! Pense em ordenação por score {ex: ZADD}.",
+            "explanation": "ZADD/ZREVRANGE dão top-N em O(log n) [ver docs].",
+        }
+        for i in range(1, 4)
+    ]
+}
+
+
+def build_corpus():
+    """Formatos de resposta problemática que o Gemini devolve na prática"""
+    clean = json.dumps(QUIZ, ensure_ascii=False)
+    pretty = json.dumps(QUIZ, ensure_ascii=False, indent=2)
+    array = json.dumps(QUIZ["questions"], ensure_ascii=False)
+    trailing = pretty.replace('"\n    }', '",\n    }').replace("\n    }\n  ]", "\n    },\n  ]")
+    return {
+        "limpo": clean,
+        "cerca markdown": f"```json\n{pretty}\n```",
+        "prosa antes/depois": f"Claro! Aqui está o quiz:\n{pretty}\nBons estudos! {{:)}}",
+        "array solto": f"```json\n{array}\n```",
+        "vírgula sobrando": trailing,
+        "truncado (meio da 3ª)": pretty[: int(len(pretty) * 0.8)],
+        "truncado (meio da 2ª)": f"```json\n{pretty[: int(len(pretty) * 0.5)]}",
+    }
+
+
+def legacy_extract(text_response):
+    """Cascata de regex que o ArenaService usava antes do recover_json"""
+    try:
+        return json.loads(text_response)
+    except json.JSONDecodeError:
+        cleaned = re.sub(r'```json\s*|\s*```', '', text_response)
+        match = re.search(r'\{.*\}', cleaned, re.DOTALL)
+        if match:
+            return json.loads(match.group(0))
+        match_arr = re.search(r'\[.*\]', cleaned, re.DOTALL)
+        if match_arr:
+            return {"questions": json.loads(match_arr.group(0))}
+        raise ValueError("Não foi possível extrair JSON válido da resposta")
+
+
+def count_questions(parsed):
+    questions = parsed if isinstance(parsed, list) else parsed.get("questions", [])
+    return sum(1 for q in questions if isinstance(q, dict) and "correct_index" in q)
+
+
+class Command(BaseCommand):
+    help = "Compara o recover_json com a antiga cascata de regex sobre respostas malformadas do LLM"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        corpus = build_corpus()
+        totals = {"regex": [0.0, 0], "recover": [0.0, 0]}
+
+        self.stdout.write(f"{'caso':<24} {'regex (µs)':>11} {'perg.':>6} {'recover (µs)':>13} {'perg.':>6}")
+        for name, text in corpus.items():
+            row = []
+            for label, extract in (("regex", legacy_extract), ("recover", recover_json)):
+                try:
+                    recovered = count_questions(extract(text))
+                except ValueError:  # JSONDecodeError é subclasse de ValueError
+                    recovered = 0
+
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    try:
+                        extract(text)
+                    except ValueError:
+                        pass
+                elapsed_us = (time.perf_counter() - started) / iterations * 1e6
+
+                totals[label][0] += elapsed_us
+                totals[label][1] += recovered
+                row += [f"{elapsed_us:>11.1f}" if label == "regex" else f"{elapsed_us:>13.1f}", f"{recovered:>6}"]
+            self.stdout.write(f"{name:<24} {' '.join(row)}")
+
+        regex_us, regex_q = totals["regex"]
+        recover_us, recover_q = totals["recover"]
+        self.stdout.write(
+            f"{'total':<24} {regex_us:>11.1f} {regex_q:>6} {recover_us:>13.1f} {recover_q:>6}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"recover_json: {regex_us / recover_us:.1f}x mais rápido, {recover_q - regex_q} perguntas a mais recuperadas"
+        ))
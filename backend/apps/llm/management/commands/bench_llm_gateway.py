@@ -0,0 +1,89 @@
+import json
+import time
+import statistics
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import google.generativeai as genai
+from django.core.management.base import BaseCommand
+from apps.llm import gateway
+
+STUB_RESPONSE = json.dumps({
+    "candidates": [{
+        "content": {"role": "model", "parts": [{"text": '{"questions": []}'}]},
+        "finishReason": "STOP",
+    }]
+}).encode()
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    """Imita o endpoint REST generateContent do Gemini com latência fixa"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Compara a latência por chamada: configure + GenerativeModel por request vs gateway compartilhado (stub local)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Latência simulada do stub")
+
+    def handle(self, *args, **options):
+        StubGeminiHandler.latency = options["latency_ms"] / 1000
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubGeminiHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+        config = {"temperature": 0.7, "response_mime_type": "application/json"}
+
+        def legacy_call():
+            # Fluxo antigo: configura o cliente e cria o modelo a cada request
+            genai.configure(api_key="stub", transport="rest", client_options={"api_endpoint": endpoint})
+            model = genai.GenerativeModel("gemini-2.0-flash", generation_config=config)
+            model.generate_content("Quiz sobre Redis")
+
+        def gateway_call():
+            gateway.generate("Quiz sobre Redis", generation_config=config, timeout=10)
+
+        try:
+            legacy = self._measure(legacy_call, options["requests"])
+            gateway.configure(api_key="stub", transport="rest", api_endpoint=endpoint, force=True)
+            shared = self._measure(gateway_call, options["requests"])
+        finally:
+            server.shutdown()
+
+        self.stdout.write(f"{'modo':<10} {'média':>9} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+        for name, samples in (("legacy", legacy), ("gateway", shared)):
+            self.stdout.write(
+                f"{name:<10} {statistics.mean(samples):>9.2f} {self._pct(samples, 50):>9.2f} "
+                f"{self._pct(samples, 95):>9.2f} {self._pct(samples, 99):>9.2f}"
+            )
+        # Loopback HTTP sem TLS: a diferença fica dentro do ruído; o número só vale como comparação relativa
+        ratio = statistics.mean(legacy) / statistics.mean(shared)
+        self.stdout.write(f"Média legacy / gateway: {ratio:.2f}x")
+
+    def _measure(self, call, n):
+        call()  # aquecimento (imports e primeira conexão)
+        samples = []
+        for _ in range(n):
+            start = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    @staticmethod
+    def _pct(samples, p):
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
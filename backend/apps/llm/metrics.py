@@ -0,0 +1,16 @@
+from prometheus_client import Counter
+
+# Chamadas idênticas coalescidas pelo single-flight (role: leader, coalesced, fallback)
+SINGLEFLIGHT_CALLS = Counter(
+    "studyflow_llm_singleflight_calls_total",
+    "Chamadas ao LLM passando pelo single-flight, por papel",
+    ["namespace", "role"],
+)
+
+
+# Transições e rejeições do circuit breaker (event: opened, closed, rejected)
+BREAKER_EVENTS = Counter(
+    "studyflow_llm_breaker_events_total",
+    "Eventos do circuit breaker das chamadas ao LLM",
+    ["name", "event"],
+)
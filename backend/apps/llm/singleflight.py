@@ -0,0 +1,106 @@
+import json
+import time
+import uuid
+import hashlib
+import logging
+import redis
+from django.conf import settings
+from django_redis import get_redis_connection
+from .metrics import SINGLEFLIGHT_CALLS
+
+logger = logging.getLogger(__name__)
+
+# Libera a trava apenas se ela ainda pertence a este voo (compare-and-delete atômico)
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Garante no máximo uma geração em andamento por chave entre TODOS os workers.
+
+    O primeiro a chegar (leader) adquire a trava no Redis e executa a função;
+    os demais (followers) aguardam o resultado publicado pelo leader em vez de
+    disparar outra chamada ao Gemini.
+
+    Cada voo tem um token próprio, então um resultado antigo nunca é entregue
+    para quem está esperando um voo novo.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        config = settings.LLM_SINGLEFLIGHT
+        self.lock_timeout = config["LOCK_TIMEOUT"]
+        self.wait_timeout = config["WAIT_TIMEOUT"]
+        self.result_ttl = config["RESULT_TTL"]
+
+    def _keys(self, key: str):
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        base = f"singleflight:{self.namespace}:{digest}"
+        return f"{base}:lock", f"{base}:result"
+
+    def do(self, key: str, fn):
+        """Executa fn() uma única vez por chave; chamadas concorrentes recebem o mesmo resultado"""
+        lock_key, result_key = self._keys(key)
+        token = uuid.uuid4().hex
+
+        try:
+            conn = get_redis_connection("default")
+            is_leader = conn.set(lock_key, token, nx=True, ex=self.lock_timeout)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"⚠️ Single-flight indisponível, chamando direto: {e}")
+            return fn()
+
+        if is_leader:
+            return self._lead(conn, lock_key, result_key, token, fn)
+
+        result = self._wait(conn, lock_key, result_key)
+        if result is not None:
+            SINGLEFLIGHT_CALLS.labels(self.namespace, "coalesced").inc()
+            return json.loads(result)
+
+        # Leader falhou ou estourou o tempo: segue sozinho
+        SINGLEFLIGHT_CALLS.labels(self.namespace, "fallback").inc()
+        return fn()
+
+    def _lead(self, conn, lock_key, result_key, token, fn):
+        SINGLEFLIGHT_CALLS.labels(self.namespace, "leader").inc()
+        try:
+            result = fn()
+            conn.set(f"{result_key}:{token}", json.dumps(result), ex=self.result_ttl)
+            return result
+        finally:
+            try:
+                conn.eval(RELEASE_SCRIPT, 1, lock_key, token)
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"⚠️ Falha ao liberar trava do single-flight: {e}")
+
+    def _wait(self, conn, lock_key, result_key):
+        """Aguarda o resultado do voo atual com backoff; retorna None se não houver resultado"""
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.05
+        try:
+            leader_token = conn.get(lock_key)
+            if leader_token is None:
+                return None
+            flight_key = f"{result_key}:{leader_token.decode()}"
+
+            while time.monotonic() < deadline:
+                result = conn.get(flight_key)
+                if result is not None:
+                    return result
+                if conn.get(lock_key) != leader_token:
+                    # O leader terminou: o resultado pode ter sido gravado logo antes de soltar a trava
+                    return conn.get(flight_key)
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"⚠️ Erro aguardando single-flight: {e}")
+            return None
+
+        logger.warning(f"⏱️ Timeout aguardando single-flight ({self.namespace})")
+        return None
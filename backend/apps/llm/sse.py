@@ -0,0 +1,28 @@
+import json
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+
+def sse_event(event: str, data) -> str:
+    """Formata um evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    """StreamingHttpResponse pronto para SSE (sem cache e sem buffer no Nginx)"""
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Permite negociar 'Accept: text/event-stream' nas views de streaming.
+    Respostas DRF comuns (ex: 401) viram um evento 'error'.
+    """
+    media_type = "text/event-stream"
+    format = "sse"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event("error", data)
@@ -0,0 +1,175 @@
+import time
+import threading
+from django.test import SimpleTestCase, override_settings
+from django_redis import get_redis_connection
+from unittest.mock import patch
+
+from . import gateway
+from .breaker import CircuitBreaker, CircuitOpen
+from .jsonstream import JsonArrayStreamer, recover_json
+from .topics import canonical_topic
+from .singleflight import SingleFlight
+
+
+class SingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        redis = get_redis_connection("default")
+        keys = redis.keys("singleflight:test*")
+        if keys:
+            redis.delete(*keys)
+        self.flight = SingleFlight("test")
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Chamadas simultâneas com a mesma chave executam a função uma única vez"""
+        calls = []
+
+        def slow_generation():
+            calls.append(1)
+            time.sleep(0.3)
+            return {"questions": [1, 2, 3]}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.flight.do("python", slow_generation)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"questions": [1, 2, 3]}] * 5)
+
+    def test_sequential_calls_do_not_reuse_old_result(self):
+        """Um voo novo nunca recebe o resultado de um voo anterior"""
+        self.assertEqual(self.flight.do("python", lambda: 1), 1)
+        self.assertEqual(self.flight.do("python", lambda: 2), 2)
+
+
+class GatewayTest(SimpleTestCase):
+    def setUp(self):
+        gateway.clear_model_cache()
+
+    @patch('apps.llm.gateway.genai.GenerativeModel')
+    def test_models_are_reused_per_configuration(self, mock_model_class):
+        """O mesmo (modelo, system_instruction, config) reaproveita o GenerativeModel"""
+        config = {"temperature": 0.4, "response_mime_type": "application/json"}
+
+        first = gateway.get_model(system_instruction="Tutor", generation_config=config)
+        second = gateway.get_model(system_instruction="Tutor", generation_config=dict(config))
+        gateway.get_model(system_instruction="Outro", generation_config=config)
+
+        self.assertIs(first, second)
+        self.assertEqual(mock_model_class.call_count, 2)
+
+    @patch('apps.llm.gateway.genai.configure')
+    def test_client_is_configured_once_per_process(self, mock_configure):
+        gateway.configure(api_key="dummy", force=True)
+        gateway.configure()
+        gateway.configure()
+
+        mock_configure.assert_called_once()
+
+
+class JsonArrayStreamerTest(SimpleTestCase):
+    def test_items_are_emitted_as_soon_as_they_close(self):
+        text = '```json\n{"questions": [{"id": 1, "text": "a {[\\"x"}, {"id": 2, "options": [1, 2]}]}\n```'
+        streamer = JsonArrayStreamer()
+
+        emitted = []
+        for i, char in enumerate(text):
+            for item in streamer.feed(char):
+                emitted.append((item["id"], i))
+
+        self.assertEqual([item_id for item_id, _ in emitted], [1, 2])
+        # O primeiro item sai antes do segundo começar a chegar
+        self.assertLess(emitted[0][1], text.index('{"id": 2'))
+
+
+class RecoverJsonTest(SimpleTestCase):
+    def test_fences_prose_and_trailing_commas(self):
+        text = 'Claro! Segue:\n```json\n{"questions": [{"id": 1, "options": ["a", "b"],},]}\n```\nBons estudos {:)}'
+        self.assertEqual(recover_json(text), {"questions": [{"id": 1, "options": ["a", "b"]}]})
+
+    def test_truncated_response_keeps_complete_elements(self):
+        text = '[{"id": 1, "text": "a ]}"}, {"id": 2, "text": "cortad'
+        self.assertEqual(recover_json(text), [{"id": 1, "text": "a ]}"}, {"id": 2}])
+
+    def test_bracketed_prose_before_the_json(self):
+        text = 'Veja [1] abaixo e a nota [2]: {"questions": [{"id": 1}]}'
+        self.assertEqual(recover_json(text), {"questions": [{"id": 1}]})
+        self.assertEqual(recover_json('Fonte [docs]: [{"id": 1}, {"id": 2, "text": "cort'), [{"id": 1}, {"id": 2}])
+        self.assertEqual(recover_json('Passos [1, 2]: {"steps": [3]}', expect=dict), {"steps": [3]})
+        self.assertEqual(recover_json("Sem perguntas: []"), [])
+
+    def test_nothing_to_recover(self):
+        with self.assertRaises(ValueError):
+            recover_json("Desculpe, não consegui gerar o quiz.")
+
+
+class CanonicalTopicTest(SimpleTestCase):
+    def test_variants_share_one_key(self):
+        for variant in ["Redis", "redis ", "REDIS", "Rédis", "  redis!"]:
+            self.assertEqual(canonical_topic(variant), "redis")
+
+        self.assertEqual(canonical_topic("Introdução ao Node.js"), "introducao nodejs")
+        self.assertEqual(canonical_topic("Lógica de Programação"), "logica programacao")
+
+    def test_distinct_topics_stay_distinct(self):
+        """Diferente do antigo "primeira palavra", tópicos compostos não colidem"""
+        self.assertNotEqual(canonical_topic("Python Avançado"), canonical_topic("Python"))
+        self.assertNotEqual(canonical_topic("C++"), canonical_topic("C#"))
+        self.assertEqual(canonical_topic("de"), "de")
+
+
+@override_settings(LLM_BREAKER={
+    "ENABLED": True, "FAILURE_RATE": 0.5, "MIN_CALLS": 2, "SLOW_CALL_SECONDS": 5,
+    "WINDOW_SECONDS": 60, "OPEN_SECONDS": 1, "PROBE_TIMEOUT": 5,
+})
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker("test")
+        self.breaker.reset()
+        self.addCleanup(self.breaker.reset)
+
+    def test_opens_on_failures_and_closes_after_probe(self):
+        self.breaker.record(True, 0.1)
+        self.breaker.record(False, 0.1)
+        self.breaker.record(True, 9.0)  # Lenta conta como falha
+
+        with self.assertRaises(CircuitOpen) as ctx:
+            self.breaker.before_call()
+        self.assertEqual(ctx.exception.retry_after, 1)
+
+        # Após o cooldown, apenas uma chamada de teste passa
+        time.sleep(1.1)
+        self.assertTrue(self.breaker.before_call())
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+
+        self.breaker.record(True, 0.1, probe=True)
+        self.assertFalse(self.breaker.before_call())
+        self.assertFalse(get_redis_connection("default").exists(self.breaker.window_key))
+
+    def test_buckets_outside_the_window_are_pruned(self):
+        now = time.time()
+        with patch('apps.llm.breaker.time.time', return_value=now - 120):
+            self.breaker.record(False, 0.1)
+        self.breaker.record(True, 0.1)
+
+        fields = get_redis_connection("default").hkeys(self.breaker.window_key)
+        self.assertEqual(len(fields), 1)
+        self.assertEqual(self.breaker._window_totals(), (1, 0))
+
+    def test_gateway_fails_fast_when_open(self):
+        gateway_breaker = CircuitBreaker()
+        gateway_breaker.reset()
+        self.addCleanup(gateway_breaker.reset)
+        gateway_breaker._trip("teste")
+
+        with patch('apps.llm.gateway.genai.GenerativeModel') as mock_model_class, \
+             patch('apps.llm.gateway.configure', return_value=True):
+            with self.assertRaises(CircuitOpen):
+                gateway.generate("prompt")
+            mock_model_class.return_value.generate_content.assert_not_called()
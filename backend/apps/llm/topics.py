@@ -0,0 +1,63 @@
+import re
+import unicodedata
+
+# Palavras que não mudam o assunto ("Introdução ao Python" == "introducao python")
+STOP_WORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas",
+    "de", "da", "do", "das", "dos", "d",
+    "em", "na", "no", "nas", "nos", "num", "numa",
+    "ao", "aos", "para", "pra", "por", "pelo", "pela",
+    "e", "com", "sobre", "entre",
+}
+
+# Apelidos comuns -> nome canônico (aplicado à frase inteira e depois a cada palavra)
+PHRASE_ALIASES = {
+    "node js": "nodejs",
+    "react js": "react",
+    "reactjs": "react",
+    "vue js": "vue",
+    "vuejs": "vue",
+    "next js": "nextjs",
+    "inteligencia artificial": "ia",
+    "machine learning": "ml",
+    "aprendizado maquina": "ml",
+}
+
+WORD_ALIASES = {
+    "js": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "k8s": "kubernetes",
+    "postgres": "postgresql",
+    "pg": "postgresql",
+    "golang": "go",
+    "node": "nodejs",
+}
+
+# Mantém '+' e '#' para não confundir "C++"/"C#" com "C"
+_SEPARATORS = re.compile(r"[^\w+#]+")
+
+MAX_LENGTH = 100
+
+
+def fold_accents(text: str) -> str:
+    """Remove acentos ("Rédis" -> "Redis", "lógica" -> "logica")"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def canonical_topic(topic: str) -> str:
+    """
+    Chave canônica de um tópico, usada nos caches de LLM e no progresso da Arena.
+    "  REDIS ", "Rédis" e "redis" viram "redis"; "Introdução ao Node.js" vira "introducao nodejs".
+    """
+    words = _SEPARATORS.sub(" ", fold_accents(topic).lower()).split()
+    if not words:
+        return ""
+
+    # Tópico só com stop words (ex: "de"): mantém as palavras originais
+    phrase = " ".join(word for word in words if word not in STOP_WORDS) or " ".join(words)
+    for alias, canonical in PHRASE_ALIASES.items():
+        phrase = re.sub(rf"(?<![\w+#]){re.escape(alias)}(?![\w+#])", canonical, phrase)
+
+    return " ".join(WORD_ALIASES.get(word, word) for word in phrase.split())[:MAX_LENGTH].strip()
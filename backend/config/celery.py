@@ -1,7 +1,23 @@
 import os
+import logging
 from celery import Celery
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 app = Celery('studyflow')
 app.config_from_object('django.conf:settings', namespace='CELERY')
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, *args, **kwargs):
+    """
+    Publica uma task sem derrubar a request caso o broker esteja fora do ar.
+    Retorna True se a mensagem foi aceita pelo broker.
+    """
+    try:
+        task.apply_async(args=args, kwargs=kwargs, retry=False)
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao enfileirar {task.name}: {e}")
+        return False
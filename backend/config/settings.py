@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     'django.contrib.sites',
+    "django.contrib.postgres",
 
     # Libs
     "rest_framework",
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
     "apps.ai_tutor",
     "apps.arena",
     "apps.journey",
+    "apps.llm",
 ]
 
 SITE_ID = 1
@@ -188,6 +190,173 @@ CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND")
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+CELERY_BEAT_SCHEDULE = {
+    "arena-refill-quiz-pools": {
+        "task": "apps.arena.tasks.refill_low_quiz_pools",
+        "schedule": 60.0,
+    },
+    "arena-flush-xp-buffer": {
+        "task": "apps.arena.tasks.flush_xp_buffer",
+        "schedule": 5.0,
+    },
+    "arena-rebuild-leaderboard": {
+        "task": "apps.arena.tasks.rebuild_leaderboard",
+        "schedule": 60.0 * 60 * 24,
+    },
+    "journey-warm-curriculum": {
+        "task": "apps.journey.tasks.warm_curriculum",
+        "schedule": 60.0 * 60 * 24,
+    },
+    "ai-tutor-flush-interactions": {
+        "task": "apps.ai_tutor.tasks.flush_interaction_buffer",
+        "schedule": 5.0,
+    },
+    "ai-tutor-maintain-history-partitions": {
+        "task": "apps.ai_tutor.tasks.maintain_history_partitions",
+        "schedule": 60.0 * 60 * 24,
+    },
+    "ai-tutor-prune-topic-cache": {
+        "task": "apps.ai_tutor.tasks.prune_topic_cache",
+        "schedule": 60.0 * 60 * 24,
+    },
+}
+
+# --- LLM: Gateway do Gemini (um cliente configurado por worker) ---
+LLM_GATEWAY = {
+    "MODEL": "gemini-2.0-flash",
+    "TRANSPORT": os.environ.get("GEMINI_TRANSPORT") or None,  # grpc (padrão) ou rest
+    "API_ENDPOINT": os.environ.get("GEMINI_API_ENDPOINT") or None,
+    "TIMEOUT": 30,
+    "QUIZ_TIMEOUT": 45,
+    "TUTOR_TIMEOUT": 60,
+}
+
+# --- LLM: Single-flight (uma geração por chave entre todos os workers) ---
+LLM_SINGLEFLIGHT = {
+    "LOCK_TIMEOUT": 120,  # Acompanha o timeout do gunicorn
+    "WAIT_TIMEOUT": 60,
+    "RESULT_TTL": 30,
+}
+
+# --- LLM: Circuit breaker (estado no Redis, compartilhado entre workers) ---
+LLM_BREAKER = {
+    "ENABLED": str(os.environ.get("LLM_BREAKER", "1")) == "1",
+    "FAILURE_RATE": 0.5,        # Fração de chamadas com erro/lentas que abre o circuito
+    "MIN_CALLS": 5,             # Mínimo de chamadas na janela antes de avaliar
+    "SLOW_CALL_SECONDS": 20,    # Acima disso a chamada conta como falha
+    "WINDOW_SECONDS": 60,
+    "OPEN_SECONDS": 30,         # Cooldown antes do probe (half-open)
+    "PROBE_TIMEOUT": 60,
+}
+
+# --- AI TUTOR: Cache de análises em camadas (memória do worker -> Redis -> Postgres) ---
+TOPIC_CACHE = {
+    "LOCAL_MAX_ENTRIES": 512,
+    "LOCAL_MAX_BYTES": 8 * 1024 * 1024,
+    "LOCAL_TTL_SECONDS": 60 * 5,
+    "REDIS_TTL_SECONDS": 60 * 60 * 24,
+    # (soft, hard) em dias: após o soft a análise é servida e revalidada em background;
+    # após o hard ela é regenerada na hora
+    "TTL_DAYS": {
+        "initial": (30, 180),
+        "deep": (60, 365),
+        "patterns": (60, 365),
+        "troubleshooting": (30, 180),
+        "default": (30, 180),
+    },
+    "ACCESS_FLUSH_SECONDS": 60,
+    "PRUNE_AFTER_DAYS": 90,
+}
+
+# --- AI TUTOR: Respostas reaproveitadas para perguntas equivalentes da mesma matéria ---
+TUTOR_SEMANTIC_CACHE = {
+    "ENABLED": str(os.environ.get("TUTOR_SEMANTIC_CACHE", "1")) == "1",
+    "THRESHOLD": float(os.environ.get("TUTOR_SEMANTIC_THRESHOLD", "0.85")),  # Similaridade de cosseno mínima
+    "NGRAM": 3,
+    "DIMENSIONS": 2048,
+    "MAX_ENTRIES_PER_SUBJECT": 1000,
+    "MAX_SUBJECTS": 64,
+    "MAX_BYTES": 64 * 1024 * 1024,
+    "REBUILD_SECONDS": 60 * 5,
+}
+
+# --- AI TUTOR: Contexto da conversa (resumo + últimos turnos dentro de um orçamento de tokens) ---
+TUTOR_CONVERSATION = {
+    "ENABLED": str(os.environ.get("TUTOR_CONVERSATION", "1")) == "1",
+    "RECENT_TURNS": 4,          # Turnos enviados na íntegra (os mais recentes)
+    "TOKEN_BUDGET": 1500,       # Resumo + turnos recentes
+    "MAX_TURN_TOKENS": 400,     # Corte de cada pergunta/resposta no prompt
+    "SUMMARY_MAX_TOKENS": 300,
+    "IDLE_MINUTES": 30,         # Intervalo sem perguntas que encerra a sessão
+    "MAX_TURNS_LOADED": 30,
+    "CHARS_PER_TOKEN": 4,
+}
+
+# --- AI TUTOR: Buffer no Redis para gravar as interações do chat em lote ---
+TUTOR_INTERACTION_BUFFER = {
+    "ENABLED": str(os.environ.get("TUTOR_INTERACTION_BUFFER", "0")) == "1",
+    "BATCH_SIZE": 200,          # Buffer com esse tamanho dispara o flush antes do próximo ciclo do beat
+    "FLUSH_LOCK_SECONDS": 60,
+}
+
+# --- AI TUTOR: Partições mensais do histórico e arquivo comprimido das antigas ---
+TUTOR_HISTORY_PARTITIONS = {
+    "MONTHS_AHEAD": 3,          # Partições criadas com antecedência
+    "RETENTION_MONTHS": int(os.environ.get("TUTOR_HISTORY_RETENTION_MONTHS", 12)),  # Depois disso, vão para o arquivo
+    "ARCHIVE_BATCH_SIZE": 1000,
+    "COMPRESSION_LEVEL": 6,     # zlib
+}
+
+# --- AI TUTOR: Análises em lote (plano de estudos) ---
+AI_TUTOR_BATCH = {
+    "MAX_ITEMS": 20,            # Pares (tópico, depth) por requisição
+    "MAX_WORKERS": 8,           # Misses gerados em paralelo (chamadas simultâneas ao Gemini por requisição)
+}
+
+# --- AI TUTOR: Prefetch das demais depths depois do 'initial' ---
+AI_TUTOR_PREFETCH = {
+    "ENABLED": str(os.environ.get("AI_TUTOR_PREFETCH", "1")) == "1",
+    "DEPTHS": ["deep", "patterns", "troubleshooting"],
+    "MAX_PER_MINUTE": 20,       # Tópicos prefetchados por minuto (todos os workers)
+    "DEDUPE_SECONDS": 60 * 60 * 24,
+}
+
+# --- ARENA: Estoque de quizzes pré-gerados por (tópico, dificuldade) ---
+ARENA_QUIZ_POOL = {
+    "TARGET_SIZE": int(os.environ.get("QUIZ_POOL_TARGET_SIZE", "5")),
+    "LOW_WATER": int(os.environ.get("QUIZ_POOL_LOW_WATER", "2")),
+    "MAX_POOLS": int(os.environ.get("QUIZ_POOL_MAX_POOLS", "200")),
+    "TTL_SECONDS": 60 * 60 * 24 * 7,
+}
+
+# --- ARENA: Buffer de XP no Redis (gravação em lote no Postgres para rajadas de pontuação) ---
+ARENA_XP_BUFFER = {
+    "ENABLED": str(os.environ.get("ARENA_XP_BUFFER", "0")) == "1",
+}
+
+# --- ARENA: Sessões de quiz no servidor (gabarito para correção em lote) ---
+ARENA_QUIZ_SESSIONS = {
+    "TTL_SECONDS": 60 * 60,
+    "XP_PER_CORRECT": 100,
+}
+
+# --- ARENA: Jobs assíncronos de geração de quiz (status no Redis) ---
+ARENA_QUIZ_JOBS = {
+    "TTL_SECONDS": 60 * 10,
+    "MAX_WAIT_SECONDS": 2,  # Limite do long-poll no GET de status (segura um worker síncrono do gunicorn)
+}
+
+# --- JORNADA: Warm-up do currículo (análises e quizzes das fases gerados antes do primeiro aluno) ---
+CURRICULUM_WARMUP = {
+    "DEPTHS": ["initial", "deep", "patterns", "troubleshooting"],
+    "CONCURRENCY": int(os.environ.get("CURRICULUM_WARMUP_CONCURRENCY", "4")),
+    # Abaixo da cota do Gemini, deixando folga para o tráfego dos usuários
+    "REQUESTS_PER_MINUTE": int(os.environ.get("CURRICULUM_WARMUP_RPM", "30")),
+    "LOCK_SECONDS": 60 * 60 * 2,
+    # Preço por milhão de tokens (USD) para a estimativa de custo do relatório
+    "INPUT_USD_PER_MILLION": 0.10,
+    "OUTPUT_USD_PER_MILLION": 0.40,
+}
 
 REDIS_HOST = os.environ.get("REDIS_HOST", "redis_cache")
 REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
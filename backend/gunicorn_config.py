@@ -2,4 +2,15 @@ bind = "0.0.0.0:8000"
 workers = 3  # ajustar: 2 * CPU + 1
 timeout = 120
 accesslog = "-"   # stdout
-errorlog = "-"    # stdout
\ No newline at end of file
+errorlog = "-"    # stdout
+
+
+def post_fork(server, worker):
+    # Cada worker abre o próprio canal com o Gemini (gRPC não sobrevive ao fork do --preload)
+    import os
+    import django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+
+    from apps.llm import gateway
+    gateway.warm_up()